@@ -0,0 +1,54 @@
+"""CLDRの絵文字アノテーションから、読み上げ用の絵文字索引 (emoji_ja.tsv) を作ります。
+
+使い方:
+    python build_emoji_index.py annotations.json annotationsDerived.json
+    python build_emoji_index.py emoji_ja.json -o emoji_ja.tsv
+
+入力には cldr-json の annotations.json / annotationsDerived.json (ja) のほか、
+CLDRから作られた {"絵文字": ":名前:"} 形式のJSONも使えます。
+肌の色の違いや異体字セレクタ (U+FE0F) はまとめて1つの名前にし、
+キーのUTF-8のバイト順に並べて保存します (Bot側はこのファイルを二分探索します)。
+"""
+import argparse
+import json
+
+from main import EMOJI_INDEX_FILE, normalize_emoji_key
+
+def iter_annotations(path: str):
+    """アノテーションファイルから (絵文字, 名前) を順に返します。"""
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if "annotations" in data: # cldr-json 形式
+        section = data["annotations"]
+        for emoji, annotation in section.get("annotations", section).items():
+            names = annotation.get("tts") or annotation.get("default")
+            if names:
+                yield emoji, names[0]
+    else: # {"絵文字": ":名前:"} 形式
+        for emoji, name in data.items():
+            yield emoji, name.strip(":").replace("_", " ")
+
+def build_index(paths: list[str]) -> dict[str, str]:
+    index = {}
+    for path in paths:
+        for emoji, name in iter_annotations(path):
+            key = normalize_emoji_key(emoji)
+            name = name.strip()
+            if not key or not name or "\t" in name or "\n" in name:
+                continue
+            # 肌の色などの違いは1つにまとめ、修飾のない絵文字の名前を優先する
+            if key not in index or emoji == key:
+                index[key] = name
+    return index
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CLDRのアノテーションから絵文字の読みの索引を作ります。")
+    parser.add_argument("sources", nargs="+", help="アノテーションのJSONファイル")
+    parser.add_argument("-o", "--output", default=EMOJI_INDEX_FILE, help="出力するファイル")
+    args = parser.parse_args()
+
+    index = build_index(args.sources)
+    with open(args.output, 'wb') as f:
+        for key in sorted(index, key=lambda k: k.encode('utf-8')):
+            f.write(f"{key}\t{index[key]}\n".encode('utf-8'))
+    print(f"{len(index)} 件の絵文字を {args.output} に書き出しました。")
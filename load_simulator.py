@@ -0,0 +1,560 @@
+"""Discord と Edge TTS を使わずに、Bot のイベント処理に負荷をかけるシミュレーターです。
+
+偽の Guild / Message / VoiceClient と、遅延を設定できるローカルの TTS 代替を使い、
+main.py の on_message / on_voice_state_update / join / check_idle_voice_channels を
+記録済みまたは合成したトレースに従って呼び出します。
+
+使い方:
+    python load_simulator.py --guilds 50 --duration 60
+    python load_simulator.py --trace trace.jsonl --tts-latency lognormal:0.4:0.5
+    python load_simulator.py --guilds 10 --duration 30 --record trace.jsonl
+    python load_simulator.py --tts-server --handshake-latency constant:0.2
+
+--tts-server を付けると、TTS 代替の代わりに Edge TTS と同じ WebSocket のやり取りをする
+ローカルのサーバーを起動し、Bot の接続プール (main.EdgeTTSClient) を通して合成します。
+
+トレースは1行1イベントのJSONLです。
+    {"t": 0.0, "type": "join", "guild": 1, "user": 10}
+    {"t": 0.5, "type": "message", "guild": 1, "user": 10, "content": "こんにちは"}
+    {"t": 3.0, "type": "voice_join", "guild": 1, "user": 11}
+    {"t": 9.0, "type": "voice_leave", "guild": 1, "user": 11}
+    {"t": 20.0, "type": "voice_drop", "guild": 1}
+    {"t": 60.0, "type": "idle_check"}
+"""
+import argparse
+import asyncio
+import contextvars
+import json
+import os
+import random
+import re
+import statistics
+import struct
+import time
+import tracemalloc
+
+import aiohttp
+import discord
+import psutil
+from aiohttp import web
+
+import main
+
+# Edge TTS の既定出力 (48kbps mono mp3) と同じ1秒あたりのバイト数
+MP3_BYTES_PER_SECOND = 48000 / 8
+# TTS 代替が返す音声データの先頭に埋め込む (メッセージ受信時刻, 再生秒数)
+AUDIO_HEADER = struct.Struct("<dd")
+
+# on_message などを呼び出したイベントの受信時刻。TTS 代替から参照します。
+current_event_time: contextvars.ContextVar[float] = contextvars.ContextVar("current_event_time", default=0.0)
+
+# ── 偽の Discord オブジェクト ──
+class FakeUser:
+    def __init__(self, user_id: int, guild=None, bot: bool = False):
+        self.id = user_id
+        self.bot = bot
+        self.guild = guild
+        self.display_name = f"user{user_id}"
+        self.avatar = None
+        self.voice = None
+
+class FakePermissions:
+    connect = True
+    speak = True
+    read_messages = True
+
+class FakeVoiceChannel:
+    def __init__(self, channel_id: int, guild):
+        self.id = channel_id
+        self.name = f"vc-{channel_id}"
+        self.guild = guild
+        self.members: list[FakeUser] = []
+
+    def permissions_for(self, member):
+        return FakePermissions()
+
+    async def connect(self, **kwargs):
+        await asyncio.sleep(0)
+        vc = FakeVoiceClient(self)
+        self.members.append(self.guild.me)
+        return vc
+
+class FakeTextChannel:
+    def __init__(self, channel_id: int):
+        self.id = channel_id
+        self.name = f"text-{channel_id}"
+        self.mention = f"<#{channel_id}>"
+
+    async def send(self, *args, **kwargs):
+        pass
+
+class FakeGuild:
+    def __init__(self, guild_id: int):
+        self.id = guild_id
+        self.name = f"guild-{guild_id}"
+        self.me = FakeUser(0, self, bot=True)
+        self.voice_channel = FakeVoiceChannel(guild_id * 10 + 1, self)
+        self.text_channel = FakeTextChannel(guild_id * 10 + 2)
+        self.members: dict[int, FakeUser] = {}
+        self.member_count = 0
+
+    def get_member(self, user_id: int):
+        return self.members.get(user_id)
+
+    def get_channel_or_thread(self, channel_id: int):
+        return self.text_channel if channel_id == self.text_channel.id else None
+
+    def get_role(self, role_id: int):
+        return None
+
+    def member(self, user_id: int) -> FakeUser:
+        if user_id not in self.members:
+            self.members[user_id] = FakeUser(user_id, self)
+            self.member_count = len(self.members)
+        return self.members[user_id]
+
+class FakeVoiceState:
+    def __init__(self, channel=None):
+        self.channel = channel
+
+class FakeMessage:
+    def __init__(self, guild: FakeGuild, author: FakeUser, content: str):
+        self.guild = guild
+        self.author = author
+        self.channel = guild.text_channel
+        self.content = content
+        self.attachments = []
+        self.stickers = []
+        self.mentions = [m for m in guild.members.values() if f"<@{m.id}>" in content]
+        self.role_mentions = []
+        self.channel_mentions = [guild.text_channel] if guild.text_channel.mention in content else []
+
+class FakeContext:
+    def __init__(self, guild: FakeGuild, author: FakeUser):
+        self.guild = guild
+        self.author = author
+        self.channel = guild.text_channel
+
+    async def reply(self, *args, **kwargs):
+        pass
+
+    async def defer(self, *args, **kwargs):
+        pass
+
+class FakeVoiceClient:
+    """音声スレッドの代わりにイベントループ上のタスクで source.read() を20msごとに呼ぶ VoiceClient です。"""
+    def __init__(self, channel: FakeVoiceChannel):
+        self.channel = channel
+        self.source = None
+        self._playing = None
+        self._after = None
+        self._connected = True
+
+    def is_connected(self) -> bool:
+        return self._connected
+
+    def is_playing(self) -> bool:
+        return self._playing is not None
+
+    def play(self, source, *, after=None, **kwargs):
+        self.source = source
+        self._after = after
+        self._playing = asyncio.get_running_loop().create_task(self._player(source))
+
+    async def _player(self, source):
+        while True:
+            frame = source.read()
+            if not frame:
+                break
+            # 音声の先頭フレームには TTS 代替が埋め込んだ情報が残っている (無音フレームはすべて0)
+            event_time, duration = AUDIO_HEADER.unpack_from(frame)
+            if duration:
+                stats.record_playback(event_time)
+            await asyncio.sleep(0.02)
+        self._finish()
+
+    def _finish(self):
+        self._playing = None
+        self.source = None
+        if self._after:
+            self._after(None)
+
+    def stop(self):
+        if self._playing:
+            self._playing.cancel()
+            self._playing = None
+            self.source = None
+
+    @property
+    def guild(self):
+        return self.channel.guild
+
+    def drop(self):
+        """discord.py の再接続があきらめて接続を破棄した状態を再現します。再生中の音声は中断されます。"""
+        self._connected = False
+        if self._playing:
+            self._playing.cancel()
+            self._finish()
+        self.cleanup()
+
+    def cleanup(self):
+        main.voice_sessions.handle_cleanup(self)
+
+    async def move_to(self, channel):
+        self.channel = channel
+
+    async def disconnect(self, *args, **kwargs):
+        self.stop()
+        self._connected = False
+
+# ── TTS 代替 ──
+def parse_latency(spec: str):
+    """"constant:0.3" / "uniform:0.1:0.5" / "lognormal:mu:sigma" 形式の遅延分布を関数にします。"""
+    kind, *params = spec.split(":")
+    params = [float(p) for p in params]
+    if kind == "constant":
+        return lambda: params[0]
+    if kind == "uniform":
+        return lambda: random.uniform(params[0], params[1])
+    if kind == "lognormal":
+        # 中央値 params[0] 秒、ばらつき params[1] の対数正規分布
+        return lambda: random.lognormvariate(0, params[1]) * params[0]
+    raise ValueError(f"不明な遅延分布です: {spec}")
+
+async def fake_generate_tts(text: str, user_id: int, guild_id: int) -> bytes:
+    """Edge TTS の代わりに、設定された遅延の後で文字数に比例した長さの音声データを返します。"""
+    stats.tts_calls += 1
+    stats.tts_in_flight += 1
+    try:
+        if config.tts_server:
+            # 遅延と失敗は代替サーバー側で入れる
+            audio = await main.tts_client.synthesize(text, main.get_user_voice(user_id))
+            duration = len(audio) / MP3_BYTES_PER_SECOND
+        else:
+            await asyncio.sleep(config.tts_latency() / config.speed)
+            if random.random() < config.tts_error_rate:
+                raise RuntimeError("simulated TTS failure")
+            duration = max(0.3, len(text) * config.seconds_per_char)
+    except Exception:
+        stats.tts_errors += 1
+        raise
+    finally:
+        stats.tts_in_flight -= 1
+    header = AUDIO_HEADER.pack(current_event_time.get(), duration)
+    return header + bytes(int(duration * MP3_BYTES_PER_SECOND) - AUDIO_HEADER.size)
+
+def fake_decode_clip(audio_data: bytes) -> bytes:
+    """ffmpeg の代わりに、倍速で縮めた再生時間分の無音PCMを返します。先頭には埋め込み情報を残します。"""
+    event_time, duration = AUDIO_HEADER.unpack_from(audio_data)
+    size = max(AUDIO_HEADER.size, int(duration / config.speed * main.PCM_BYTES_PER_SECOND))
+    return AUDIO_HEADER.pack(event_time, duration) + bytes(size - AUDIO_HEADER.size)
+
+class EdgeStandIn:
+    """Edge TTS と同じ WebSocket のやり取りをするローカルのサーバーです。
+
+    接続ごとにハンドシェイクの遅延を、合成ごとに TTS 遅延を入れ、文字数に比例した長さの音声を返します。
+    1つの接続で続けて合成でき、--tts-server-turns で1接続あたりの合成回数を制限できます。
+    """
+    SSML_TEXT = re.compile(r"<prosody[^>]*>(.*)</prosody>", re.S)
+
+    def __init__(self):
+        self.runner = None
+        self.url = None
+        self.connections = 0
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/edge", self.handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = self.runner.addresses[0][1]
+        self.url = f"ws://127.0.0.1:{port}/edge?TrustedClientToken=stand-in"
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+    async def handle(self, request: web.Request) -> web.WebSocketResponse:
+        await asyncio.sleep(config.handshake_latency() / config.speed) # TLS と WebSocket のハンドシェイクの代わり
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.connections += 1
+        turns = 0
+        async for message in ws:
+            if message.type != aiohttp.WSMsgType.TEXT or "Path:ssml" not in message.data:
+                continue # speech.config は読み捨てる
+            request_id = re.search(r"X-RequestId:(\w+)", message.data).group(1)
+            match = self.SSML_TEXT.search(message.data)
+            await asyncio.sleep(config.tts_latency() / config.speed)
+            if random.random() < config.tts_error_rate:
+                break # 合成の途中で接続が切れた状態を再現する
+            duration = max(0.3, len(match.group(1) if match else "") * config.seconds_per_char)
+            header = f"X-RequestId:{request_id}\r\nContent-Type:audio/mpeg\r\nPath:audio\r\n".encode()
+            await ws.send_bytes(len(header).to_bytes(2, "big") + header + bytes(int(duration * MP3_BYTES_PER_SECOND)))
+            await ws.send_str(f"X-RequestId:{request_id}\r\nPath:turn.end\r\n\r\n{{}}")
+            turns += 1
+            if config.tts_server_turns and turns >= config.tts_server_turns:
+                break
+        await ws.close()
+        return ws
+
+# ── 計測 ──
+class Stats:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.events = 0
+        self.messages = 0
+        self.handler_errors = 0
+        self.tts_calls = 0
+        self.tts_errors = 0
+        self.tts_in_flight = 0
+        self.playbacks = 0
+        self.drops = 0
+        self.latencies: list[float] = []
+        self.samples: list[dict] = []
+
+    def record_playback(self, event_time: float):
+        self.playbacks += 1
+        if event_time:
+            self.latencies.append((time.monotonic() - event_time) * config.speed)
+
+    def sample(self):
+        depths = [q.qsize() for q in main.voice_queues.values()]
+        current, peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+        self.samples.append({
+            "t": (time.monotonic() - self.started) * config.speed,
+            "messages": self.messages,
+            "playbacks": self.playbacks,
+            "tts_in_flight": self.tts_in_flight,
+            "queue_total": sum(depths),
+            "queue_max": max(depths, default=0),
+            "queue_mb": main.AudioQueue.memory_bytes_total / 1024 / 1024,
+            "spilled_mb": sum(q.spilled_bytes for q in main.voice_queues.values()) / 1024 / 1024,
+            "rss_mb": psutil.Process().memory_info().rss / 1024 / 1024,
+            "traced_mb": current / 1024 / 1024,
+        })
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+def report():
+    elapsed = (time.monotonic() - stats.started) * config.speed
+    print("\n── シミュレーション結果 ──")
+    print(f"経過時間(シミュレーション上): {elapsed:.1f}s  イベント数: {stats.events}  ハンドラ例外: {stats.handler_errors}")
+    print(f"メッセージ: {stats.messages} ({stats.messages / max(elapsed, 1e-9):.1f}/s)  "
+          f"再生: {stats.playbacks} ({stats.playbacks / max(elapsed, 1e-9):.1f}/s)")
+    print(f"TTS呼び出し: {stats.tts_calls}  失敗: {stats.tts_errors}  接続断: {stats.drops}")
+    if stats.latencies:
+        print("受信から再生開始までの遅延: "
+              f"p50={percentile(stats.latencies, 50):.2f}s p90={percentile(stats.latencies, 90):.2f}s "
+              f"p99={percentile(stats.latencies, 99):.2f}s max={max(stats.latencies):.2f}s "
+              f"mean={statistics.fmean(stats.latencies):.2f}s")
+    tts = main.get_metrics("tts.")
+    if tts.get("tts.requests"):
+        requests = tts["tts.requests"]
+        print(f"Edge TTS: 合成 平均 {tts.get('tts.synthesis_ms_total', 0) / requests * config.speed:.0f}ms  "
+              f"ハンドシェイク待ち 平均 {tts.get('tts.connect_wait_ms_total', 0) / requests * config.speed:.0f}ms  "
+              f"待機中の接続を使用 {tts.get('tts.warm_hits', 0) / requests * 100:.0f}%  "
+              f"ハンドシェイク {int(tts.get('tts.handshakes', 0))} 回")
+    suppressed = main.get_metrics()
+    if suppressed:
+        print("Botのメトリクス: " + ", ".join(f"{k}={v:g}" for k, v in suppressed.items()))
+    print("\n   時刻  受信数  再生数  合成中  キュー合計  キュー最大  キュー(MB)  退避(MB)   RSS(MB)  traced(MB)")
+    for s in stats.samples:
+        print(f"{s['t']:7.1f} {s['messages']:7d} {s['playbacks']:7d} {s['tts_in_flight']:7d} "
+              f"{s['queue_total']:10d} {s['queue_max']:10d} {s['queue_mb']:10.2f} {s['spilled_mb']:9.2f} "
+              f"{s['rss_mb']:9.1f} {s['traced_mb']:10.2f}")
+
+# ── トレース ──
+SAMPLE_TEXTS = [
+    "こんにちは", "おはよう", "それなwww", "今日の配信おもしろかった", "了解です",
+    "5kgくらいあるよ", "ちょっと離席します", "草", "いまから行く", "ほんとそれ",
+    "明日の予定どうする？", "ナイス！", "おつかれさまでした", "あとで見ておきます",
+]
+
+def synthetic_trace(guilds: int, duration: float, users: int, rate: float, burst: float, seed: int, drop_rate: float = 0.0):
+    """ギルドごとに接続 → バースト混じりのメッセージと入退室 → アイドルチェックのトレースを作ります。"""
+    rng = random.Random(seed)
+    events = []
+    for g in range(1, guilds + 1):
+        members = [g * 1000 + u for u in range(users)]
+        events.append({"t": rng.uniform(0, 1), "type": "join", "guild": g, "user": members[0]})
+        for user in members[1:]:
+            events.append({"t": rng.uniform(0, 2), "type": "voice_join", "guild": g, "user": user})
+        t = 2.0
+        while True:
+            t += rng.expovariate(rate)
+            if t >= duration:
+                break
+            user = rng.choice(members)
+            count = rng.randint(3, 10) if rng.random() < burst else 1 # 連投のバースト
+            for i in range(count):
+                text = rng.choice(SAMPLE_TEXTS) + ("" if i == 0 else f" {i}")
+                if rng.random() < 0.1:
+                    text = f"<@{rng.choice(members)}> {text}" # メンション付きのメッセージ
+                events.append({"t": t + i * 0.2, "type": "message", "guild": g, "user": user, "content": text})
+            if rng.random() < 0.02:
+                events.append({"t": t, "type": "voice_leave", "guild": g, "user": rng.choice(members[1:] or members)})
+        t = 2.0
+        while drop_rate > 0:
+            t += rng.expovariate(drop_rate / 60)
+            if t >= duration:
+                break
+            events.append({"t": t, "type": "voice_drop", "guild": g})
+    t = 60.0
+    while t < duration:
+        events.append({"t": t, "type": "idle_check"})
+        t += 60.0
+    events.sort(key=lambda e: e["t"])
+    return events
+
+def load_trace(path: str):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+# ── 実行 ──
+guilds: dict[int, FakeGuild] = {}
+
+def get_guild(guild_id: int) -> FakeGuild:
+    if guild_id not in guilds:
+        guilds[guild_id] = FakeGuild(guild_id)
+    return guilds[guild_id]
+
+async def dispatch(event: dict):
+    """トレースの1イベントを、対応する main.py のハンドラに渡します。"""
+    current_event_time.set(time.monotonic())
+    kind = event["type"]
+    stats.events += 1
+    try:
+        if kind == "idle_check":
+            await main.check_idle_voice_channels()
+            return
+        if kind == "voice_drop":
+            vc = main.voice_clients.get(event["guild"])
+            if isinstance(vc, FakeVoiceClient):
+                stats.drops += 1
+                vc.drop()
+            return
+        guild = get_guild(event["guild"])
+        member = guild.member(event["user"])
+        if kind == "join":
+            member.voice = FakeVoiceState(guild.voice_channel)
+            if member not in guild.voice_channel.members:
+                guild.voice_channel.members.append(member)
+            await main.join.callback(FakeContext(guild, member), None)
+        elif kind == "message":
+            stats.messages += 1
+            await main.on_message(FakeMessage(guild, member, event["content"]))
+        elif kind == "voice_join":
+            member.voice = FakeVoiceState(guild.voice_channel)
+            guild.voice_channel.members.append(member)
+            await main.on_voice_state_update(member, FakeVoiceState(None), FakeVoiceState(guild.voice_channel))
+        elif kind == "voice_leave":
+            if member in guild.voice_channel.members:
+                guild.voice_channel.members.remove(member)
+            member.voice = None
+            await main.on_voice_state_update(member, FakeVoiceState(guild.voice_channel), FakeVoiceState(None))
+    except Exception as e:
+        stats.handler_errors += 1
+        if stats.handler_errors <= 5:
+            print(f"ハンドラ例外 ({kind}): {e!r}")
+
+async def sampler(interval: float):
+    while True:
+        stats.sample()
+        await asyncio.sleep(interval / config.speed)
+
+async def run(events: list[dict]):
+    loop = asyncio.get_running_loop()
+    main.bot.loop = loop
+    # Discord への接続を伴う処理を偽物に差し替える
+    main.generate_tts = fake_generate_tts
+    main.bot.process_commands = lambda message: asyncio.sleep(0)
+    main.bot.get_guild = lambda guild_id: guilds.get(guild_id)
+    main.bot.get_channel = lambda channel_id: guilds[channel_id // 10].voice_channel if channel_id // 10 in guilds else None
+    main.decode_clip = fake_decode_clip
+    standin = None
+    if config.tts_server:
+        standin = EdgeStandIn()
+        await standin.start()
+        main.tts_client = main.EdgeTTSClient(url=standin.url)
+        await main.tts_client.start() # on_ready と同じく、最初のメッセージの前に接続しておく
+
+    sampler_task = loop.create_task(sampler(config.sample_interval))
+    tasks = []
+    start = time.monotonic()
+    for event in events:
+        delay = event["t"] / config.speed - (time.monotonic() - start)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(loop.create_task(dispatch(event)))
+    await asyncio.gather(*tasks)
+
+    # キューに残った音声が再生し終わるまで待つ
+    deadline = time.monotonic() + config.drain_timeout / config.speed
+    while time.monotonic() < deadline and (
+        any(not q.empty() for q in main.voice_queues.values())
+        or any(s.is_playing() or s.has_backlog() for s in main.voice_streams.values())
+        or stats.tts_in_flight
+    ):
+        await asyncio.sleep(0.05)
+    stats.sample()
+    sampler_task.cancel()
+    # 再生後の一時ファイル削除などの後片付けを進める
+    await asyncio.sleep(0.1)
+    if standin:
+        await main.tts_client.close()
+        await standin.stop()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="偽のゲートウェイでBotのイベント処理に負荷をかけます。")
+    parser.add_argument("--trace", help="再生するトレース (JSONL)。指定しない場合は合成トレースを使います")
+    parser.add_argument("--record", help="使用したトレースをJSONLで保存するパス")
+    parser.add_argument("--guilds", type=int, default=20, help="合成トレースのギルド数")
+    parser.add_argument("--users", type=int, default=5, help="合成トレースのギルドあたりのユーザー数")
+    parser.add_argument("--duration", type=float, default=30.0, help="合成トレースの長さ (秒)")
+    parser.add_argument("--rate", type=float, default=0.3, help="ギルドあたりの平均メッセージ間隔の逆数 (件/秒)")
+    parser.add_argument("--burst", type=float, default=0.1, help="メッセージが連投バーストになる確率")
+    parser.add_argument("--seed", type=int, default=1, help="乱数シード")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="合成トレースでギルドあたり1分間に音声接続が切れる回数")
+    parser.add_argument("--tts-latency", default="lognormal:0.4:0.5", help="TTS遅延の分布 (constant:s / uniform:a:b / lognormal:中央値:σ)")
+    parser.add_argument("--tts-server", action="store_true", help="Edge TTS の代替サーバーを起動し、接続プールを通して合成する")
+    parser.add_argument("--handshake-latency", default="lognormal:0.2:0.3", help="代替サーバーの接続ごとのハンドシェイク遅延の分布")
+    parser.add_argument("--tts-server-turns", type=int, default=0, help="代替サーバーが1接続で受け付ける合成の回数 (0 なら無制限)")
+    parser.add_argument("--tts-error-rate", type=float, default=0.0, help="TTSが失敗する確率")
+    parser.add_argument("--seconds-per-char", type=float, default=0.12, help="1文字あたりの音声の長さ (秒)")
+    parser.add_argument("--speed", type=float, default=1.0, help="時間の進み方の倍率 (10 なら10倍速)")
+    parser.add_argument("--sample-interval", type=float, default=5.0, help="キュー長とメモリを記録する間隔 (秒)")
+    parser.add_argument("--drain-timeout", type=float, default=120.0, help="トレース終了後に再生完了を待つ最大時間 (秒)")
+    parser.add_argument("--tracemalloc", action="store_true", help="tracemallocでPythonのメモリ確保量も記録する")
+    args = parser.parse_args()
+    args.tts_latency_spec = args.tts_latency
+    args.tts_latency = parse_latency(args.tts_latency)
+    args.handshake_latency = parse_latency(args.handshake_latency)
+    return args
+
+config = None
+stats = Stats()
+
+if __name__ == "__main__":
+    config = parse_args()
+    random.seed(config.seed)
+    if config.trace:
+        trace = load_trace(config.trace)
+    else:
+        trace = synthetic_trace(config.guilds, config.duration, config.users, config.rate, config.burst, config.seed, config.drop_rate)
+    if config.record:
+        with open(config.record, 'w', encoding='utf-8') as f:
+            for event in trace:
+                f.write(json.dumps(event, ensure_ascii=False) + "\n")
+    if config.tracemalloc:
+        tracemalloc.start()
+    print(f"イベント数: {len(trace)}  TTS遅延: {config.tts_latency_spec}  倍速: {config.speed}")
+    stats = Stats()
+    asyncio.run(run(trace))
+    report()
+    os._exit(0) # Tk や discord.py のスレッドを待たずに終了する
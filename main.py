@@ -2,33 +2,81 @@ import os
 import sys
 import json
 import re
-import tempfile
+import csv
+import io
+import collections
+import bisect
+import functools
+import itertools
+import mmap
+import difflib
+import hashlib
+import unicodedata
 import asyncio
 import time
 import threading
+import traceback
+import argparse
+import subprocess
+import secrets
+import queue
+import urllib.request
+import urllib.parse
+import urllib.error
+try:
+    from re import _parser as sre_parse # Python 3.11 以降
+except ImportError:
+    import sre_parse
 import psutil
+import aiohttp
+from aiohttp import web
 
 import discord
 from discord.ext import commands, tasks
 from discord import app_commands
 from dotenv import load_dotenv
 import edge_tts
+try:
+    # 接続を使い回すため、edge_tts の通信処理の部品を直接使う。版が変わって使えなければ edge_tts.Communicate に戻す
+    from edge_tts.communicate import (
+        TTSConfig, _SSL_CTX, connect_id, date_to_string, escape, get_headers_and_data, mkssml,
+        remove_incompatible_characters, split_text_by_byte_length, ssml_headers_plus_data,
+    )
+    from edge_tts.constants import SEC_MS_GEC_VERSION, WSS_HEADERS, WSS_URL
+    from edge_tts.drm import DRM
+except ImportError:
+    DRM = None
 
 import tkinter as tk
-from tkinter import ttk, messagebox, scrolledtext
+from tkinter import ttk, messagebox, scrolledtext, filedialog
 
 # ── 環境変数の読み込み ──
 load_dotenv()
 BOT_TOKEN = os.getenv("BOT_TOKEN")
+# 管理API (ローカルのHTTP/JSON)。トークンを指定しない場合は起動のたびに生成します。
+ADMIN_API_HOST = os.getenv("ADMIN_API_HOST", "127.0.0.1")
+ADMIN_API_PORT = int(os.getenv("ADMIN_API_PORT", "8765"))
+ADMIN_API_TOKEN = os.getenv("ADMIN_API_TOKEN") or secrets.token_urlsafe(24)
+ADMIN_TOKEN_FILE = "admin_api_token" # 生成したトークンの保存先 (管理画面だけを起動し直すときに使う)
 
 # ── 定数 ──
 GLOBAL_DICT_FILE = "global_dict.json"
 USER_SETTINGS_FILE = "user_settings.json"
+GUILD_SETTINGS_FILE = "guild_settings.json"
+COMMAND_SYNC_FILE = "command_sync.json" # 最後に同期したスラッシュコマンドのハッシュ
+VOICE_CATALOG_FILE = "voice_catalog.json" # Edge TTS の声の一覧のキャッシュ
 SERVER_DICTS_DIR = "server_dicts"  # サーバーごとの辞書を保存するディレクトリ
 # SERVER_SETTINGS_DIR はユーザー設定に切り替えるため不要になりますが、既存ファイルの削除ロジックのために残します。
 SERVER_SETTINGS_DIR = "server_settings" 
 INVITE_URL = ("https://discord.com/oauth2/authorize?client_id=1364493244343255111&permissions=2150976512&integration_type=0&scope=bot+applications.commands") #自分のclient_idに書き換えてください。
 TEMP_AUDIO_DIR = "temp_audio"
+PROFILES_DIR = "profiles" # プロファイラの出力先
+# 再生待ち音声をメモリに置く上限 (バイト)。超えた分はディスクに退避します。
+VOICE_QUEUE_GUILD_BUDGET = int(os.getenv("VOICE_QUEUE_GUILD_BUDGET", 2 * 1024 * 1024))
+VOICE_QUEUE_GLOBAL_BUDGET = int(os.getenv("VOICE_QUEUE_GLOBAL_BUDGET", 64 * 1024 * 1024))
+# Edge TTS への接続。ハンドシェイクを済ませた接続を待機させておき、合成のたびに張り直さない
+EDGE_TTS_POOL_SIZE = int(os.getenv("EDGE_TTS_POOL_SIZE", "2"))
+EDGE_TTS_WSS_URL = os.getenv("EDGE_TTS_WSS_URL") # 代替サーバーで試すときだけ指定する
 
 # 一時ディレクトリの作成
 os.makedirs(TEMP_AUDIO_DIR, exist_ok=True)
@@ -38,11 +86,19 @@ intents = discord.Intents.default()
 intents.message_content = True
 intents.guilds = True
 intents.voice_states = True
+intents.members = True # 特権インテント。名前キャッシュを on_member_update / on_member_remove で更新するために必要
+
+class ReadingBot(commands.Bot):
+    async def close(self):
+        """Botを停止する前に、Edge TTS への待機中の接続を閉じます。"""
+        await tts_client.close()
+        await super().close()
 
-bot = commands.Bot(command_prefix="e!", intents=intents, help_command=None)
+# 名前はイベントから必要な分だけ取り込むので、起動時に全メンバーを取得 (チャンク) しない
+bot = ReadingBot(command_prefix="e!", intents=intents, help_command=None, chunk_guilds_at_startup=False)
 
 # 音声再生キュー
-voice_queues: dict[int, asyncio.Queue[bytes]] = {}
+voice_queues: dict[int, "AudioQueue"] = {}
 voice_clients: dict[int, discord.VoiceClient] = {}
 reading_channels: dict[int, int] = {}
 
@@ -102,6 +158,69 @@ def set_user_voice(user_id: int, voice_name: str):
 # 起動時にユーザー設定を読み込む
 user_settings = load_user_settings()
 
+# ── サーバーごとの設定 ──
+# 未設定の項目はこの既定値が使われます
+GUILD_SETTING_DEFAULTS = {
+    "spam_filter": True,        # 連投・重複メッセージの抑制を行うか
+    "spam_burst": 5,            # ユーザーごとに連続で読み上げられるメッセージ数
+    "spam_per_minute": 20,      # ユーザーごとに1分あたり回復する読み上げ回数
+    "dedupe_window": 15,        # 同じ内容のメッセージをまとめる時間 (秒)
+    "dedupe_similarity": 0.9,   # ほぼ同じ内容とみなす類似度 (0.0～1.0)
+    "max_char_run": 4,          # 同じ文字の連続をこの文字数までに縮める (0で無効)
+}
+
+guild_settings: dict[str, dict] = {} # { "guild_id": {"spam_burst": 5, ...}, ... }
+
+def load_guild_settings():
+    """サーバーごとの設定をファイルから読み込みます。"""
+    if os.path.exists(GUILD_SETTINGS_FILE):
+        try:
+            with open(GUILD_SETTINGS_FILE, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except json.JSONDecodeError:
+            print(f"警告: {GUILD_SETTINGS_FILE} が壊れています。空の辞書を読み込みます。")
+            return {}
+    return {}
+
+def save_guild_settings():
+    """サーバーごとの設定をファイルに保存します。"""
+    try:
+        with open(GUILD_SETTINGS_FILE, 'w', encoding='utf-8') as f:
+            json.dump(guild_settings, f, indent=4, ensure_ascii=False)
+    except IOError as e:
+        print(f"エラー: サーバー設定 {GUILD_SETTINGS_FILE} の保存に失敗しました: {e}")
+
+def get_guild_setting(guild_id: int, key: str):
+    """指定されたギルドIDの設定値を取得します。未設定の場合は既定値を返します。"""
+    return guild_settings.get(str(guild_id), {}).get(key, GUILD_SETTING_DEFAULTS[key])
+
+def set_guild_setting(guild_id: int, key: str, value):
+    """指定されたギルドIDの設定値を保存します。"""
+    guild_id_str = str(guild_id)
+    if guild_id_str not in guild_settings:
+        guild_settings[guild_id_str] = {}
+    guild_settings[guild_id_str][key] = value
+    save_guild_settings()
+
+# 起動時にサーバー設定を読み込む
+guild_settings = load_guild_settings()
+
+# ── メトリクス ──
+# Botの内部状態を数値で記録します。/status やGUIから参照されます。
+metrics: dict[str, float] = {}
+
+def inc_metric(name: str, amount: float = 1):
+    """カウンター型のメトリクスを加算します。"""
+    metrics[name] = metrics.get(name, 0) + amount
+
+def set_metric(name: str, value: float):
+    """ゲージ型のメトリクスを現在値で上書きします。"""
+    metrics[name] = value
+
+def get_metrics(prefix: str = "") -> dict[str, float]:
+    """指定した接頭辞で始まるメトリクスのスナップショットを返します。"""
+    return {name: value for name, value in sorted(metrics.items()) if name.startswith(prefix)}
+
 # ── グローバル辞書関数 ──
 def load_global_dictionary():
     """グローバル辞書をファイルから読み込みます。"""
@@ -116,6 +235,8 @@ def load_global_dictionary():
 
 def save_global_dictionary(data):
     """グローバル辞書をファイルに保存します。"""
+    global global_dict_version
+    global_dict_version += 1
     try:
         with open(GLOBAL_DICT_FILE, 'w', encoding='utf-8') as f:
             json.dump(data, f, indent=4, ensure_ascii=False)
@@ -123,6 +244,7 @@ def save_global_dictionary(data):
         print(f"エラー: グローバル辞書の保存に失敗しました: {e}")
 
 global_dict = load_global_dictionary()
+global_dict_version = 0 # グローバル辞書が保存されるたびに増える (キャッシュの無効化判定用)
 
 # ── サーバーごとの辞書関数 ──
 def get_server_dict_path(guild_id: int):
@@ -145,24 +267,1149 @@ def save_server_dictionary(guild_id: int, data: dict):
     """指定されたギルドIDのサーバー辞書をファイルに保存します。"""
     path = get_server_dict_path(guild_id)
     try:
+        os.makedirs(SERVER_DICTS_DIR, exist_ok=True)
         with open(path, 'w', encoding='utf-8') as f:
             json.dump(data, f, indent=4, ensure_ascii=False)
     except IOError as e:
         print(f"エラー: サーバー辞書 {path} の保存に失敗しました: {e}")
+    rebuild_server_dictionary_cache(guild_id, data)
+
+# 読み上げ時に毎回ファイルを読まないよう、サーバー辞書をメモリに保持する
+server_dict_cache: dict[int, dict] = {}
+# 辞書が書き換えられるたびに増えるバージョン番号 (キャッシュの無効化判定用)
+dictionary_versions: dict[int, int] = {}
+
+def get_server_dictionary(guild_id: int) -> dict:
+    """キャッシュ済みのサーバー辞書を返します。未読み込みの場合はファイルから読み込みます。"""
+    if guild_id not in server_dict_cache:
+        server_dict_cache[guild_id] = load_server_dictionary(guild_id)
+    return server_dict_cache[guild_id]
+
+def rebuild_server_dictionary_cache(guild_id: int, data: dict = None):
+    """サーバー辞書のキャッシュを作り直し、バージョン番号を進めます。"""
+    if data is None:
+        server_dict_cache.pop(guild_id, None)
+        compiled_dictionaries.pop(guild_id, None)
+        dictionary_indexes.pop(guild_id, None)
+    else:
+        server_dict_cache[guild_id] = dict(data)
+    dictionary_versions[guild_id] = dictionary_versions.get(guild_id, 0) + 1
+
+class DictionaryIndex:
+    """辞書の語句を並べ替えて保持します。前方一致は二分探索、部分一致は語句を順に調べる絞り込みです。"""
+    def __init__(self, entries: dict = None):
+        self.keys: list[str] = sorted(entries) if entries else []
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def add(self, key: str):
+        """語句を索引に追加します。既にある場合は何もしません。"""
+        i = bisect.bisect_left(self.keys, key)
+        if i == len(self.keys) or self.keys[i] != key:
+            self.keys.insert(i, key)
+
+    def remove(self, key: str):
+        """語句を索引から削除します。"""
+        i = bisect.bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            del self.keys[i]
+
+    def prefix(self, prefix: str, limit: int = None) -> list[str]:
+        """prefix で始まる語句を並び順で返します。"""
+        start = bisect.bisect_left(self.keys, prefix)
+        end = bisect.bisect_left(self.keys, prefix + "\U0010FFFF") if prefix else len(self.keys)
+        if limit is not None:
+            end = min(end, start + limit)
+        return self.keys[start:end]
+
+    def search(self, query: str, entries: dict, within: list[str] = None, limit: int = None) -> list[str]:
+        """語句または読みに query を含むものを返します (大文字小文字は区別しません)。
+
+        索引は使わず、候補を1件ずつ調べる線形の絞り込みです。within に直前の検索結果を渡すと
+        その中だけを調べるので、1文字ずつ入力を足していく検索では走査する件数が減っていきます。
+        limit を指定すると、その件数が見つかった時点で走査をやめます。
+        """
+        if not query:
+            return self.keys if limit is None else self.keys[:limit]
+        query = query.lower()
+        candidates = self.keys if within is None else within
+        matches = (k for k in candidates if query in k.lower() or query in entries.get(k, "").lower())
+        return list(matches if limit is None else itertools.islice(matches, limit))
+
+class SearchableDictionaryIndex(DictionaryIndex):
+    """部分一致検索用に、語句と読みを小文字にして1つの文字列へつなげたものを持つ索引です。
+
+    辞書が更新されたら作り直す前提で、add/remove には対応しません。部分一致は
+    str.find で文字列全体を走査するため、語句ごとに lower() するより速く終わります。
+    """
+    def __init__(self, entries: dict = None):
+        super().__init__(entries)
+        entries = entries or {}
+        # 各行は "語句\t読み\n"。語句や読みに含まれる改行・タブは空白にして行がずれないようにする
+        lines = [f"{k}\t{entries[k]}".replace("\n", " ").lower() for k in self.keys]
+        self.starts = list(itertools.accumulate((len(line) + 1 for line in lines[:-1]), initial=0))
+        self.text = "\n".join(lines)
+
+    def contains(self, query: str, limit: int = None) -> list[str]:
+        """語句または読みに query を含む語句を並び順で返します。"""
+        query = query.lower().replace("\n", " ")
+        if not query:
+            return self.keys if limit is None else self.keys[:limit]
+        found = []
+        pos = self.text.find(query)
+        while pos != -1 and (limit is None or len(found) < limit):
+            line = bisect.bisect_right(self.starts, pos) - 1
+            found.append(self.keys[line])
+            next_line = line + 1
+            if next_line >= len(self.starts):
+                break
+            pos = self.text.find(query, self.starts[next_line]) # 同じ行で何度も一致しないよう次の行から探す
+        return found
+
+# ギルドID -> (辞書のバージョン, 索引)。辞書が更新されたら次に使うときに作り直す
+dictionary_indexes: dict[int, tuple[int, SearchableDictionaryIndex]] = {}
+
+def get_dictionary_index(guild_id: int) -> SearchableDictionaryIndex:
+    """サーバー辞書の索引を返します。作り直しは辞書が更新された後の最初の1回だけです。"""
+    version = dictionary_versions.get(guild_id, 0)
+    cached = dictionary_indexes.get(guild_id)
+    if cached and cached[0] == version:
+        return cached[1]
+    index = SearchableDictionaryIndex(get_server_dictionary(guild_id))
+    dictionary_indexes[guild_id] = (version, index)
+    return index
+
+# (グローバル辞書のバージョン, 索引)。グローバル辞書が保存されたら次に使うときに作り直す
+global_dictionary_index: tuple[int, SearchableDictionaryIndex] = None
+
+def get_global_dictionary_index() -> SearchableDictionaryIndex:
+    """グローバル辞書の索引を返します。作り直しは辞書が保存された後の最初の1回だけです。"""
+    global global_dictionary_index
+    if global_dictionary_index and global_dictionary_index[0] == global_dict_version:
+        return global_dictionary_index[1]
+    index = SearchableDictionaryIndex(global_dict)
+    global_dictionary_index = (global_dict_version, index)
+    return index
+
+# ── パターン辞書 ──
+# 語句が "/パターン/フラグ" の形式のエントリはパターンとして扱う。フラグは1文字以上必須:
+#   r: パターンを正規表現として解釈する (指定しない場合は文字どおりに一致)
+#   w: 単語単位で一致する (前後が英数字でない位置のみ)
+#   i: 大文字と小文字を区別しない
+PATTERN_ENTRY_RE = re.compile(r"^/(.+)/([rwi]+)$", re.DOTALL)
+PATTERN_FORBIDDEN_FLAGS = re.IGNORECASE | re.MULTILINE | re.DOTALL | re.VERBOSE | re.ASCII | re.LOCALE
+# 繰り返し同士が同じ文字に一致しうるかを調べるための見本の文字 (パターン中の文字も追加して使う)
+PATTERN_PROBE_CHARS = frozenset(
+    "abcxyzABCXYZ0123456789_ \t\n.,!?-/:;'\"()[]{}<>@#$%&*+=~^|\\"
+    "\u00e9\u3000あいアイｱ亜漢ー〜ｗＷ０１！？。、「」😀"
+)
+PATTERN_CATEGORIES = {
+    sre_parse.CATEGORY_DIGIT: re.compile(r"\d"), sre_parse.CATEGORY_NOT_DIGIT: re.compile(r"\D"),
+    sre_parse.CATEGORY_SPACE: re.compile(r"\s"), sre_parse.CATEGORY_NOT_SPACE: re.compile(r"\S"),
+    sre_parse.CATEGORY_WORD: re.compile(r"\w"), sre_parse.CATEGORY_NOT_WORD: re.compile(r"\W"),
+}
+
+class CompiledDictionary:
+    """1つのサーバーに適用する辞書を、置換しやすい形にまとめたものです。"""
+    def __init__(self, server_entries: dict, global_entries: dict):
+        self.literals: list[tuple[str, str]] = []
+        self.replacements: dict[str, str] = {}
+        sources = []
+        # サーバー辞書を先に並べる (同じ位置で一致した場合はサーバー辞書が優先)
+        for entries in (server_entries, global_entries):
+            for original, reading in entries.items():
+                parsed = parse_pattern_key(original)
+                if parsed is None:
+                    self.literals.append((original, reading))
+                    continue
+                if validate_pattern_key(original):
+                    continue # 手で編集された辞書ファイルなどの不正なパターンは無視する
+                name = f"d{len(sources)}"
+                sources.append(f"(?P<{name}>{parsed})")
+                self.replacements[name] = reading
+        # すべてのパターンを1つの正規表現にまとめ、テキストを1回走査するだけで済ませる
+        self.matcher = re.compile("|".join(sources)) if sources else None
+
+    def apply(self, text: str) -> str:
+        for original, reading in self.literals:
+            text = text.replace(original, reading)
+        if self.matcher:
+            text = self.matcher.sub(lambda m: self.replacements[m.lastgroup], text)
+        return text
+
+# ギルドID -> ((サーバー辞書のバージョン, グローバル辞書のバージョン), まとめた辞書)
+compiled_dictionaries: dict[int, tuple[tuple[int, int], CompiledDictionary]] = {}
+
+def make_pattern_key(pattern: str, regex: bool = False, whole_word: bool = False, ignore_case: bool = False) -> str:
+    """パターンとフラグから辞書に保存する語句を作ります。フラグがなければ pattern をそのまま返します。"""
+    flags = ("r" if regex else "") + ("w" if whole_word else "") + ("i" if ignore_case else "")
+    return f"/{pattern}/{flags}" if flags else pattern
+
+def parse_pattern_key(key: str):
+    """パターン形式の語句を正規表現のソースに変換します。通常の語句なら None を返します。"""
+    match = PATTERN_ENTRY_RE.match(key)
+    if not match:
+        return None
+    source, flags = match.groups()
+    if "r" not in flags:
+        source = re.escape(source)
+    if "w" in flags:
+        source = rf"(?<!\w)(?:{source})(?!\w)"
+    if "i" in flags:
+        source = f"(?i:{source})"
+    return source
+
+def find_backtracking_risk(subpattern, repeating: bool = False):
+    """解析済みの正規表現を調べ、バックトラックが爆発しうる構造があれば理由を返します。
+
+    repeating は、繰り返し (最大2回以上) の内側を調べているかどうかです。
+    """
+    for op, av in subpattern:
+        if op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT):
+            low, high, item = av
+            if repeating and low != high:
+                return "繰り返しの中に回数が可変の繰り返しがあります (例: (a+)+)"
+            reason = find_backtracking_risk(item, repeating or high > 1)
+        elif op == sre_parse.BRANCH:
+            branches = av[1]
+            if repeating:
+                heads = [b[0] if len(b) else None for b in branches]
+                if any(h is None or h[0] != sre_parse.LITERAL for h in heads) or len({h[1] for h in heads}) != len(heads):
+                    return "繰り返しの中に先頭が重なりうる選択肢があります (例: (a|ab)*)"
+            reason = None
+            for branch in branches:
+                reason = reason or find_backtracking_risk(branch, repeating)
+        elif op == sre_parse.SUBPATTERN:
+            reason = find_backtracking_risk(av[-1], repeating)
+        elif op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+            reason = find_backtracking_risk(av[1], repeating)
+        elif op in (sre_parse.GROUPREF, sre_parse.GROUPREF_EXISTS):
+            return "後方参照は使用できません"
+        else:
+            continue
+        if reason:
+            return reason
+    return None
+
+def _atom_matches(op, av, ch: str) -> bool:
+    """1文字に一致する要素 (LITERAL, IN など) が ch に一致するかを返します。"""
+    if op == sre_parse.LITERAL:
+        return ch == chr(av)
+    if op == sre_parse.NOT_LITERAL:
+        return ch != chr(av)
+    if op == sre_parse.ANY:
+        return ch != "\n"
+    if op == sre_parse.CATEGORY:
+        return bool(PATTERN_CATEGORIES[av].match(ch))
+    if op == sre_parse.RANGE:
+        return av[0] <= ord(ch) <= av[1]
+    if op == sre_parse.IN:
+        negate = bool(av) and av[0][0] == sre_parse.NEGATE
+        items = av[1:] if negate else av
+        return any(_atom_matches(o, a, ch) for o, a in items) != negate
+    return False
+
+def _atom_charset(op, av, probes: frozenset, ignore_case: bool) -> frozenset:
+    """要素が一致しうる見本の文字の集合を返します。"""
+    if ignore_case:
+        return frozenset(c for c in probes if any(_atom_matches(op, av, v) for v in (c, c.lower(), c.upper())))
+    return frozenset(c for c in probes if _atom_matches(op, av, c))
+
+def _pattern_probes(subpattern, probes: set) -> set:
+    """見本の文字に、パターン中のリテラルと範囲の両端を加えます。"""
+    for op, av in subpattern:
+        if op in (sre_parse.LITERAL, sre_parse.NOT_LITERAL):
+            probes.update((chr(av), chr(av).lower(), chr(av).upper()))
+        elif op == sre_parse.RANGE:
+            probes.update((chr(av[0]), chr(av[1])))
+        elif op == sre_parse.IN:
+            _pattern_probes([item for item in av if item[0] != sre_parse.NEGATE], probes)
+        elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT):
+            _pattern_probes(av[2], probes)
+        elif op == sre_parse.SUBPATTERN:
+            _pattern_probes(av[-1], probes)
+        elif op == sre_parse.BRANCH:
+            for branch in av[1]:
+                _pattern_probes(branch, probes)
+        elif op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+            _pattern_probes(av[1], probes)
+    return probes
+
+def _flatten_pattern(subpattern, probes: frozenset, ignore_case: bool, required: bool, out: list) -> list:
+    """パターンを先頭から順に ("repeat", 文字集合, 先頭の文字集合) と ("atom", 文字集合, 必須か) の並びにします。
+
+    回数が可変の繰り返し (*, +, ?, {m,n}) は1つの "repeat" にまとめます。先頭の文字集合は、
+    繰り返し1回分の最初の必須の文字までに現れうる文字です。
+    選択肢の中身と先読み・後読みの中身は、通るとは限らないので必須ではない要素として扱います。
+    """
+    for op, av in subpattern:
+        if op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT):
+            low, high, item = av
+            if low != high:
+                inner = _flatten_pattern(item, probes, ignore_case, True, [])
+                head = []
+                for e in inner:
+                    head.append(e[1])
+                    if e[0] == "atom" and e[2]:
+                        break
+                out.append(("repeat", frozenset().union(*(e[1] for e in inner)), frozenset().union(*head)))
+            else:
+                _flatten_pattern(item, probes, ignore_case, required and low > 0, out)
+        elif op == sre_parse.SUBPATTERN:
+            add_flags = av[1] if len(av) == 4 else 0
+            _flatten_pattern(av[-1], probes, ignore_case or bool(add_flags & re.IGNORECASE), required, out)
+        elif op == sre_parse.BRANCH:
+            for branch in av[1]:
+                _flatten_pattern(branch, probes, ignore_case, False, out)
+        elif op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+            _flatten_pattern(av[1], probes, ignore_case, False, out)
+        elif op in (sre_parse.LITERAL, sre_parse.NOT_LITERAL, sre_parse.ANY, sre_parse.IN, sre_parse.CATEGORY):
+            out.append(("atom", _atom_charset(op, av, probes, ignore_case), required))
+    return out
+
+def find_overlapping_repeats(parsed) -> bool:
+    """同じ文字に一致しうる回数が可変の繰り返しが2つ以上続いているかを返します。
+
+    .*.*x や a{0,16}a{0,16}x のように重なる繰り返しが並ぶと、一致しない入力で文字の分け方を
+    すべて試すため、繰り返しの数に応じて遅くなります (300文字で .*.*.*.*x は1分以上)。
+    後ろの繰り返しの先頭が前の繰り返しと重ならない場合 (例: \\d{1,3}(,\\d{3})+) や、間に重なりの外の
+    文字が必ず入る場合 (例: \\d+年\\d+月) は分け方が1通りなので許可します。
+    """
+    probes = frozenset(_pattern_probes(parsed, set(PATTERN_PROBE_CHARS)))
+    elements = _flatten_pattern(parsed, probes, False, True, [])
+    for i, first in enumerate(elements):
+        if first[0] != "repeat":
+            continue
+        for j in range(i + 1, len(elements)):
+            second = elements[j]
+            if second[0] != "repeat":
+                continue
+            overlap = first[1] & second[2]
+            if not overlap:
+                continue
+            separated = any(e[0] == "atom" and e[2] and not (e[1] & overlap) for e in elements[i + 1:j])
+            if not separated:
+                return True
+    return False
+
+def validate_pattern_key(key: str):
+    """パターン形式の語句を検証します。問題があれば理由を、なければ None を返します。"""
+    source = parse_pattern_key(key)
+    if source is None:
+        return None
+    try:
+        parsed = sre_parse.parse(source)
+    except re.error as e:
+        return f"正規表現が不正です: {e}"
+    if parsed.state.flags & PATTERN_FORBIDDEN_FLAGS:
+        return "(?i) などのフラグは使用できません。/パターン/i のように指定してください"
+    if parsed.state.groupdict:
+        return "名前付きグループは使用できません"
+    if parsed.getwidth()[0] == 0:
+        return "空の文字列に一致するパターンは使用できません"
+    if find_overlapping_repeats(parsed):
+        return "同じ文字に一致しうる回数が可変の繰り返しが続いています (例: .*.*、\\d+\\d+、a{0,9}a{0,9})"
+    return find_backtracking_risk(parsed)
+
+def get_compiled_dictionary(guild_id: int) -> CompiledDictionary:
+    """サーバーに適用する辞書を返します。辞書が更新されていなければキャッシュを使います。"""
+    version = (dictionary_versions.get(guild_id, 0), global_dict_version)
+    cached = compiled_dictionaries.get(guild_id)
+    if cached and cached[0] == version:
+        return cached[1]
+    compiled = CompiledDictionary(get_server_dictionary(guild_id), global_dict)
+    compiled_dictionaries[guild_id] = (version, compiled)
+    inc_metric("dictionary.compiles")
+    return compiled
 
 def apply_dictionary(text: str, guild_id: int) -> str:
     """テキストにサーバー固有辞書とグローバル辞書を適用します。"""
-    # サーバー固有の辞書を先に適用
-    server_dict = load_server_dictionary(guild_id)
-    for original, replacement in server_dict.items():
-        text = text.replace(original, replacement)
-    
-    # その後、グローバル辞書を適用
-    for original, replacement in global_dict.items():
-        text = text.replace(original, replacement)
+    # 通常の語句はサーバー辞書、グローバル辞書の順に置換し、その後にパターンをまとめて適用する
+    return get_compiled_dictionary(guild_id).apply(text)
+
+# ── 辞書の一括インポート/エクスポート ──
+DICT_FILE_FORMATS = ("csv", "tsv", "jsonl")
+DICT_CONFLICT_POLICIES = ("skip", "overwrite", "error")
+DICT_ENTRY_MAX_LENGTH = 200 # 1エントリあたりの語句・読みの最大文字数
+DICT_HEADER_ROWS = {("original", "reading"), ("元の語句", "読み")}
+
+class DictionaryImportError(Exception):
+    """一括インポートを中断すべきエラーが発生したときに送出されます。"""
+
+def detect_dictionary_format(filename: str) -> str:
+    """ファイル名の拡張子から辞書ファイルの形式を判定します。"""
+    ext = os.path.splitext(filename)[1].lower().lstrip(".")
+    if ext in ("jsonl", "ndjson"):
+        return "jsonl"
+    if ext in ("tsv", "tab"):
+        return "tsv"
+    if ext in ("csv", "txt"):
+        return "csv"
+    raise DictionaryImportError(f"対応していないファイル形式です: {filename} (csv / tsv / jsonl)")
+
+def iter_dictionary_records(fp, fmt: str):
+    """テキストストリームから (行番号, 元の語句, 読み) を1行ずつ取り出します。不正な行は (行番号, None, 理由) を返します。"""
+    if fmt == "jsonl":
+        for line_no, line in enumerate(fp, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_no, None, f"JSONとして解釈できません ({e.msg})"
+                continue
+            if isinstance(record, dict) and "original" in record and "reading" in record:
+                yield line_no, record["original"], record["reading"]
+            elif isinstance(record, list) and len(record) == 2:
+                yield line_no, record[0], record[1]
+            else:
+                yield line_no, None, "{\"original\": ..., \"reading\": ...} 形式ではありません"
+        return
+
+    delimiter = "\t" if fmt == "tsv" else ","
+    reader = csv.reader(fp, delimiter=delimiter)
+    for row in reader:
+        line_no = reader.line_num
+        if not row or all(not cell.strip() for cell in row):
+            continue
+        if line_no == 1 and tuple(cell.strip().lower() for cell in row[:2]) in DICT_HEADER_ROWS:
+            continue # ヘッダー行
+        if len(row) != 2:
+            yield line_no, None, f"列数が2ではありません ({len(row)}列)"
+            continue
+        yield line_no, row[0], row[1]
+
+def validate_dictionary_entry(original, reading):
+    """辞書エントリを検証し、正規化した (元の語句, 読み) を返します。不正な場合は理由を文字列で返します。"""
+    if not isinstance(original, str) or not isinstance(reading, str):
+        return "語句と読みは文字列で指定してください"
+    original = original.strip()
+    reading = reading.strip()
+    if not original or not reading:
+        return "語句または読みが空です"
+    if len(original) > DICT_ENTRY_MAX_LENGTH or len(reading) > DICT_ENTRY_MAX_LENGTH:
+        return f"{DICT_ENTRY_MAX_LENGTH}文字を超えています"
+    if "\n" in original or "\n" in reading:
+        return "改行を含めることはできません"
+    reason = validate_pattern_key(original)
+    if reason:
+        return reason
+    return original, reading
+
+def import_dictionary_records(current: dict, records, policy: str) -> tuple[dict, dict]:
+    """レコードを既存辞書にまとめて適用した新しい辞書と、件数の集計を返します。
+
+    既存辞書は変更しません。policy が "error" のとき、既存の語句と衝突すると
+    DictionaryImportError を送出し、何も書き込まれません。
+    """
+    if policy not in DICT_CONFLICT_POLICIES:
+        raise DictionaryImportError(f"不明な競合ポリシーです: {policy}")
+    merged = dict(current)
+    stats = {"added": 0, "overwritten": 0, "skipped": 0, "invalid": 0, "invalid_lines": []}
+    for line_no, original, reading in records:
+        entry = reason = None
+        if original is None:
+            reason = reading
+        else:
+            entry = validate_dictionary_entry(original, reading)
+            if isinstance(entry, str):
+                reason, entry = entry, None
+        if entry is None:
+            stats["invalid"] += 1
+            if len(stats["invalid_lines"]) < 10:
+                stats["invalid_lines"].append(f"{line_no}行目: {reason}")
+            continue
+
+        original, reading = entry
+        if original in merged:
+            if policy == "skip":
+                stats["skipped"] += 1
+                continue
+            if policy == "error":
+                raise DictionaryImportError(f"{line_no}行目: 「{original}」は既に辞書に存在します")
+            if merged[original] != reading:
+                stats["overwritten"] += 1
+            else:
+                stats["skipped"] += 1
+            merged[original] = reading
+        else:
+            merged[original] = reading
+            stats["added"] += 1
+    return merged, stats
+
+def write_dictionary_records(fp, entries: dict, fmt: str):
+    """辞書の内容を指定形式でテキストストリームに1行ずつ書き出します。"""
+    if fmt == "jsonl":
+        for original, reading in entries.items():
+            fp.write(json.dumps({"original": original, "reading": reading}, ensure_ascii=False))
+            fp.write("\n")
+        return
+    writer = csv.writer(fp, delimiter="\t" if fmt == "tsv" else ",", lineterminator="\n")
+    writer.writerow(("original", "reading"))
+    for original, reading in entries.items():
+        writer.writerow((original, reading))
+
+def format_import_stats(stats: dict) -> str:
+    """インポート結果の集計を表示用の文字列にします。"""
+    text = (f"追加: **{stats['added']}** 件\n上書き: **{stats['overwritten']}** 件\n"
+            f"スキップ: **{stats['skipped']}** 件\n不正: **{stats['invalid']}** 件")
+    if stats["invalid_lines"]:
+        text += "\n" + "\n".join(stats["invalid_lines"])
     return text
 
+# ── メンションの名前解決 ──
+NAME_CACHE_GUILD_SIZE = 5000 # 1サーバーあたりに保持する名前の数
+MENTION_FALLBACKS = {"user": "メンション", "channel": "チャンネル", "role": "ロール"} # 名前が分からないときの読み
+
+class NameCache:
+    """メンションを名前に置き換えるための、サーバーごとの上限付きキャッシュです。
+
+    名前はゲートウェイのイベント (メッセージ、メンバー・チャンネル・ロールの更新) から取り込み、
+    読み上げの際にAPIを呼び出すことはありません。
+    """
+    def __init__(self, max_entries: int = NAME_CACHE_GUILD_SIZE):
+        self.max_entries = max_entries
+        self.guilds: dict[int, collections.OrderedDict] = {}
+
+    def put(self, guild_id: int, kind: str, object_id: int, name: str):
+        entries = self.guilds.setdefault(guild_id, collections.OrderedDict())
+        entries[(kind, object_id)] = name
+        entries.move_to_end((kind, object_id))
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False) # 最も長く使われていない名前から捨てる
+
+    def forget(self, guild_id: int, kind: str, object_id: int):
+        entries = self.guilds.get(guild_id)
+        if entries:
+            entries.pop((kind, object_id), None)
+
+    def forget_guild(self, guild_id: int):
+        self.guilds.pop(guild_id, None)
+
+    def remember_member(self, member):
+        if getattr(member, "guild", None):
+            self.put(member.guild.id, "user", member.id, member.display_name)
+
+    def remember_channel(self, channel):
+        self.put(channel.guild.id, "channel", channel.id, channel.name)
+
+    def remember_role(self, role):
+        self.put(role.guild.id, "role", role.id, role.name)
+
+    def remember_message(self, message: discord.Message):
+        """メッセージに含まれる送信者とメンション先の名前を取り込みます。"""
+        self.remember_member(message.author)
+        for member in message.mentions:
+            self.remember_member(member)
+        for role in message.role_mentions:
+            self.remember_role(role)
+        for channel in message.channel_mentions:
+            self.remember_channel(channel)
+
+    def prime_guild(self, guild: discord.Guild):
+        """サーバーのチャンネルとロールを、discord.py が保持している情報から取り込みます。"""
+        for channel in guild.channels:
+            self.remember_channel(channel)
+        for role in guild.roles:
+            self.remember_role(role)
+
+    def lookup(self, guild_id: int, kind: str, object_id: int):
+        """名前を返します。キャッシュになければ discord.py の内部キャッシュだけを参照します。"""
+        entries = self.guilds.get(guild_id)
+        if entries and (kind, object_id) in entries:
+            entries.move_to_end((kind, object_id))
+            inc_metric("names.hits")
+            return entries[(kind, object_id)]
+        inc_metric("names.misses")
+        guild = bot.get_guild(guild_id)
+        found = None
+        if guild:
+            if kind == "user":
+                found = guild.get_member(object_id)
+            elif kind == "channel":
+                found = guild.get_channel_or_thread(object_id)
+            else:
+                found = guild.get_role(object_id)
+        if found is None:
+            inc_metric("names.unresolved")
+            return None
+        name = found.display_name if kind == "user" else found.name
+        self.put(guild_id, kind, object_id, name)
+        return name
+
+    def hit_rate(self):
+        hits = metrics.get("names.hits", 0)
+        total = hits + metrics.get("names.misses", 0)
+        return hits / total if total else None
+
+name_cache = NameCache()
+
+MENTION_PATTERN = re.compile(r'<(@!?|#|@&)([0-9]+)>')
+MENTION_KINDS = {"@": "user", "@!": "user", "#": "channel", "@&": "role"}
+
+def resolve_mentions(text: str, guild_id: int) -> str:
+    """メンション・チャンネルリンク・ロールメンションを名前に置き換えます。"""
+    def replace(match: re.Match) -> str:
+        kind = MENTION_KINDS[match.group(1)]
+        name = name_cache.lookup(guild_id, kind, int(match.group(2)))
+        return f" {name or MENTION_FALLBACKS[kind]} "
+    return MENTION_PATTERN.sub(replace, text)
+
+# ── メッセージのクリーニング ──
+def clean_message_text(content: str, guild_id: int = None) -> str:
+    """Discordの書式やメンション、URLなど読み上げに不要な部分を取り除きます。
+
+    guild_id を指定すると、メンションを取り除く代わりに名前に置き換えます。
+    """
+    processed_tts_text = content
+    processed_tts_text = re.sub(r'\|\|.*?\|\|', 'ネタバレ', processed_tts_text) # ネタバレ
+    processed_tts_text = re.sub(r'\*\*|__', '', processed_tts_text) # 太字、下線
+    processed_tts_text = re.sub(r'\*|_', '', processed_tts_text) # イタリック
+    processed_tts_text = re.sub(r'~~', '', processed_tts_text) # 取り消し線
+    processed_tts_text = re.sub(r'`(.*?)`', r'\1', processed_tts_text) # インラインコード
+    processed_tts_text = re.sub(r'```.*?```', '', processed_tts_text, flags=re.DOTALL) # コードブロック
+    processed_tts_text = re.sub(r'<a?:[a-zA-Z0-9_]+:[0-9]+>', '', processed_tts_text) # カスタム絵文字
+    if guild_id is not None:
+        processed_tts_text = resolve_mentions(processed_tts_text, guild_id) # メンションを名前に置き換える
+    processed_tts_text = re.sub(r'<@!?([0-9]+)>', '', processed_tts_text) # メンション
+    processed_tts_text = re.sub(r'<#([0-9]+)>', '', processed_tts_text) # チャンネルリンク
+    processed_tts_text = re.sub(r'<@&([0-9]+)>', '', processed_tts_text) # ロールメンション
+    processed_tts_text = re.sub(r'https?://\S+', 'URL', processed_tts_text) # URL
+    processed_tts_text = re.sub(r'\s+', ' ', processed_tts_text).strip() # 連続する空白を一つに
+    return processed_tts_text
+
+# ── 読み上げテキストの正規化 ──
+# 読み上げ時間を短くするための変換表です。正規表現は起動時に一度だけ組み立てます。
+UNIT_READINGS = {
+    "km": "キロメートル", "m": "メートル", "cm": "センチ", "mm": "ミリ",
+    "kg": "キロ", "g": "グラム", "mg": "ミリグラム",
+    "L": "リットル", "l": "リットル", "ml": "ミリリットル", "mL": "ミリリットル",
+    "TB": "テラバイト", "GB": "ギガ", "MB": "メガ", "KB": "キロバイト", "kB": "キロバイト",
+    "GHz": "ギガヘルツ", "MHz": "メガヘルツ", "kHz": "キロヘルツ", "Hz": "ヘルツ",
+    "ms": "ミリ秒", "sec": "秒", "min": "分", "h": "時間", "fps": "エフピーエス",
+    "km/h": "キロ", "%": "パーセント", "％": "パーセント", "℃": "度", "°C": "度", "°": "度",
+    "円": "円", "¥": "円", "$": "ドル",
+}
+KAOMOJI_LABELS = {
+    "(笑)": "わら", "（笑）": "わら", "orz": "がっくり", "OTL": "がっくり",
+    "m(__)m": "ぺこり", "m()m": "ぺこり", "m( )m": "ぺこり",
+    "(^^)": "にこにこ", "(^^;": "あせあせ", "(^^;)": "あせあせ", "(^^)/": "やあ", "(^o^)": "にこにこ",
+    "(T_T)": "しくしく", "(TT)": "しくしく", "(;_;)": "しくしく", "(;;)": "しくしく",
+    "(´・ω・`)": "しょぼん", "(´・ω・｀)": "しょぼん", "(・∀・)": "にやにや", "(゜∀゜)": "わーい",
+    "(*´ω`*)": "ほっこり", "(´;ω;`)": "ぶわっ", "(>_<)": "うう", "(><)": "うう",
+    "( ˘ω˘ )": "すやぁ", "(´-ω-`)": "うーん", "┐(´д`)┌": "やれやれ", "ヽ(^o^)丿": "わーい",
+}
+LONG_DIGITS_THRESHOLD = 9   # この桁数以上の数字は「N桁の数字」と読む
+MAX_KANA_REPEAT = 3         # 同じかなの連続はこの文字数まで
+ASCII_ART_MIN_SYMBOLS = 12  # 記号がこの数以上続いたらアスキーアートとみなす
+
+_UNIT_PATTERN = re.compile(
+    r'(\d+(?:\.\d+)?)\s?(' + "|".join(re.escape(u) for u in sorted(UNIT_READINGS, key=len, reverse=True)) + r')(?![A-Za-z])'
+)
+_KAOMOJI_PATTERN = re.compile("|".join(re.escape(k) for k in sorted(KAOMOJI_LABELS, key=len, reverse=True)))
+# 表にない顔文字: 括弧の中身が記号と顔のパーツだけのもの
+_KAOMOJI_INNER = r'[^()（）\sA-Za-z0-9ぁ-ん一-龯]'
+_GENERIC_KAOMOJI_PATTERN = re.compile(r'[(（]+%s{0,6}[ωдД∀益゜°´｀`^;；ﾟ≧≦]%s{0,6}[)）]+[/ノ丿ﾉ]?' % (_KAOMOJI_INNER, _KAOMOJI_INNER))
+_DIGIT_GROUP_PATTERN = re.compile(r'\d{1,3}(?:,\d{3})+(?!\d)')
+_LONG_DIGITS_PATTERN = re.compile(r'(?<![\d,.])\d{%d,}(?![\d,.])' % LONG_DIGITS_THRESHOLD)
+_SYMBOL_REPEAT_PATTERN = re.compile(r'([!?！？。、.,…・~〜♪☆★])[!?！？。、.,…・~〜♪☆★]+')
+_KANA_REPEAT_PATTERN = re.compile(r'([ぁ-んァ-ヶｦ-ﾟ])\1{%d,}' % MAX_KANA_REPEAT)
+_PHRASE_REPEAT_PATTERN = re.compile(r'([^\d]{2,4}?)\1{2,}') # 数字の繰り返しは意味が変わるので対象外
+_LAUGH_PATTERN = re.compile(r'(?<![A-Za-z])[wWｗＷ]{2,}(?![A-Za-z.])|(?<![A-Za-z])[wWｗＷ]$|笑{2,}|草{2,}')
+_ASCII_ART_PATTERN = re.compile(r'(?:[^\w\s]\s?){%d,}' % ASCII_ART_MIN_SYMBOLS)
+
+# ── 絵文字の読み ──
+# CLDRのアノテーションから作った「絵文字<TAB>名前」の索引 (build_emoji_index.py で生成)
+EMOJI_INDEX_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "emoji_ja.tsv")
+EMOJI_READ_LIMIT = 3 # 1メッセージで名前を読み上げる絵文字の数 (それ以降は読まない)
+EMOJI_FALLBACK = "絵文字" # 索引にない絵文字の読み
+_EMOJI_MODIFIERS = re.compile('[\uFE0F\U0001F3FB-\U0001F3FF]') # 異体字セレクタと肌の色
+_EMOJI_CHAR = '[\U0001F000-\U0001FAFF\u2600-\u27BF\u2300-\u23FF\u2B00-\u2BFF\u2190-\u21FF\u2934\u2935\u3030\u303D\u3297\u3299\u00A9\u00AE\u203C\u2049\u2122\u2139]'
+_EMOJI_TAIL = '(?:\uFE0F|[\U0001F3FB-\U0001F3FF]|[\U000E0020-\U000E007F]+)*'
+_EMOJI_PATTERN = re.compile(
+    '[\U0001F1E6-\U0001F1FF]{2}' # 国旗
+    '|[0-9#*]\uFE0F?\u20E3' # 囲み数字
+    f'|{_EMOJI_CHAR}{_EMOJI_TAIL}(?:\u200D{_EMOJI_CHAR}{_EMOJI_TAIL})*' # ZWJで結合した絵文字を含む
+)
+
+def normalize_emoji_key(emoji: str) -> str:
+    """肌の色と異体字セレクタを取り除き、索引を引くためのキーにします。"""
+    return _EMOJI_MODIFIERS.sub("", emoji)
+
+class EmojiIndex:
+    """絵文字の読みの索引です。初めて使うときにファイルをメモリマップし、二分探索で引きます。
+
+    索引はキーのUTF-8のバイト順に並んだ「絵文字<TAB>名前」の行からなり、
+    全体をメモリに読み込んだり辞書を作ったりはしません。
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.data = None
+
+    def _open(self):
+        try:
+            with open(self.path, 'rb') as f:
+                self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as e:
+            print(f"警告: 絵文字の索引 {self.path} を読み込めません。絵文字は「{EMOJI_FALLBACK}」と読みます: {e}")
+            self.data = b""
+
+    def lookup(self, key: str):
+        """キーに対応する名前を返します。見つからなければ None を返します。"""
+        if self.data is None:
+            self._open()
+        data = self.data
+        target = key.encode('utf-8')
+        low, high = 0, len(data) # どちらも行の先頭を指す
+        while low < high:
+            start = data.rfind(b"\n", 0, (low + high) // 2) + 1
+            end = data.find(b"\n", start)
+            if end == -1:
+                end = len(data)
+            line = data[start:end]
+            current, _, name = line.partition(b"\t")
+            if current == target:
+                return name.decode('utf-8')
+            if current < target:
+                low = end + 1
+            else:
+                high = start
+        return None
+
+emoji_index = EmojiIndex(EMOJI_INDEX_FILE)
+
+@functools.lru_cache(maxsize=2048)
+def emoji_name(emoji: str):
+    """絵文字 (ZWJで結合したものや肌の色付きも含む) の読みを返します。"""
+    if len(emoji) == 1 and ord(emoji) < 0x10000:
+        return None # 異体字セレクタのない記号 (♥ や ‼ など) は文章中の記号としてそのまま残す
+    key = normalize_emoji_key(emoji)
+    name = emoji_index.lookup(key)
+    if name is None and "\u200d" in key:
+        # 索引にない組み合わせは、結合されている絵文字ごとに読む
+        parts = [emoji_index.lookup(part) for part in key.split("\u200d")]
+        name = " ".join(part for part in parts if part) or None
+    return name or EMOJI_FALLBACK
+
+def replace_emoji(text: str, limit: int = EMOJI_READ_LIMIT) -> str:
+    """絵文字を名前に置き換えます。同じ絵文字の連続は1つにまとめ、limit 個を超えた分は読みません。"""
+    count = 0
+    previous, previous_end = None, 0
+    def replace(match: re.Match) -> str:
+        nonlocal count, previous, previous_end
+        emoji = match.group(0)
+        name = emoji_name(emoji)
+        if name is None:
+            return emoji
+        key = normalize_emoji_key(emoji) # 肌の色だけが違うものも同じ絵文字として扱う
+        repeated = key == previous and not text[previous_end:match.start()].strip()
+        previous, previous_end = key, match.end()
+        if repeated or count >= limit:
+            return ""
+        count += 1
+        return f" {name} "
+    return _EMOJI_PATTERN.sub(replace, text)
+
+def _read_laugh(match: re.Match) -> str:
+    return "くさ" if match.group(0)[0] == "草" else "わら"
+
+def normalize_reading(text: str) -> str:
+    """数字・単位・繰り返し・絵文字・顔文字・アスキーアートを短い読みに置き換えます。"""
+    if not text:
+        return text
+    text = replace_emoji(text)
+    text = _KAOMOJI_PATTERN.sub(lambda m: f" {KAOMOJI_LABELS[m.group(0)]} ", text) # 登録済みの顔文字
+    text = _GENERIC_KAOMOJI_PATTERN.sub(" 顔文字 ", text) # その他の顔文字
+    text = _SYMBOL_REPEAT_PATTERN.sub(r'\1', text) # ！！！や。。。を先にまとめ、強調をアスキーアートとみなさない
+    text = _ASCII_ART_PATTERN.sub(" アスキーアート ", text)
+    text = _LONG_DIGITS_PATTERN.sub(lambda m: f"{len(m.group(0))}桁の数字", text) # 電話番号やIDなど
+    text = _DIGIT_GROUP_PATTERN.sub(lambda m: m.group(0).replace(",", ""), text) # 1,000,000 -> 1000000
+    text = _UNIT_PATTERN.sub(lambda m: m.group(1) + UNIT_READINGS[m.group(2)], text)
+    text = _LAUGH_PATTERN.sub(_read_laugh, text)
+    text = _KANA_REPEAT_PATTERN.sub(lambda m: m.group(1) * MAX_KANA_REPEAT, text)
+    text = _PHRASE_REPEAT_PATTERN.sub(r'\1\1', text)
+    return re.sub(r'\s+', ' ', text).strip()
+
+# ── 連投・重複メッセージの抑制 ──
+class TokenBucket:
+    """一定速度で回復するトークンを消費して流量を制限します。"""
+    __slots__ = ("capacity", "rate", "tokens", "updated")
+
+    def __init__(self, capacity: float, rate: float, now: float):
+        self.capacity = capacity
+        self.rate = rate # 1秒あたりの回復量
+        self.tokens = capacity
+        self.updated = now
+
+    def consume(self, now: float) -> bool:
+        """トークンを1つ消費します。足りない場合は False を返します。"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+class RecentMessage:
+    """重複判定のために保持する直近のメッセージです。"""
+    __slots__ = ("key", "author_id", "first_seen", "repeats")
+
+    def __init__(self, key: str, author_id: int, first_seen: float):
+        self.key = key
+        self.author_id = author_id
+        self.first_seen = first_seen
+        self.repeats = 0 # 抑制された重複の回数
+
+class SpamFilter:
+    """読み上げ前にユーザーごとの流量制限と重複メッセージの集約を行います。"""
+    RECENT_LIMIT = 16 # 類似度を比較する直近メッセージの数 (ギルドごと)
+
+    def __init__(self):
+        self.buckets: dict[tuple[int, int], TokenBucket] = {}
+        self.recent: dict[int, list[RecentMessage]] = {}
+
+    @staticmethod
+    def collapse_runs(text: str, max_run: int) -> str:
+        """「wwwwwww」「ーーーー」のような同じ文字の連続を max_run 文字までに縮めます。"""
+        if max_run <= 0:
+            return text
+        return re.sub(r'(.)\1{%d,}' % max_run, lambda m: m.group(1) * max_run, text)
+
+    @staticmethod
+    def dedupe_key(text: str) -> str:
+        """表記ゆれを吸収した重複判定用の文字列を作ります。"""
+        text = unicodedata.normalize("NFKC", text).lower()
+        text = re.sub(r'[\s!-/:-@\[-`{-~、。！？「」『』・…ー〜]+', '', text)
+        return SpamFilter.collapse_runs(text, 1)
+
+    def allow(self, guild_id: int, user_id: int, now: float) -> bool:
+        """ユーザーのトークンバケットを消費し、読み上げてよいかを返します。"""
+        capacity = max(1, int(get_guild_setting(guild_id, "spam_burst")))
+        rate = max(0.0, float(get_guild_setting(guild_id, "spam_per_minute"))) / 60
+        bucket = self.buckets.get((guild_id, user_id))
+        if bucket is None:
+            bucket = self.buckets[(guild_id, user_id)] = TokenBucket(capacity, rate, now)
+        else:
+            bucket.capacity, bucket.rate = capacity, rate
+        if bucket.consume(now):
+            return True
+        inc_metric("spam.rate_limited")
+        return False
+
+    def find_duplicate(self, guild_id: int, text: str, now: float):
+        """時間窓内に同じ(またはほぼ同じ)内容があれば、重複として数えてその RecentMessage を返します。"""
+        window = float(get_guild_setting(guild_id, "dedupe_window"))
+        threshold = float(get_guild_setting(guild_id, "dedupe_similarity"))
+        key = self.dedupe_key(text)
+        if not key or window <= 0:
+            return None
+        recent = [r for r in self.recent.get(guild_id, []) if now - r.first_seen <= window]
+        self.recent[guild_id] = recent
+        for r in recent:
+            if r.key == key or (threshold < 1.0 and difflib.SequenceMatcher(None, r.key, key).ratio() >= threshold):
+                r.repeats += 1
+                inc_metric("spam.deduplicated")
+                return r
+        return None
+
+    def remember(self, guild_id: int, user_id: int, text: str, now: float):
+        """読み上げたメッセージを重複判定用の履歴に登録します。"""
+        key = self.dedupe_key(text)
+        if not key:
+            return
+        recent = self.recent.setdefault(guild_id, [])
+        recent.append(RecentMessage(key, user_id, now))
+        del recent[:-self.RECENT_LIMIT]
+
+    def prune(self, now: float, idle: float = 600):
+        """長く使われていないバケットと期限切れの履歴を破棄します。"""
+        for k in [k for k, b in self.buckets.items() if now - b.updated > idle]:
+            del self.buckets[k]
+        for gid in list(self.recent):
+            window = float(get_guild_setting(gid, "dedupe_window"))
+            self.recent[gid] = [r for r in self.recent[gid] if now - r.first_seen <= window]
+            if not self.recent[gid]:
+                del self.recent[gid]
+
+    def forget_guild(self, guild_id: int):
+        """ギルドに関する状態をすべて破棄します。"""
+        self.recent.pop(guild_id, None)
+        for k in [k for k in self.buckets if k[0] == guild_id]:
+            del self.buckets[k]
+
+spam_filter = SpamFilter()
+
+async def announce_repeats(guild_id: int, entry: RecentMessage, delay: float):
+    """重複の時間窓が閉じた後に、抑制したメッセージの件数を1回だけ読み上げます。"""
+    await asyncio.sleep(delay)
+    if entry.repeats <= 0 or guild_id not in voice_clients:
+        return
+    announce = f"同じメッセージが他に{entry.repeats}件"
+    entry.repeats = 0
+    try:
+        audio = await synthesis_jobs.synthesize(announce, entry.author_id, guild_id)
+    except Exception as e:
+        print(f"TTSエラー: {e}")
+        return
+    if audio:
+        play_audio(guild_id, audio, entry.author_id)
+
 # ── 音声合成関連関数 ──
+EDGE_TTS_IDLE_SECONDS = 30       # 待機中の接続を張り直すまでの秒数 (サーバー側で切られる前に入れ替える)
+EDGE_TTS_MAINTAIN_INTERVAL = 10  # 待機中の接続を点検する間隔 (秒)
+EDGE_TTS_TIMEOUT = 60            # 合成の応答を待つ上限 (秒)
+
+class EdgeTTSConnection:
+    """ハンドシェイクと speech.config の送信を済ませた Edge TTS の WebSocket 接続です。"""
+    def __init__(self, ws: aiohttp.ClientWebSocketResponse, handshake_seconds: float):
+        self.ws = ws
+        self.handshake_seconds = handshake_seconds
+        self.idle_since = time.monotonic()
+        self.turns = 0 # この接続で合成を終えた回数
+
+    @property
+    def closed(self) -> bool:
+        return self.ws.closed
+
+    async def close(self):
+        await self.ws.close()
+
+class EdgeTTSClient:
+    """Edge TTS への接続を待機させておき、合成のたびのTLS・WebSocketのハンドシェイクを省きます。
+
+    起動時に EDGE_TTS_POOL_SIZE 本の接続を張っておき、使った分は裏で補充します。合成を終えた接続は
+    次の合成に使い回しますが、サーバーが使い回しを受け付けなければ1本ずつ使い捨てに切り替えます。
+    合成ごとにハンドシェイクを待った時間と合成にかかった時間を分けてメトリクスに記録します。
+    """
+    def __init__(self, size: int = EDGE_TTS_POOL_SIZE, url: str = EDGE_TTS_WSS_URL):
+        self.size = size
+        self.url = url
+        self.session: aiohttp.ClientSession = None # すべての接続で共有する (DNSの結果もここで使い回す)
+        self.idle: collections.deque[EdgeTTSConnection] = collections.deque()
+        self.opening = 0
+        self.reuse = True       # 合成を終えた接続を使い回すか
+        self.reuse_worked = False
+        self.failing = False    # 事前接続の失敗を1回だけ表示するため
+        self.pooled = DRM is not None # False なら edge_tts.Communicate で合成する
+        self.maintainer = None
+
+    async def start(self):
+        """待機させる接続を張り始めます。既に始めている場合は何もしません。"""
+        if not self.pooled or self.maintainer is not None:
+            return
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(ttl_dns_cache=300),
+                trust_env=True,
+                timeout=aiohttp.ClientTimeout(total=None, sock_connect=10, sock_read=EDGE_TTS_TIMEOUT),
+            )
+        self.maintainer = asyncio.get_running_loop().create_task(self.maintain())
+
+    async def close(self):
+        """待機中の接続をすべて閉じます。"""
+        if self.maintainer is not None:
+            self.maintainer.cancel()
+            self.maintainer = None
+        while self.idle:
+            await self.idle.pop().close()
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def maintain(self):
+        """古くなった接続を閉じ、待機中の接続が足りなければ補充し続けます。"""
+        while True:
+            now = time.monotonic()
+            while self.idle and (self.idle[0].closed or now - self.idle[0].idle_since > EDGE_TTS_IDLE_SECONDS):
+                await self.idle.popleft().close()
+            self.refill()
+            await asyncio.sleep(EDGE_TTS_MAINTAIN_INTERVAL)
+
+    def refill(self):
+        """待機中の接続が足りない分だけ、裏で接続を張ります。"""
+        for _ in range(self.size - len(self.idle) - self.opening):
+            self.opening += 1
+            asyncio.get_running_loop().create_task(self.prewarm())
+
+    async def prewarm(self):
+        try:
+            conn = await self.connect()
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+            inc_metric("tts.prewarm_failures")
+            if not self.failing:
+                print(f"警告: Edge TTSへの事前接続に失敗しました: {e}")
+            self.failing = True
+            return
+        finally:
+            self.opening -= 1
+        self.failing = False
+        self.idle.append(conn)
+
+    async def connect(self) -> EdgeTTSConnection:
+        """新しい接続を張り、ハンドシェイクにかかった時間を記録します。"""
+        started = time.perf_counter()
+        url = self.url or WSS_URL
+        url += ("&" if "?" in url else "?") + f"ConnectionId={connect_id()}"
+        for attempt in (1, 2):
+            try:
+                ws = await self.session.ws_connect(
+                    f"{url}&Sec-MS-GEC={DRM.generate_sec_ms_gec()}&Sec-MS-GEC-Version={SEC_MS_GEC_VERSION}",
+                    compress=15,
+                    headers=DRM.headers_with_muid(WSS_HEADERS),
+                    ssl=_SSL_CTX if url.startswith("wss:") else True,
+                    receive_timeout=EDGE_TTS_TIMEOUT,
+                )
+                break
+            except aiohttp.WSServerHandshakeError as e:
+                if e.status != 403 or attempt == 2:
+                    raise
+                DRM.handle_client_response_error(e) # 時計のずれを補正してやり直す
+        try:
+            # 出力形式の指定は接続ごとに1回でよいので、ハンドシェイクの一部として先に送っておく
+            await ws.send_str(
+                f"X-Timestamp:{date_to_string()}\r\n"
+                "Content-Type:application/json; charset=utf-8\r\n"
+                "Path:speech.config\r\n\r\n"
+                '{"context":{"synthesis":{"audio":{"metadataoptions":{'
+                '"sentenceBoundaryEnabled":"false","wordBoundaryEnabled":"false"},'
+                '"outputFormat":"audio-24khz-48kbitrate-mono-mp3"}}}}\r\n'
+            )
+        except BaseException:
+            await ws.close()
+            raise
+        seconds = time.perf_counter() - started
+        inc_metric("tts.handshakes")
+        inc_metric("tts.handshake_ms_total", seconds * 1000)
+        set_metric("tts.handshake_ms_last", seconds * 1000)
+        return EdgeTTSConnection(ws, seconds)
+
+    async def acquire(self) -> tuple[EdgeTTSConnection, float]:
+        """接続を1本取り出し、(接続, この合成がハンドシェイクを待った秒数) を返します。"""
+        await self.start()
+        while self.idle:
+            conn = self.idle.pop() # 一番新しい接続から使う
+            if conn.closed or time.monotonic() - conn.idle_since > EDGE_TTS_IDLE_SECONDS:
+                await conn.close()
+                continue
+            self.refill()
+            return conn, 0.0
+        self.refill()
+        conn = await self.connect()
+        return conn, conn.handshake_seconds
+
+    async def release(self, conn: EdgeTTSConnection):
+        """合成を終えた接続を待機に戻します。使い回せない場合は閉じます。"""
+        if self.reuse and not conn.closed and len(self.idle) < self.size:
+            conn.idle_since = time.monotonic()
+            self.idle.append(conn)
+        else:
+            await conn.close()
+
+    async def request(self, ssml: str) -> bytes:
+        """SSMLを1回合成します。待機中の接続が切れていた場合は、新しい接続で1回だけやり直します。"""
+        for attempt in (1, 2):
+            conn, waited = await self.acquire()
+            reused = conn.turns > 0
+            started = time.perf_counter()
+            try:
+                audio = await self.turn(conn, ssml)
+            except (aiohttp.ClientError, asyncio.TimeoutError, ConnectionError) as e:
+                await conn.close()
+                if reused and not self.reuse_worked:
+                    # 最初の使い回しで切られた: このサーバーは1接続1合成とみなす
+                    self.reuse = False
+                    print("Edge TTSの接続は使い回せないため、合成ごとに待機中の接続を使い捨てにします。")
+                    for used in [c for c in self.idle if c.turns]:
+                        self.idle.remove(used)
+                        await used.close()
+                inc_metric("tts.retries")
+                if attempt == 2:
+                    raise
+                print(f"Edge TTSの接続が切れていたため、新しい接続でやり直します: {e!r}")
+                continue
+            except BaseException:
+                # /flush などで取り消された合成の途中の接続は、続きの音声が届くので使い回さずに閉じる
+                await conn.close()
+                raise
+            if reused:
+                self.reuse_worked = True
+                inc_metric("tts.reused")
+            if not waited:
+                inc_metric("tts.warm_hits")
+            seconds = time.perf_counter() - started
+            inc_metric("tts.requests")
+            inc_metric("tts.connect_wait_ms_total", waited * 1000)
+            inc_metric("tts.synthesis_ms_total", seconds * 1000)
+            set_metric("tts.connect_wait_ms_last", waited * 1000)
+            set_metric("tts.synthesis_ms_last", seconds * 1000)
+            await self.release(conn)
+            return audio
+
+    async def turn(self, conn: EdgeTTSConnection, ssml: str) -> bytes:
+        """接続上で1回の合成 (turn.start 〜 turn.end) を行い、MP3データを返します。"""
+        await conn.ws.send_str(ssml_headers_plus_data(connect_id(), date_to_string(), ssml))
+        audio = bytearray()
+        async for message in conn.ws:
+            if message.type == aiohttp.WSMsgType.TEXT:
+                data = message.data.encode("utf-8")
+                headers, _ = get_headers_and_data(data, data.find(b"\r\n\r\n"))
+                if headers.get(b"Path") == b"turn.end":
+                    conn.turns += 1
+                    return bytes(audio)
+            elif message.type == aiohttp.WSMsgType.BINARY:
+                # 先頭2バイトがヘッダーの長さ。最後の音声なしのメッセージは Content-Type を持たない
+                headers, data = get_headers_and_data(message.data, int.from_bytes(message.data[:2], "big"))
+                if headers.get(b"Path") == b"audio" and headers.get(b"Content-Type") == b"audio/mpeg":
+                    audio += data
+            elif message.type == aiohttp.WSMsgType.ERROR:
+                raise ConnectionError(f"Edge TTSの接続でエラーが発生しました: {conn.ws.exception()!r}")
+        raise ConnectionResetError("Edge TTSの接続が合成の途中で閉じられました")
+
+    async def synthesize(self, text: str, voice: str, rate: str = "+0%") -> bytes:
+        """テキストを合成してMP3データを返します。
+
+        通信の失敗以外の例外は、edge_tts の内部が想定と違うとみなし、以後は edge_tts.Communicate で合成します。
+        """
+        if self.pooled:
+            try:
+                return await self.synthesize_pooled(text, voice, rate)
+            except (aiohttp.ClientError, asyncio.TimeoutError, OSError, edge_tts.exceptions.NoAudioReceived):
+                raise
+            except Exception as e:
+                self.pooled = False
+                inc_metric("tts.pool_fallbacks")
+                print(f"警告: 待機中の接続での合成に失敗したため、以後は edge_tts.Communicate で合成します: {e!r}")
+                await self.close()
+        return await self.synthesize_with_communicate(text, voice, rate)
+
+    async def synthesize_pooled(self, text: str, voice: str, rate: str) -> bytes:
+        """待機中の接続を使って合成します。"""
+        config = TTSConfig(voice, rate, "+0%", "+0Hz", "SentenceBoundary")
+        audio = bytearray()
+        # edge_tts.Communicate と同じく、長い文章は4096バイトごとに分けて合成する
+        for chunk in split_text_by_byte_length(escape(remove_incompatible_characters(text)), 4096):
+            audio += await self.request(mkssml(config, chunk))
+        if not audio:
+            raise edge_tts.exceptions.NoAudioReceived("Edge TTSから音声が返されませんでした")
+        return bytes(audio)
+
+    async def synthesize_with_communicate(self, text: str, voice: str, rate: str) -> bytes:
+        """接続を使い回せない場合の合成です。ハンドシェイクの時間は合成時間に含まれます。"""
+        started = time.perf_counter()
+        audio = bytearray()
+        async for chunk in edge_tts.Communicate(text=text, voice=voice, rate=rate).stream():
+            if chunk["type"] == "audio":
+                audio += chunk["data"]
+        seconds = time.perf_counter() - started
+        inc_metric("tts.requests")
+        inc_metric("tts.synthesis_ms_total", seconds * 1000)
+        set_metric("tts.synthesis_ms_last", seconds * 1000)
+        return bytes(audio)
+
+tts_client = EdgeTTSClient()
+
 async def generate_tts(text: str, user_id: int, guild_id: int) -> bytes: 
     """テキストからTTS音声を生成します。"""
     # voice をユーザー設定から取得
@@ -170,59 +1417,718 @@ async def generate_tts(text: str, user_id: int, guild_id: int) -> bytes:
     
     tts_speed_float = get_user_speed(user_id)
 
-    communicate_kwargs = {"text": text, "voice": voice}
-
+    rate_str = "+0%"
     if tts_speed_float != 0.0:
         if tts_speed_float > 0:
             rate_str = f"+{int(tts_speed_float)}%"
         else:
             rate_str = f"{int(tts_speed_float)}%"
-        communicate_kwargs["rate"] = rate_str
-    
-    communicate = edge_tts.Communicate(**communicate_kwargs)
-    
-    with tempfile.NamedTemporaryFile(suffix=".mp3", dir=TEMP_AUDIO_DIR, delete=False) as f:
-        filepath = f.name
-    await communicate.save(filepath)
-    
-    with open(filepath, 'rb') as f:
-        audio_data = f.read()
-    os.remove(filepath)
 
-    return audio_data
+    return await tts_client.synthesize(text, voice, rate_str)
+
+# ── 再生キュー ──
+SPILL_COMPACT_BYTES = 8 * 1024 * 1024 # 退避ファイル内の読み出し済みデータがこれを超えたら詰め直す
+
+class SpillStore:
+    """メモリ予算を超えた音声を1つのセグメントファイルに追記して退避します。"""
+    def __init__(self, guild_id: int):
+        self.path = os.path.join(TEMP_AUDIO_DIR, f"spill_{guild_id}.seg")
+        self.file = None
+        self.size = 0  # ファイル末尾の位置
+        self.live = 0  # まだ読み出されていない退避データの件数
+
+    def write(self, data: bytes) -> tuple[int, int]:
+        """データを末尾に追記し、(オフセット, 長さ) を返します。"""
+        if self.file is None:
+            self.file = open(self.path, 'w+b')
+        offset = self.size
+        self.file.seek(offset)
+        self.file.write(data)
+        self.size += len(data)
+        self.live += 1
+        return offset, len(data)
+
+    def read(self, offset: int, length: int) -> bytes:
+        """退避したデータを読み出します。すべて読み出されたらファイルを空に戻します。"""
+        self.file.seek(offset)
+        data = self.file.read(length)
+        self.discard()
+        return data
+
+    def discard(self):
+        """読み出さずに捨てた退避データを数え、すべて不要になったらファイルを空に戻します。"""
+        self.live -= 1
+        if self.live == 0:
+            self.file.truncate(0)
+            self.size = 0
+
+    def compact(self, clips: list["QueuedClip"]):
+        """まだ読み出されていない退避データをファイルの先頭から詰め直し、各音声の位置を書き換えます。"""
+        position = 0
+        for clip in sorted(clips, key=lambda c: c.offset):
+            if clip.offset != position:
+                # 位置の小さい順に詰めるので、書き込み先がまだ読んでいないデータを潰すことはない
+                self.file.seek(clip.offset)
+                data = self.file.read(clip.length)
+                self.file.seek(position)
+                self.file.write(data)
+                clip.offset = position
+            position += clip.length
+        self.file.truncate(position)
+        self.size = position
+
+    def close(self):
+        """セグメントファイルを閉じて削除します。"""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+            if os.path.exists(self.path):
+                os.remove(self.path)
+        self.size = self.live = 0
+
+class QueuedClip:
+    """再生キュー内の1件の音声です。メモリ上のデータか、退避先の位置のどちらかを持ちます。"""
+    __slots__ = ("author_id", "data", "offset", "length")
+
+    def __init__(self, author_id, data: bytes = None, offset: int = 0, length: int = 0):
+        self.author_id = author_id
+        self.data = data
+        self.offset = offset
+        self.length = len(data) if data is not None else length
+
+    @property
+    def spilled(self) -> bool:
+        return self.data is None
+
+class AudioQueue:
+    """再生待ちの音声をバイト数で管理するキューです。予算を超えた音声はディスクに退避します。"""
+    # 全ギルドでメモリ上に置いている音声・ディスクに退避している音声の合計バイト数
+    memory_bytes_total = 0
+    spilled_bytes_total = 0
+
+    def __init__(self, guild_id: int):
+        self.guild_id = guild_id
+        self.items: collections.deque[QueuedClip] = collections.deque()
+        self.memory_bytes = 0
+        self.spilled_bytes = 0
+        self.spill = SpillStore(guild_id)
+
+    def qsize(self) -> int:
+        return len(self.items)
+
+    def empty(self) -> bool:
+        return not self.items
+
+    @property
+    def nbytes(self) -> int:
+        return self.memory_bytes + self.spilled_bytes
+
+    def put(self, audio_data: bytes, author_id: int = None, front: bool = False):
+        """音声を末尾 (front=True なら先頭) に追加します。ギルドまたは全体の予算を超える場合はディスクに退避します。"""
+        size = len(audio_data)
+        append = self.items.appendleft if front else self.items.append
+        if (self.memory_bytes + size > VOICE_QUEUE_GUILD_BUDGET
+                or AudioQueue.memory_bytes_total + size > VOICE_QUEUE_GLOBAL_BUDGET):
+            offset, length = self.spill.write(audio_data)
+            append(QueuedClip(author_id, offset=offset, length=length))
+            self.spilled_bytes += size
+            AudioQueue.spilled_bytes_total += size
+            inc_metric("queue.spilled_clips")
+        else:
+            append(QueuedClip(author_id, data=audio_data))
+            self.memory_bytes += size
+            AudioQueue.memory_bytes_total += size
+        update_queue_metrics()
+
+    def _release(self, clip: QueuedClip, read: bool = False):
+        """キューから外した音声のバイト数を差し引きます。read=True なら退避データを読み戻して返します。"""
+        if clip.spilled:
+            self.spilled_bytes -= clip.length
+            AudioQueue.spilled_bytes_total -= clip.length
+            if read:
+                return self.spill.read(clip.offset, clip.length)
+            self.spill.discard()
+            return None
+        self.memory_bytes -= clip.length
+        AudioQueue.memory_bytes_total -= clip.length
+        return clip.data
+
+    def get(self) -> tuple[bytes, int]:
+        """先頭の音声を (データ, 投稿者ID) で取り出します。退避済みの場合はディスクから読み戻します。"""
+        clip = self.items.popleft()
+        data = self._release(clip, read=True)
+        self.compact_spill()
+        update_queue_metrics()
+        return data, clip.author_id
+
+    def remove_author(self, author_id: int) -> int:
+        """指定したユーザーの音声をキューから取り除き、件数を返します。"""
+        kept = collections.deque()
+        removed = 0
+        for clip in self.items:
+            if clip.author_id == author_id:
+                self._release(clip)
+                removed += 1
+            else:
+                kept.append(clip)
+        self.items = kept
+        self.compact_spill()
+        update_queue_metrics()
+        return removed
+
+    def compact_spill(self):
+        """退避ファイルのうち読み出し済みの部分が閾値と残りのデータ量を超えたら、ファイルを詰め直します。
+
+        退避データが1件でも残っている間はファイルを空にできないため、予算超過が続くとファイルが
+        際限なく伸びてしまいます。残りの量以上が無駄になったときだけ詰めるので、コピー量は償却で一定です。
+        """
+        dead = self.spill.size - self.spilled_bytes
+        if dead < SPILL_COMPACT_BYTES or dead < self.spilled_bytes:
+            return
+        self.spill.compact([clip for clip in self.items if clip.spilled])
+        inc_metric("queue.spill_compactions")
+
+    def clear(self) -> int:
+        """キューを空にし、取り除いた件数を返します。"""
+        removed = len(self.items)
+        while self.items:
+            self._release(self.items.popleft())
+        update_queue_metrics()
+        return removed
+
+    def close(self):
+        """キューを空にし、退避ファイルを削除します。"""
+        self.clear()
+        self.spill.close()
+
+def get_voice_queue(guild_id: int) -> AudioQueue:
+    """指定されたギルドの再生キューを返します。なければ作成します。"""
+    if guild_id not in voice_queues:
+        voice_queues[guild_id] = AudioQueue(guild_id)
+    return voice_queues[guild_id]
+
+def discard_voice_queue(guild_id: int):
+    """指定されたギルドの再生キューと音声ソースを破棄します。"""
+    queue = voice_queues.pop(guild_id, None)
+    if queue is not None:
+        queue.close()
+    stream = voice_streams.pop(guild_id, None)
+    if stream is not None:
+        stream.close()
+
+def update_queue_metrics():
+    """再生キューのバイト数をゲージとして記録します。"""
+    set_metric("queue.memory_bytes", AudioQueue.memory_bytes_total)
+    set_metric("queue.spilled_bytes", AudioQueue.spilled_bytes_total)
+    if AudioQueue.memory_bytes_total > metrics.get("queue.memory_bytes_peak", 0):
+        set_metric("queue.memory_bytes_peak", AudioQueue.memory_bytes_total)
+
+def format_bytes(size: float) -> str:
+    """バイト数を読みやすい単位の文字列にします。"""
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.1f}{unit}"
+        size /= 1024
+    return f"{size:.1f}GB"
 
 # ── 音声再生関連関数 ──
-def play_audio(guild_id: int, audio_data: bytes):
-    """指定されたギルドのVCで音声データを再生キューに追加します。"""
+PCM_FRAME_SIZE = discord.opus.Encoder.FRAME_SIZE # 20ms分の PCM (48kHz/16bit/ステレオ)
+PCM_BYTES_PER_SECOND = discord.opus.Encoder.SAMPLING_RATE * discord.opus.Encoder.SAMPLE_SIZE
+SILENCE_FRAME = b"\x00" * PCM_FRAME_SIZE
+VOICE_STREAM_PREFETCH = 1 # 再生中に先にデコードしておく音声の数
+
+# ギルドID -> そのVC接続で再生し続ける音声ソース
+voice_streams: dict[int, "GuildAudioStream"] = {}
+# 再生中の音声の投稿者 (ユーザーごとの取り消し用)
+now_playing_authors: dict[int, int] = {}
+
+def decode_clip(audio_data: bytes) -> bytes:
+    """MP3をVCに送るPCMにデコードします。ffmpegの起動を待つので、イベントループの外で呼びます。"""
+    result = subprocess.run(
+        ["ffmpeg", "-hide_banner", "-loglevel", "error", "-i", "pipe:0",
+         "-f", "s16le", "-ar", str(discord.opus.Encoder.SAMPLING_RATE), "-ac", str(discord.opus.Encoder.CHANNELS), "pipe:1"],
+        input=audio_data, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0), # Windowsでコンソールを開かない
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.decode(errors="replace").strip() or f"ffmpeg が終了コード {result.returncode} で終了しました")
+    return result.stdout
+
+class DecodedClip:
+    """デコード済みの音声1件と、その再生位置です。"""
+    __slots__ = ("pcm", "author_id", "position")
+
+    def __init__(self, pcm: bytes, author_id: int = None):
+        self.pcm = pcm
+        self.author_id = author_id
+        self.position = 0
+
+class GuildAudioStream(discord.AudioSource):
+    """VC接続ごとに1つだけ再生し続ける音声ソースです。
+
+    音声スレッドから20msごとに read() され、再生中の音声が終わるとその場で先読み済みの
+    次の音声に切り替えます。再生するものがないときは無音を返し、再生自体は止めません。
+    再生待ちの音声は、前の音声を再生している間にイベントループ側で PCM にデコードしておきます。
+    """
+    def __init__(self, guild_id: int):
+        self.guild_id = guild_id
+        self.lock = threading.Lock() # 音声スレッドとイベントループで current / ready を共有する
+        self.current: DecodedClip = None
+        self.ready: collections.deque[DecodedClip] = collections.deque()
+        self.decoding: asyncio.Task = None
+        self.decoding_author = None
+        self.waiting_since = None # 次の音声を待たせたまま無音を返し始めた時刻
+
+    def is_opus(self) -> bool:
+        return False
+
+    def is_playing(self) -> bool:
+        return self.current is not None
+
+    def has_backlog(self) -> bool:
+        """デコード中または再生待ちの音声があるかを返します。"""
+        queue = voice_queues.get(self.guild_id)
+        return bool(self.ready or self.decoding or (queue and not queue.empty()))
+
+    def read(self) -> bytes:
+        """次の20ms分の PCM を返します。音声スレッドから呼ばれます。"""
+        with self.lock:
+            clip = self.current
+            if clip is None or clip.position >= len(clip.pcm):
+                finished = clip
+                clip = self.current = self.ready.popleft() if self.ready else None
+                now = time.perf_counter()
+                if clip is not None:
+                    # 続けて再生する音声の間に挟まった無音の長さ。先読みが間に合えば0になる
+                    gap = None
+                    if self.waiting_since is not None:
+                        gap = now - self.waiting_since
+                    elif finished is not None:
+                        gap = 0.0
+                    self.waiting_since = None
+                    self.notify(self.clip_changed, gap)
+                else:
+                    if finished is not None:
+                        if self.has_backlog():
+                            self.waiting_since = now # 次の音声のデコードが間に合わなかった
+                        self.notify(self.clip_changed, None)
+                    return SILENCE_FRAME
+            frame = clip.pcm[clip.position:clip.position + PCM_FRAME_SIZE]
+            clip.position += PCM_FRAME_SIZE
+        if len(frame) < PCM_FRAME_SIZE:
+            frame += SILENCE_FRAME[len(frame):]
+        return frame
+
+    def notify(self, callback, *args):
+        """音声スレッドからイベントループに処理を引き渡します。"""
+        if not bot.loop.is_closed():
+            bot.loop.call_soon_threadsafe(callback, *args)
+
+    def clip_changed(self, gap: float = None):
+        """音声の切り替わりを記録し、次の音声の先読みを始めます。イベントループから呼ばれます。"""
+        clip = self.current
+        if clip is None:
+            now_playing_authors.pop(self.guild_id, None)
+        else:
+            now_playing_authors[self.guild_id] = clip.author_id
+        if gap is not None:
+            inc_metric("voice.gaps")
+            inc_metric("voice.gap_ms_total", gap * 1000)
+            set_metric("voice.gap_ms_last", gap * 1000)
+            if gap * 1000 > metrics.get("voice.gap_ms_max", 0):
+                set_metric("voice.gap_ms_max", gap * 1000)
+        self.fill()
+
+    def fill(self):
+        """再生待ちの音声を先読みの数までデコードします。イベントループから呼びます。"""
+        queue = voice_queues.get(self.guild_id)
+        if self.decoding is not None or queue is None or queue.empty() or len(self.ready) >= VOICE_STREAM_PREFETCH:
+            return
+        # 退避済みの音声はデコードの直前にディスクから読み戻す
+        audio_data, author_id = queue.get()
+        self.decoding_author = author_id
+        self.decoding = bot.loop.create_task(self.decode(audio_data, author_id))
+
+    async def decode(self, audio_data: bytes, author_id: int):
+        started = time.perf_counter()
+        try:
+            pcm = await asyncio.to_thread(decode_clip, audio_data)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"再生エラー: {e}")
+            pcm = None
+        finally:
+            if self.decoding is asyncio.current_task():
+                self.decoding = self.decoding_author = None
+        set_metric("voice.decode_ms_last", (time.perf_counter() - started) * 1000)
+        if pcm:
+            with self.lock:
+                self.ready.append(DecodedClip(pcm, author_id))
+        self.fill()
+
+    def skip(self) -> bool:
+        """再生中の音声を止めます。次の read() で次の音声に切り替わります。"""
+        with self.lock:
+            if self.current is None:
+                return False
+            self.current.position = len(self.current.pcm)
+            return True
+
+    def remove_author(self, author_id: int) -> int:
+        """指定したユーザーのデコード中・デコード済みの音声を取り除き、件数を返します。"""
+        removed = 0
+        if self.decoding is not None and self.decoding_author == author_id:
+            self.decoding.cancel()
+            self.decoding = self.decoding_author = None
+            removed += 1
+        with self.lock:
+            kept = collections.deque(c for c in self.ready if c.author_id != author_id)
+            removed += len(self.ready) - len(kept)
+            self.ready = kept
+        self.fill()
+        if not self.has_backlog():
+            self.waiting_since = None
+        return removed
+
+    def clear(self) -> int:
+        """デコード中・デコード済みの音声をすべて取り除き、件数を返します。再生中の音声はそのままです。"""
+        removed = 0
+        if self.decoding is not None:
+            self.decoding.cancel()
+            self.decoding = self.decoding_author = None
+            removed += 1
+        with self.lock:
+            removed += len(self.ready)
+            self.ready.clear()
+            self.waiting_since = None
+        return removed
+
+    def close(self):
+        """すべての音声を捨てます。以後は無音だけを返します。"""
+        self.clear()
+        with self.lock:
+            self.current = None
+        now_playing_authors.pop(self.guild_id, None)
+
+def get_voice_stream(guild_id: int) -> GuildAudioStream:
+    """指定されたギルドの音声ソースを返します。なければ作成します。"""
+    if guild_id not in voice_streams:
+        voice_streams[guild_id] = GuildAudioStream(guild_id)
+    return voice_streams[guild_id]
+
+def start_voice_stream(guild_id: int):
+    """VC接続で音声ソースの再生を始めます。既に再生中なら何もしません。"""
     vc = voice_clients.get(guild_id)
-    if not vc or not vc.is_connected():
+    stream = voice_streams.get(guild_id)
+    if not vc or not vc.is_connected() or stream is None:
         return
+    if vc.is_playing():
+        if vc.source is stream:
+            return
+        vc.stop()
 
-    with tempfile.NamedTemporaryFile(suffix=".mp3", dir=TEMP_AUDIO_DIR, delete=False) as f:
-        f.write(audio_data)
-        filepath = f.name
-
-    async def play_next(error):
+    def after(error):
+        # 切断やエラーで再生が終わった。接続が生きていれば同じ音声ソースで再開する
         if error:
             print(f"再生エラー: {error}")
-        
-        if os.path.exists(filepath):
-            os.remove(filepath)
-        
-        if not voice_queues[guild_id].empty():
-            next_audio = await voice_queues[guild_id].get()
-            play_audio(guild_id, next_audio)
+        stream.notify(start_voice_stream, guild_id)
 
-    async def add_and_play():
-        await voice_queues[guild_id].put(audio_data)
-        if not vc.is_playing() and voice_queues[guild_id].qsize() == 1:
-            first_audio = await voice_queues[guild_id].get()
-            with tempfile.NamedTemporaryFile(suffix=".mp3", dir=TEMP_AUDIO_DIR, delete=False) as f:
-                f.write(first_audio)
-                first_filepath = f.name
-            vc.play(discord.FFmpegPCMAudio(first_filepath), after=lambda e: bot.loop.create_task(play_next(e)))
+    # 音声ソースは接続をまたいで使い回すので、再接続後は中断した音声の続きから再生される
+    vc.play(stream, after=after)
+
+def play_audio(guild_id: int, audio_data: bytes, author_id: int = None):
+    """指定されたギルドのVCで音声データを再生キューに追加します。"""
+    vc = voice_clients.get(guild_id)
+    if not vc:
+        return
+
+    # 再接続中もキューには積んでおき、接続が戻ったら続きから再生する
+    get_voice_queue(guild_id).put(audio_data, author_id)
+    get_voice_stream(guild_id).fill()
+    start_voice_stream(guild_id)
+
+# ── 声のカタログ ──
+VOICE_CATALOG_TTL = 24 * 60 * 60 # 声の一覧を取り直すまでの秒数
+GENDER_LABELS = {"Female": "女性", "Male": "男性"}
+# 一覧をまだ取得できていないときに使う声
+FALLBACK_VOICES = [
+    {"ShortName": "ja-JP-NanamiNeural", "Locale": "ja-JP", "Gender": "Female"},
+    {"ShortName": "ja-JP-KeitaNeural", "Locale": "ja-JP", "Gender": "Male"},
+]
+
+class VoiceCatalog:
+    """edge_tts.list_voices の結果をディスクにキャッシュし、メモリ上の索引から検索します。"""
+    def __init__(self):
+        self.fetched_at = 0.0
+        self.voices: list[dict] = []
+        self.by_name: dict[str, dict] = {}
+        self.search_keys: list[tuple[str, dict]] = [] # (検索用の小文字文字列, 声)
+        self.locales: list[str] = []
+        self._refresh_lock = None
+        self._index(FALLBACK_VOICES)
+
+    @property
+    def refresh_lock(self) -> asyncio.Lock:
+        # voice_catalog は import 時に作られるため、ロックは実行中のループで最初に使うときに作る (Python 3.9 対策)
+        if self._refresh_lock is None:
+            self._refresh_lock = asyncio.Lock()
+        return self._refresh_lock
+
+    def _index(self, voices: list[dict]):
+        """声の一覧から検索用の索引を作り直します。"""
+        voices = sorted(voices, key=lambda v: (v["Locale"] != "ja-JP", v["Locale"], v["ShortName"]))
+        self.voices = voices
+        self.by_name = {v["ShortName"]: v for v in voices}
+        self.search_keys = [(f"{v['ShortName']} {v.get('FriendlyName', '')}".lower(), v) for v in voices]
+        self.locales = sorted({v["Locale"] for v in voices})
+
+    def load(self):
+        """ディスクのキャッシュから声の一覧を読み込みます。"""
+        if not os.path.exists(VOICE_CATALOG_FILE):
+            return
+        try:
+            with open(VOICE_CATALOG_FILE, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.fetched_at = data.get("fetched_at", 0.0)
+            if data.get("voices"):
+                self._index(data["voices"])
+        except (json.JSONDecodeError, KeyError) as e:
+            print(f"警告: {VOICE_CATALOG_FILE} が壊れています。声の一覧を取り直します。: {e}")
+
+    def is_stale(self) -> bool:
+        return time.time() - self.fetched_at > VOICE_CATALOG_TTL
+
+    async def refresh(self, force: bool = False):
+        """期限切れの場合だけ Edge TTS から声の一覧を取り直し、ディスクに保存します。"""
+        async with self.refresh_lock:
+            if not force and not self.is_stale():
+                return
+            try:
+                voices = await edge_tts.list_voices()
+            except Exception as e:
+                print(f"警告: 声の一覧の取得に失敗しました: {e}")
+                return
+            keys = ("ShortName", "Locale", "Gender", "FriendlyName")
+            voices = [{k: v[k] for k in keys if k in v} for v in voices if "ShortName" in v and "Locale" in v]
+            self.fetched_at = time.time()
+            self._index(voices)
+            data = {"fetched_at": self.fetched_at, "voices": voices}
+            try:
+                await asyncio.to_thread(self._save, data)
+            except IOError as e:
+                print(f"エラー: {VOICE_CATALOG_FILE} の保存に失敗しました: {e}")
+            print(f"声の一覧を更新しました ({len(voices)}件)")
+
+    @staticmethod
+    def _save(data: dict):
+        with open(VOICE_CATALOG_FILE, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+
+    def display_name(self, short_name: str) -> str:
+        """「Nanami (女性, ja-JP)」のような表示名を返します。"""
+        voice = self.by_name.get(short_name)
+        if voice is None:
+            return short_name
+        name = short_name[len(voice["Locale"]) + 1:] if short_name.startswith(voice["Locale"] + "-") else short_name
+        name = name.removesuffix("Neural")
+        return f"{name} ({GENDER_LABELS.get(voice.get('Gender'), voice.get('Gender', '?'))}, {voice['Locale']})"
+
+    def resolve(self, query: str):
+        """正式名または一意に決まる部分一致から声を探します。見つからなければ None を返します。"""
+        if query in self.by_name:
+            return self.by_name[query]
+        matches = self.search(query, limit=2)
+        return matches[0] if len(matches) == 1 else None
+
+    def search(self, query: str, locale: str = None, gender: str = None, limit: int = 25) -> list[dict]:
+        """ロケール・性別で絞り込み、名前に query を含む声を返します。"""
+        query = (query or "").lower()
+        results = []
+        for key, voice in self.search_keys:
+            if locale and voice["Locale"] != locale:
+                continue
+            if gender and voice.get("Gender") != gender:
+                continue
+            if query and query not in key:
+                continue
+            results.append(voice)
+            if len(results) >= limit:
+                break
+        return results
+
+voice_catalog = VoiceCatalog()
+voice_catalog.load()
+
+# ── 合成ジョブの管理 ──
+SYNTHESIS_CONCURRENCY = 8 # Edge TTS へ同時に送る合成リクエストの上限
+
+class SynthesisJobs:
+    """ギルドごとに実行中の合成処理を追跡し、まとめて取り消せるようにします。"""
+    def __init__(self, concurrency: int = SYNTHESIS_CONCURRENCY):
+        self.concurrency = concurrency
+        self._slots = None
+        self.jobs: dict[int, dict[asyncio.Task, int]] = {} # ギルドID -> {合成タスク: 投稿者ID}
+
+    @property
+    def slots(self) -> asyncio.Semaphore:
+        # Python 3.9 では asyncio の同期プリミティブが作成時のループに結び付くため、
+        # import 時ではなく bot.run が始めたループの上で最初に使うときに作る
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.concurrency)
+        return self._slots
+
+    async def _run(self, text: str, user_id: int, guild_id: int) -> bytes:
+        # 取り消されたジョブは async with を抜けた時点ですぐに枠を返す
+        async with self.slots:
+            return await generate_tts(text, user_id, guild_id)
+
+    async def synthesize(self, text: str, user_id: int, guild_id: int):
+        """合成ジョブを登録して実行します。ジョブが取り消された場合は None を返します。"""
+        task = asyncio.get_running_loop().create_task(self._run(text, user_id, guild_id))
+        jobs = self.jobs.setdefault(guild_id, {})
+        jobs[task] = user_id
+        set_metric("synthesis.in_flight", sum(len(j) for j in self.jobs.values()))
+        try:
+            return await task
+        except asyncio.CancelledError:
+            if not task.cancelled():
+                raise # 呼び出し元自体が取り消された場合はそのまま伝える
+            inc_metric("synthesis.cancelled")
+            return None
+        finally:
+            jobs.pop(task, None)
+            if not jobs and self.jobs.get(guild_id) is jobs:
+                del self.jobs[guild_id]
+            set_metric("synthesis.in_flight", sum(len(j) for j in self.jobs.values()))
+
+    def cancel(self, guild_id: int, author_id: int = None) -> int:
+        """ギルドの合成ジョブ (author_id を指定した場合はそのユーザーの分だけ) を取り消し、件数を返します。"""
+        cancelled = 0
+        for task, user_id in list(self.jobs.get(guild_id, {}).items()):
+            if author_id is None or user_id == author_id:
+                if task.cancel():
+                    cancelled += 1
+        return cancelled
+
+synthesis_jobs = SynthesisJobs()
+
+def skip_current(guild_id: int) -> bool:
+    """再生中の音声だけを止めます。キューの次の音声はそのまま再生されます。"""
+    stream = voice_streams.get(guild_id)
+    return bool(stream and stream.skip())
+
+def flush_guild_audio(guild_id: int) -> tuple[int, int]:
+    """合成中のジョブを取り消し、キューを空にして再生を止めます。(取り消した合成数, 消した待ち数) を返します。"""
+    cancelled = synthesis_jobs.cancel(guild_id)
+    queue = voice_queues.get(guild_id)
+    removed = queue.clear() if queue else 0
+    stream = voice_streams.get(guild_id)
+    if stream:
+        removed += stream.clear()
+    skip_current(guild_id)
+    return cancelled, removed
+
+def purge_author_audio(guild_id: int, author_id: int) -> tuple[int, int]:
+    """指定したユーザーの合成中ジョブと再生待ちの音声を取り除きます。再生中ならそれも止めます。"""
+    cancelled = synthesis_jobs.cancel(guild_id, author_id)
+    queue = voice_queues.get(guild_id)
+    removed = queue.remove_author(author_id) if queue else 0
+    stream = voice_streams.get(guild_id)
+    if stream:
+        removed += stream.remove_author(author_id)
+    if now_playing_authors.get(guild_id) == author_id:
+        skip_current(guild_id)
+    return cancelled, removed
+
+# ── ボイス接続の管理 ──
+class VoiceSessionManager:
+    """discord.py 自身の再接続があきらめたVC接続を引き継ぎ、キューを保ったままバックオフ付きで再接続します。
+
+    一時的な切断は discord.py の VoiceClient が自分で再接続する (その間も音声の再生は止まらない) ので、
+    ここでは ReadingVoiceClient.cleanup() で接続が破棄されたことを知らされてから動きます。
+    """
+    RECONNECT_DELAYS = (1, 2, 4, 8, 16, 30) # 再接続を試みる間隔 (秒)
+
+    def __init__(self):
+        self.channels: dict[int, int] = {}                    # ギルドID -> 接続先のVCのID
+        self.reconnecting: dict[int, asyncio.Task] = {}       # 再接続中のタスク
+
+    def track(self, guild_id: int, channel_id: int):
+        """接続先のVCを記録し、以後の切断を再接続の対象にします。"""
+        self.channels[guild_id] = channel_id
+
+    def forget(self, guild_id: int):
+        """意図した切断のため、再接続の対象から外します。"""
+        self.channels.pop(guild_id, None)
+        task = self.reconnecting.pop(guild_id, None)
+        if task and task is not asyncio.current_task():
+            task.cancel()
+
+    def is_active(self, guild_id: int) -> bool:
+        """接続中または再接続中のセッションがあるかを返します。"""
+        return guild_id in self.channels
+
+    def is_reconnecting(self, guild_id: int) -> bool:
+        return guild_id in self.reconnecting
+
+    def handle_cleanup(self, vc):
+        """VC接続が破棄されたときに呼ばれます。意図した切断でなければ再接続を開始します。"""
+        gid = vc.guild.id
+        if voice_clients.get(gid) is not vc or gid not in self.channels or gid in self.reconnecting:
+            return # 退出コマンドなどで forget() 済み、または既に置き換えられた接続
+        print(f"VC接続の切断を検知しました: {gid}")
+        inc_metric("voice.disconnects")
+        self.reconnecting[gid] = asyncio.get_running_loop().create_task(self.reconnect(gid))
+
+    async def reconnect(self, guild_id: int):
+        """バックオフしながら再接続を試み、成功したらキューの再生を再開します。"""
+        started = time.perf_counter()
+        try:
+            for attempt, delay in enumerate(self.RECONNECT_DELAYS, 1):
+                channel = bot.get_channel(self.channels.get(guild_id, 0))
+                if channel is None:
+                    break
+                try:
+                    # 破棄された接続は discord.py が片付け済みなので、そのまま新しく接続する
+                    vc = await channel.connect(timeout=10.0, cls=ReadingVoiceClient)
+                except (asyncio.TimeoutError, discord.ClientException, discord.HTTPException, OSError) as e:
+                    print(f"VC再接続に失敗しました ({attempt}/{len(self.RECONNECT_DELAYS)}): {e}")
+                    await asyncio.sleep(delay)
+                    continue
+
+                voice_clients[guild_id] = vc
+                latency = time.perf_counter() - started
+                inc_metric("voice.reconnects")
+                set_metric("voice.reconnect_seconds_last", latency)
+                if latency > metrics.get("voice.reconnect_seconds_max", 0):
+                    set_metric("voice.reconnect_seconds_max", latency)
+                print(f"VCに再接続しました: {channel.name} ({latency:.2f}秒, {attempt}回目)")
+                start_voice_stream(guild_id)
+                return
 
-    bot.loop.create_task(add_and_play())
+            # 再接続できなかった場合は、退出したときと同じように後片付けする
+            inc_metric("voice.reconnect_failures")
+            print(f"VCに再接続できなかったため、接続を破棄しました: {guild_id}")
+            self.forget(guild_id)
+            voice_clients.pop(guild_id, None)
+            discard_voice_queue(guild_id)
+            reading_channels.pop(guild_id, None)
+            last_active_time.pop(guild_id, None)
+        finally:
+            if self.reconnecting.get(guild_id) is asyncio.current_task():
+                del self.reconnecting[guild_id]
+
+voice_sessions = VoiceSessionManager()
+
+class ReadingVoiceClient(discord.VoiceClient):
+    """接続が破棄されたことを voice_sessions に知らせる VoiceClient です。
+
+    cleanup() は、discord.py 自身の再接続があきらめたときと、disconnect() で切断したときに呼ばれます。
+    """
+    def cleanup(self):
+        super().cleanup()
+        voice_sessions.handle_cleanup(self)
 
 # ── Utility関数 ──
 def create_progress_bar(percentage):
@@ -232,23 +2138,786 @@ def create_progress_bar(percentage):
     bar = '█' * filled_length + '　' * (bar_length - filled_length)
     return f"{percentage:.1f}% [{bar}]"
 
+# ── サンプリングプロファイラ ──
+PROFILER_MAX_SECONDS = 300     # 1回のプロファイルの最大時間 (秒)
+PROFILER_INTERVAL = 0.005      # サンプリング間隔 (秒)
+PROFILER_TOP_N = 15            # 要約に表示する関数の数
+# 計測中だけGILの切り替え間隔を短くする (秒、既定は変更しない)。既定の5msのままだと、サンプラーが
+# GILを取れるのはイベントループが select で待機した瞬間に偏る。ただしプロセス全体に効くため、
+# 音声送信スレッドなどの切り替えも増えて計測対象と音声に影響する。必要なときだけ環境変数で指定する
+PROFILER_SWITCH_INTERVAL = float(os.getenv("PROFILER_SWITCH_INTERVAL", "0")) or None
+
+bot_thread_id = None # Botのイベントループを実行しているスレッドのID (run_bot で設定)
+
+class SamplingProfiler:
+    """別スレッドから一定間隔で各スレッドのスタックを採取する、低負荷のプロファイラです。
+
+    結果はフレームグラフ用の collapsed-stack 形式と、コルーチンごとの上位関数の要約として
+    PROFILES_DIR に書き出されます。Botの処理自体には何も差し込まないため、本番環境でも使えます。
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.started_at = 0.0
+        self.duration = 0.0
+        self.last_result = None # (collapsed のパス, 要約のパス, 要約テキスト)
+        self.last_error = None  # 直近のプロファイルが失敗した場合の理由
+
+    def is_running(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self, duration: float, interval: float = PROFILER_INTERVAL) -> bool:
+        """プロファイルを開始します。既に実行中の場合は False を返します。"""
+        with self.lock:
+            if self.is_running():
+                return False
+            self.duration = max(1.0, min(float(duration), PROFILER_MAX_SECONDS))
+            self.started_at = time.time()
+            self.last_result = self.last_error = None
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self._run, args=(self.duration, interval), name="profiler", daemon=True)
+            self.thread.start()
+            return True
+
+    def stop(self, wait: bool = True):
+        """プロファイルを途中で終了します。wait=True の場合は結果の書き出しまで待ちます。"""
+        self.stop_event.set()
+        thread = self.thread
+        if wait and thread is not None and thread is not threading.current_thread():
+            thread.join()
+        return self.last_result
+
+    def _thread_label(self, ident: int, names: dict[int, str]) -> str:
+        if ident == bot_thread_id:
+            return "bot"
+        return names.get(ident, str(ident))
+
+    @staticmethod
+    def _task_label(task) -> str:
+        """タスクの名前を返します。discord.py のイベントは _run_event を経由するので、名前で区別します。
+
+        名前のないタスク ("Task-12" など) は、タスクごとに分かれないようコルーチン名でまとめます。
+        """
+        if task is None:
+            return "(イベントループ)"
+        name = task.get_name()
+        return task.get_coro().__qualname__ if re.fullmatch(r"Task-\d+", name) else name
+
+    @staticmethod
+    def _frame_name(frame) -> str:
+        code = frame.f_code
+        return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+    def _run(self, duration: float, interval: float):
+        stacks: collections.Counter = collections.Counter()
+        # タスク名 -> 末端の関数名 -> 件数
+        by_task: dict[str, collections.Counter] = collections.defaultdict(collections.Counter)
+        own = threading.get_ident()
+        deadline = time.perf_counter() + duration
+        switch_interval = sys.getswitchinterval()
+        if PROFILER_SWITCH_INTERVAL:
+            sys.setswitchinterval(PROFILER_SWITCH_INTERVAL)
+        try:
+            samples = self._sample(stacks, by_task, own, deadline, interval)
+            self.last_result = self._write(stacks, by_task, samples)
+        except Exception as e:
+            # スレッドごと黙って終わらないよう、理由を残してログに出す (is_running() は False になる)
+            self.last_error = f"{type(e).__name__}: {e}"
+            print(f"プロファイルに失敗しました: {self.last_error}")
+            traceback.print_exc()
+            return
+        finally:
+            sys.setswitchinterval(switch_interval)
+        print(f"プロファイル終了: {samples} サンプル -> {self.last_result[0]}")
+
+    def _sample(self, stacks, by_task, own: int, deadline: float, interval: float) -> int:
+        samples = 0
+        while not self.stop_event.is_set() and time.perf_counter() < deadline:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            loop = bot.loop if isinstance(bot.loop, asyncio.AbstractEventLoop) else None
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                label = self._thread_label(ident, names)
+                frames = []
+                while frame is not None:
+                    frames.append(self._frame_name(frame))
+                    frame = frame.f_back
+                frames.reverse()
+                stacks[";".join([label] + frames)] += 1
+
+                if ident == bot_thread_id and loop is not None and frames:
+                    by_task[self._task_label(asyncio.current_task(loop))][frames[-1]] += 1
+            samples += 1
+            time.sleep(interval)
+        return samples
+
+    def _write(self, stacks, by_task, samples):
+        os.makedirs(PROFILES_DIR, exist_ok=True)
+        stamp = time.strftime('%Y%m%d_%H%M%S', time.localtime(self.started_at))
+        collapsed_path = os.path.join(PROFILES_DIR, f"profile_{stamp}.collapsed")
+        summary_path = os.path.join(PROFILES_DIR, f"profile_{stamp}.txt")
+        with open(collapsed_path, 'w', encoding='utf-8') as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+        lines = [f"サンプル数: {samples} / 間隔: {PROFILER_INTERVAL * 1000:.0f}ms / 時間: {time.time() - self.started_at:.1f}秒"]
+        for task_name, counter in sorted(by_task.items(), key=lambda item: -sum(item[1].values())):
+            total = sum(counter.values())
+            lines.append(f"\n[{task_name}] {total} サンプル")
+            for func, count in counter.most_common(PROFILER_TOP_N):
+                lines.append(f"  {count / total * 100:5.1f}%  {func}")
+        summary = "\n".join(lines)
+        with open(summary_path, 'w', encoding='utf-8') as f:
+            f.write(summary + "\n")
+        return collapsed_path, summary_path, summary
+
+profiler = SamplingProfiler()
+
+# ── イベントループの遅延監視 ──
+LOOP_LAG_INTERVAL = 0.1       # ハートビートの間隔 (秒)
+LOOP_LAG_THRESHOLD = 0.25     # この時間以上ループが止まったらスタックを採取する (秒)
+LOOP_LAG_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 5.0) # 停止時間のヒストグラムの区切り (秒)
+
+class LoopLagWatchdog:
+    """イベントループの遅延を常時計測し、止まっている間のBotスレッドのスタックを記録します。
+
+    ループ上のハートビートが最終時刻を更新し、別スレッドがそれを監視します。
+    ハートビートが閾値を超えて途絶えたら、その瞬間に実行中のスタックを採取し、
+    ループが戻ったときに停止時間とともに記録します。
+    """
+    def __init__(self, threshold: float = LOOP_LAG_THRESHOLD, interval: float = LOOP_LAG_INTERVAL):
+        self.threshold = threshold
+        self.interval = interval
+        self.thread_id = None
+        self.last_beat = time.perf_counter()
+        self.captured_stack = None # 停止中に採取したスタック (traceback.StackSummary)
+        self.histogram = [0] * (len(LOOP_LAG_BUCKETS) + 1)
+        self.offenders: dict[str, list] = {} # 原因の関数 -> [回数, 合計秒, 最大秒, スタック文字列]
+        self.task = None
+        self.thread = None
+
+    def start(self):
+        """イベントループのスレッドから呼び出して監視を開始します。"""
+        if self.task is not None:
+            return
+        self.thread_id = threading.get_ident()
+        self.last_beat = time.perf_counter()
+        self.task = asyncio.get_running_loop().create_task(self.heartbeat())
+        self.thread = threading.Thread(target=self.watch, name="loop-lag-watchdog", daemon=True)
+        self.thread.start()
+
+    async def heartbeat(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            now = time.perf_counter()
+            lag = max(0.0, now - started - self.interval)
+            self.last_beat = now
+            set_metric("loop.lag_seconds", lag)
+            if lag > metrics.get("loop.lag_seconds_max", 0):
+                set_metric("loop.lag_seconds_max", lag)
+            if lag >= LOOP_LAG_BUCKETS[0]:
+                self.record(lag)
+
+    def watch(self):
+        """ハートビートの途絶を監視し、閾値を超えたらBotスレッドのスタックを採取します。"""
+        while True:
+            time.sleep(self.interval / 2)
+            if self.captured_stack is None and time.perf_counter() - self.last_beat > self.interval + self.threshold:
+                frame = sys._current_frames().get(self.thread_id)
+                if frame is not None:
+                    self.captured_stack = traceback.extract_stack(frame)
+
+    @staticmethod
+    def culprit(stack) -> str:
+        """スタックのうち、このファイル内で最も内側のフレームを原因として返します。"""
+        for entry in reversed(stack):
+            if os.path.abspath(entry.filename) == os.path.abspath(__file__):
+                return f"{entry.name} (main.py:{entry.lineno})"
+        entry = stack[-1]
+        return f"{entry.name} ({os.path.basename(entry.filename)}:{entry.lineno})"
+
+    def record(self, lag: float):
+        """停止時間をヒストグラムに加え、閾値を超えていれば原因のスタックと一緒に記録します。"""
+        bucket = next((i for i, limit in enumerate(LOOP_LAG_BUCKETS) if lag < limit), len(LOOP_LAG_BUCKETS))
+        self.histogram[bucket] += 1
+        stack, self.captured_stack = self.captured_stack, None
+        if lag < self.threshold:
+            return
+        inc_metric("loop.stalls")
+        key = self.culprit(stack) if stack else "(不明)"
+        entry = self.offenders.setdefault(key, [0, 0.0, 0.0, ""])
+        entry[0] += 1
+        entry[1] += lag
+        if lag >= entry[2]:
+            entry[2] = lag
+            entry[3] = "".join(traceback.format_list(stack)) if stack else ""
+        print(f"警告: イベントループが {lag:.2f}秒停止しました: {key}")
+        if entry[0] == 1 and entry[3]:
+            print(entry[3], end="") # 初めて見つかった原因はスタック全体もログに残す
+
+    def worst_offenders(self, n: int = 3) -> list[tuple[str, list]]:
+        """合計停止時間の長い順に原因を返します。"""
+        return sorted(self.offenders.items(), key=lambda item: -item[1][1])[:n]
+
+    def format_histogram(self) -> str:
+        labels = [f"<{limit:g}s" for limit in LOOP_LAG_BUCKETS] + [f"≥{LOOP_LAG_BUCKETS[-1]:g}s"]
+        return " / ".join(f"{label}: {count}" for label, count in zip(labels, self.histogram) if count) or "なし"
+
+loop_watchdog = LoopLagWatchdog()
+
+# ── スラッシュコマンド同期 ──
+def compute_command_tree_hash() -> str:
+    """コマンドツリー (名前・説明・引数・選択肢) から安定したハッシュを計算します。"""
+    payload = []
+    for command in bot.tree.get_commands():
+        try:
+            data = command.to_dict(bot.tree)
+        except TypeError: # 古い discord.py では引数を取らない
+            data = command.to_dict()
+        payload.append(data)
+    payload.sort(key=lambda d: (d.get("type", 1), d["name"]))
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+def load_command_sync_state() -> dict:
+    """前回のスラッシュコマンド同期の記録を読み込みます。"""
+    if os.path.exists(COMMAND_SYNC_FILE):
+        try:
+            with open(COMMAND_SYNC_FILE, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except json.JSONDecodeError:
+            print(f"警告: {COMMAND_SYNC_FILE} が壊れています。スラッシュコマンドを再同期します。")
+    return {}
+
+def save_command_sync_state(state: dict):
+    """スラッシュコマンド同期の記録を保存します。"""
+    try:
+        with open(COMMAND_SYNC_FILE, 'w', encoding='utf-8') as f:
+            json.dump(state, f, indent=4, ensure_ascii=False)
+    except IOError as e:
+        print(f"エラー: {COMMAND_SYNC_FILE} の保存に失敗しました: {e}")
+
+async def sync_command_tree(force: bool = False) -> bool:
+    """コマンドツリーのハッシュが前回と異なる場合だけ同期します。同期した場合は True を返します。"""
+    tree_hash = compute_command_tree_hash()
+    state = load_command_sync_state()
+    if not force and state.get("hash") == tree_hash and state.get("application_id") == bot.application_id:
+        last_duration = state.get("duration", 0.0)
+        inc_metric("command_sync.skipped")
+        inc_metric("command_sync.seconds_saved", last_duration)
+        print(f"スラッシュコマンドに変更がないため同期をスキップしました (約{last_duration:.2f}秒短縮)")
+        return False
+
+    started = time.perf_counter()
+    await bot.tree.sync()
+    duration = time.perf_counter() - started
+    save_command_sync_state({
+        "hash": tree_hash,
+        "application_id": bot.application_id,
+        "duration": duration,
+        "synced_at": time.strftime('%Y/%m/%d %H:%M:%S'),
+    })
+    inc_metric("command_sync.synced")
+    print(f"スラッシュコマンド同期完了 ({duration:.2f}秒)")
+    return True
+
+# ── 管理API ──
+ADMIN_PAGE_LIMIT_MAX = 500 # 一覧を1回で返す最大件数
+ADMIN_EVENTS_KEEP = 2000 # GUIが取りこぼしたときのために保持するイベント数
+ADMIN_EVENTS_WAIT = 25 # イベントを待つロングポーリングの最大秒数
+
+class AdminEventLog:
+    """GUIへ送る差分 (ログ・サーバー情報の変化) に通し番号を付けて保持します。
+
+    どのスレッドから追加しても構いません。待っているリクエストはBotのループ上で起こします。
+    """
+    def __init__(self, keep: int = ADMIN_EVENTS_KEEP):
+        self.events: collections.deque[tuple[int, dict]] = collections.deque(maxlen=keep)
+        self.seq = 0
+        self.lock = threading.Lock()
+        self.loop = None
+        self.changed = None # asyncio.Event (Botのループで作る)
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.changed = asyncio.Event()
+
+    def publish(self, event: dict):
+        with self.lock:
+            self.seq += 1
+            self.events.append((self.seq, event))
+        if self.loop and not self.loop.is_closed():
+            try:
+                self.loop.call_soon_threadsafe(self.changed.set)
+            except RuntimeError:
+                pass # ループが終了している
+
+    def log(self, text: str):
+        self.publish({"type": "log", "text": text})
+
+    def guild_changed(self, guild_id: int):
+        """サーバーの表示内容が変わったことを通知します。Botが退出したサーバーなら削除を通知します。"""
+        guild = bot.get_guild(guild_id)
+        if guild:
+            self.publish({"type": "guild", "guild": AdminAPI.guild_info(guild)})
+        else:
+            self.publish({"type": "guild_removed", "id": str(guild_id)})
+
+    def reset(self):
+        """差分ではなくスナップショットを取り直すよう通知します。"""
+        self.publish({"type": "reset"})
+
+    def since(self, seq: int):
+        """seq より後のイベントを返します。取りこぼしがあれば None を返します。"""
+        with self.lock:
+            if seq > self.seq or (self.events and seq < self.events[0][0] - 1):
+                return None # Botが再起動したか、保持している範囲より古い
+            return [event for n, event in self.events if n > seq], self.seq
+
+    def recent_logs(self, limit: int = 200) -> list[str]:
+        with self.lock:
+            logs = [event["text"] for _, event in self.events if event["type"] == "log"]
+        return logs[-limit:]
+
+    async def wait(self, seq: int, timeout: float):
+        """seq より後のイベントが届くまで待ちます。"""
+        while self.seq <= seq:
+            self.changed.clear()
+            if self.seq > seq:
+                break
+            try:
+                await asyncio.wait_for(self.changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                return
+
+admin_events = AdminEventLog()
+
+class EventLogWriter:
+    """標準出力に書きつつ、1行ごとにGUIへのログとしても送ります。"""
+    def __init__(self, stream, events: AdminEventLog):
+        self.stream = stream
+        self.events = events
+        self.buffer = ""
+
+    def write(self, text: str):
+        if self.stream:
+            self.stream.write(text)
+        self.buffer += text
+        *lines, self.buffer = self.buffer.split("\n")
+        for line in lines:
+            self.events.log(line)
+        return len(text)
+
+    def flush(self):
+        if self.stream:
+            self.stream.flush()
+
+class AdminAPI:
+    """Botのイベントループ上で動くローカルの管理API (HTTP/JSON) です。
+
+    ハンドラはすべてBotのループで実行されるため、辞書やキューの変更が他のスレッドと競合しません。
+    リクエストには Authorization: Bearer <ADMIN_API_TOKEN> が必要です。
+    """
+    def __init__(self, host: str = ADMIN_API_HOST, port: int = ADMIN_API_PORT, token: str = ADMIN_API_TOKEN):
+        self.host = host
+        self.port = port
+        self.token = token
+        self.runner = None
+        self.app = web.Application(middlewares=[self.authenticate])
+        self.app.add_routes([
+            web.get("/api/status", self.get_status),
+            web.get("/api/guilds", self.list_guilds),
+            web.get("/api/sessions", self.list_sessions),
+            web.get("/api/guilds/{guild_id}/queue", self.get_queue),
+            web.post("/api/guilds/{guild_id}/queue/flush", self.flush_queue),
+            web.get("/api/dictionaries/{scope}", self.list_entries),
+            web.post("/api/dictionaries/{scope}/entries", self.add_entry),
+            web.put("/api/dictionaries/{scope}/entries", self.update_entry),
+            web.delete("/api/dictionaries/{scope}/entries", self.remove_entry),
+            web.post("/api/dictionaries/{scope}/import", self.import_entries),
+            web.get("/api/metrics", self.get_metrics),
+            web.get("/api/profiler", self.get_profiler),
+            web.post("/api/profiler", self.control_profiler),
+            web.get("/api/snapshot", self.get_snapshot),
+            web.get("/api/events", self.get_events),
+            web.post("/api/shutdown", self.shutdown),
+        ])
+
+    async def start(self):
+        """APIサーバーを起動します。既に起動している場合は何もしません。"""
+        if self.runner:
+            return
+        admin_events.bind(asyncio.get_running_loop())
+        runner = web.AppRunner(self.app, access_log=None)
+        await runner.setup()
+        try:
+            await web.TCPSite(runner, self.host, self.port).start()
+        except OSError as e:
+            print(f"警告: 管理APIを {self.host}:{self.port} で起動できませんでした: {e}")
+            await runner.cleanup()
+            return
+        self.runner = runner
+        print(f"管理APIを http://{self.host}:{self.port}/api で起動しました。")
+
+    async def stop(self):
+        if self.runner:
+            await self.runner.cleanup()
+            self.runner = None
+
+    @web.middleware
+    async def authenticate(self, request: web.Request, handler):
+        """すべてのリクエストのトークンを確かめるミドルウェアです。"""
+        if not secrets.compare_digest(request.headers.get("Authorization", ""), f"Bearer {self.token}"):
+            return self.error(401, "認証に失敗しました。")
+        try:
+            return await handler(request)
+        except ValueError as e:
+            return self.error(400, str(e))
+
+    @staticmethod
+    def reply(data, status: int = 200) -> web.Response:
+        return web.json_response(data, status=status, dumps=lambda o: json.dumps(o, ensure_ascii=False))
+
+    @classmethod
+    def error(cls, status: int, message: str) -> web.Response:
+        return cls.reply({"error": message}, status)
+
+    @staticmethod
+    def page(request: web.Request, items: list) -> dict:
+        """offset / limit クエリで一覧を切り出します。limit=0 なら残りをすべて返します。"""
+        try:
+            offset = max(0, int(request.query.get("offset", 0)))
+            limit = int(request.query.get("limit", 100))
+        except ValueError:
+            raise ValueError("offset と limit は整数で指定してください。")
+        end = len(items) if limit <= 0 else offset + min(limit, ADMIN_PAGE_LIMIT_MAX)
+        return {"total": len(items), "offset": offset, "items": items[offset:end]}
+
+    @staticmethod
+    def guild_info(guild: discord.Guild) -> dict:
+        vc = voice_clients.get(guild.id)
+        channel_id = reading_channels.get(guild.id)
+        channel = bot.get_channel(channel_id) if channel_id else None
+        queue = voice_queues.get(guild.id)
+        return {
+            "id": str(guild.id),
+            "name": guild.name,
+            "member_count": guild.member_count,
+            "voice_connected": bool(vc and vc.is_connected()),
+            "reading_channel": channel.name if channel else (f"不明 ({channel_id})" if channel_id else None),
+            "queue_length": queue.qsize() if queue else 0,
+        }
+
+    @staticmethod
+    def guild_id(request: web.Request) -> int:
+        try:
+            return int(request.match_info["guild_id"])
+        except ValueError:
+            raise ValueError("ギルドIDは整数で指定してください。")
+
+    @staticmethod
+    def status_info() -> dict:
+        ready = bot.is_ready()
+        return {
+            "ready": ready,
+            "user": str(bot.user) if bot.user else None,
+            "latency_ms": round(bot.latency * 1000) if ready and not math.isinf(bot.latency) else None,
+            "guild_count": len(bot.guilds),
+            "member_count": sum(g.member_count or 0 for g in bot.guilds),
+            "voice_count": sum(1 for vc in voice_clients.values() if vc.is_connected()),
+        }
+
+    async def get_status(self, request: web.Request) -> web.Response:
+        return self.reply(self.status_info())
+
+    async def get_snapshot(self, request: web.Request) -> web.Response:
+        """GUIの初期表示に必要な情報と、以後の差分の起点になる通し番号を返します。"""
+        return self.reply({
+            "seq": admin_events.seq,
+            "status": self.status_info(),
+            "guilds": [self.guild_info(g) for g in sorted(bot.guilds, key=lambda g: g.id)],
+            "logs": admin_events.recent_logs(),
+        })
+
+    async def get_events(self, request: web.Request) -> web.Response:
+        """since より後の差分を返します。まだなければ届くまで待ちます (ロングポーリング)。"""
+        seq = int(request.query.get("since", 0))
+        if admin_events.since(seq) is not None and admin_events.seq <= seq:
+            await admin_events.wait(seq, ADMIN_EVENTS_WAIT)
+        result = admin_events.since(seq)
+        if result is None:
+            return self.reply({"seq": admin_events.seq, "events": [{"type": "reset"}]})
+        events, latest = result
+        return self.reply({"seq": latest, "events": events})
+
+    async def shutdown(self, request: web.Request) -> web.Response:
+        """応答を返した後にBotを停止します。"""
+        print("管理APIからの要求でBotを停止します...")
+        asyncio.get_running_loop().call_later(0.5, lambda: asyncio.ensure_future(bot.close()))
+        return self.reply({"stopping": True})
+
+    async def list_guilds(self, request: web.Request) -> web.Response:
+        guilds = sorted(bot.guilds, key=lambda g: g.id)
+        result = self.page(request, guilds)
+        result["items"] = [self.guild_info(g) for g in result["items"]]
+        return self.reply(result)
+
+    async def list_sessions(self, request: web.Request) -> web.Response:
+        sessions = []
+        for guild_id in sorted(set(voice_clients) | set(voice_sessions.channels)):
+            vc = voice_clients.get(guild_id)
+            queue = voice_queues.get(guild_id)
+            sessions.append({
+                "guild_id": str(guild_id),
+                "channel_id": str(voice_sessions.channels.get(guild_id) or (vc.channel.id if vc and vc.channel else "")),
+                "connected": bool(vc and vc.is_connected()),
+                "reconnecting": voice_sessions.is_reconnecting(guild_id),
+                "playing": bool(guild_id in voice_streams and voice_streams[guild_id].is_playing()),
+                "queue_length": queue.qsize() if queue else 0,
+                "queue_bytes": queue.nbytes if queue else 0,
+            })
+        return self.reply(self.page(request, sessions))
+
+    async def get_queue(self, request: web.Request) -> web.Response:
+        guild_id = self.guild_id(request)
+        queue = voice_queues.get(guild_id)
+        clips = list(queue.items) if queue else []
+        return self.reply({
+            "guild_id": str(guild_id),
+            "now_playing_author": str(now_playing_authors[guild_id]) if guild_id in now_playing_authors else None,
+            "synthesizing": len(synthesis_jobs.jobs.get(guild_id, {})),
+            "memory_bytes": queue.memory_bytes if queue else 0,
+            "spilled_bytes": queue.spilled_bytes if queue else 0,
+            "clips": [
+                {"author_id": str(c.author_id) if c.author_id else None, "bytes": c.length, "spilled": c.spilled}
+                for c in clips
+            ],
+        })
+
+    async def flush_queue(self, request: web.Request) -> web.Response:
+        cancelled, removed = flush_guild_audio(self.guild_id(request))
+        return self.reply({"cancelled": cancelled, "removed": removed})
+
+    @staticmethod
+    def scope_guild_id(scope: str):
+        """"global" なら None を、それ以外はBotが参加しているギルドのIDを返します。"""
+        if scope == "global":
+            return None
+        if not scope.isdigit():
+            raise ValueError("辞書は global またはギルドIDで指定してください。")
+        if bot.get_guild(int(scope)) is None:
+            raise ValueError(f"Botが参加していないサーバーです: {scope}")
+        return int(scope)
+
+    @staticmethod
+    def load_scope(scope: str) -> dict:
+        """"global" またはギルドIDから、編集対象の辞書を返します。"""
+        guild_id = AdminAPI.scope_guild_id(scope)
+        return global_dict if guild_id is None else load_server_dictionary(guild_id)
+
+    @staticmethod
+    def save_scope(scope: str, entries: dict):
+        if scope == "global":
+            if entries is not global_dict:
+                global_dict.clear()
+                global_dict.update(entries)
+            save_global_dictionary(global_dict)
+        else:
+            save_server_dictionary(int(scope), entries)
+
+    @staticmethod
+    async def read_body(request: web.Request) -> dict:
+        """リクエスト本文を JSON オブジェクトとして読みます。オブジェクトでなければ ValueError (400) にします。"""
+        body = await request.json()
+        if not isinstance(body, dict):
+            raise ValueError("本文は JSON オブジェクトで指定してください。")
+        return body
+
+    async def read_entry(self, request: web.Request):
+        """リクエスト本文の語句と読みを検証します。不正な場合はエラーのレスポンスを返します。"""
+        body = await self.read_body(request)
+        result = validate_dictionary_entry(body.get("original"), body.get("reading"))
+        if isinstance(result, str):
+            return self.error(400, result)
+        return result
+
+    async def list_entries(self, request: web.Request) -> web.Response:
+        # 一覧はページごとに呼ばれるので、辞書が更新されるまで索引を使い回す
+        guild_id = self.scope_guild_id(request.match_info["scope"])
+        if guild_id is None:
+            entries, index = global_dict, get_global_dictionary_index()
+        else:
+            entries, index = get_server_dictionary(guild_id), get_dictionary_index(guild_id)
+        keys = index.contains(request.query.get("q", ""))
+        result = self.page(request, keys)
+        result["items"] = [[key, entries[key]] for key in result["items"]]
+        return self.reply(result)
+
+    async def add_entry(self, request: web.Request) -> web.Response:
+        scope = request.match_info["scope"]
+        entry = await self.read_entry(request)
+        if isinstance(entry, web.Response):
+            return entry
+        entries = self.load_scope(scope)
+        if entry[0] in entries:
+            return self.error(409, f"「{entry[0]}」は既に辞書に存在します。")
+        entries[entry[0]] = entry[1]
+        self.save_scope(scope, entries)
+        print(f"管理API: 辞書({scope})に「{entry[0]}」:「{entry[1]}」を追加しました。")
+        return self.reply({"original": entry[0], "reading": entry[1]}, 201)
+
+    async def update_entry(self, request: web.Request) -> web.Response:
+        scope = request.match_info["scope"]
+        entry = await self.read_entry(request)
+        if isinstance(entry, web.Response):
+            return entry
+        entries = self.load_scope(scope)
+        if entry[0] not in entries:
+            return self.error(404, f"「{entry[0]}」は辞書に見つかりません。")
+        entries[entry[0]] = entry[1]
+        self.save_scope(scope, entries)
+        print(f"管理API: 辞書({scope})の「{entry[0]}」を「{entry[1]}」に更新しました。")
+        return self.reply({"original": entry[0], "reading": entry[1]})
+
+    async def remove_entry(self, request: web.Request) -> web.Response:
+        scope = request.match_info["scope"]
+        original = request.query.get("original", "")
+        entries = self.load_scope(scope)
+        if original not in entries:
+            return self.error(404, f"「{original}」は辞書に見つかりません。")
+        del entries[original]
+        self.save_scope(scope, entries)
+        print(f"管理API: 辞書({scope})から「{original}」を削除しました。")
+        return self.reply({"original": original})
+
+    async def import_entries(self, request: web.Request) -> web.Response:
+        """一括登録します。本文は {"format": "csv", "text": "..."} または {"records": [[語句, 読み], ...]} に "policy" を添えます。"""
+        scope = request.match_info["scope"]
+        body = await self.read_body(request)
+        policy = body.get("policy", "skip")
+        if policy not in DICT_CONFLICT_POLICIES:
+            return self.error(400, f"policy は {' / '.join(DICT_CONFLICT_POLICIES)} のいずれかです。")
+        if "text" in body:
+            if body.get("format") not in DICT_FILE_FORMATS:
+                return self.error(400, f"format は {' / '.join(DICT_FILE_FORMATS)} のいずれかです。")
+            if not isinstance(body["text"], str):
+                return self.error(400, "text は文字列で指定してください。")
+            records = iter_dictionary_records(io.StringIO(body["text"], newline=""), body["format"])
+        else:
+            if not isinstance(body.get("records", []), list):
+                return self.error(400, "records は [[語句, 読み], ...] の配列で指定してください。")
+            records = (
+                (i, row[0], row[1]) if isinstance(row, list) and len(row) == 2 else (i, None, "[語句, 読み] の形式ではありません")
+                for i, row in enumerate(body.get("records", []), start=1)
+            )
+        # 別スレッドで読む間にイベントループ側で書き換えられないよう、先に複製しておく
+        entries = dict(self.load_scope(scope))
+        try:
+            # /import_dict と同じく、数万行でもイベントループを止めないよう解析とマージは別スレッドで行う
+            merged, stats = await asyncio.to_thread(import_dictionary_records, entries, records, policy)
+        except DictionaryImportError as e:
+            return self.error(409, str(e))
+        if stats["added"] or stats["overwritten"]:
+            self.save_scope(scope, merged)
+        print(f"管理API: 辞書({scope})に{stats['added']}件追加、{stats['overwritten']}件上書きしました。")
+        return self.reply(stats)
+
+    async def get_metrics(self, request: web.Request) -> web.Response:
+        return self.reply(get_metrics(request.query.get("prefix", "")))
+
+    async def get_profiler(self, request: web.Request) -> web.Response:
+        return self.reply({"running": profiler.is_running(), "last_result": profiler.last_result, "last_error": profiler.last_error})
+
+    async def control_profiler(self, request: web.Request) -> web.Response:
+        """{"action": "start", "duration": 30} または {"action": "stop"} を受け付けます。"""
+        body = await self.read_body(request)
+        if body.get("action") == "start":
+            if not profiler.start(int(body.get("duration", 30))):
+                return self.error(409, "既にプロファイル中です。")
+            return self.reply({"running": True, "duration": profiler.duration})
+        if body.get("action") == "stop":
+            await asyncio.to_thread(profiler.stop)
+            return self.reply({"running": False, "last_result": profiler.last_result, "last_error": profiler.last_error})
+        return self.error(400, "action は start または stop です。")
+
+admin_api = AdminAPI()
+
+class AdminClient:
+    """管理APIのクライアントです。GUIや外部のスクリプトから使います (呼び出しはブロックします)。"""
+    def __init__(self, host: str = ADMIN_API_HOST, port: int = ADMIN_API_PORT, token: str = ADMIN_API_TOKEN, timeout: float = 10):
+        self.base_url = f"http://{host}:{port}/api"
+        self.token = token
+        self.timeout = timeout
+
+    def call(self, method: str, path: str, params: dict = None, body=None):
+        """APIを呼び出してJSONを返します。エラーのときは AdminAPIError を送出します。"""
+        url = self.base_url + path
+        if params:
+            url += "?" + urllib.parse.urlencode(params)
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8") if body is not None else None
+        request = urllib.request.Request(url, data=data, method=method, headers={
+            "Authorization": f"Bearer {self.token}",
+            "Content-Type": "application/json",
+        })
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read().decode("utf-8"))
+        except urllib.error.HTTPError as e:
+            try:
+                message = json.loads(e.read().decode("utf-8")).get("error", str(e))
+            except ValueError:
+                message = str(e)
+            raise AdminAPIError(e.code, message)
+        except (urllib.error.URLError, OSError) as e:
+            raise AdminAPIError(0, f"管理APIに接続できません: {e}")
+
+    def fetch_all(self, path: str, params: dict = None) -> list:
+        """ページ分けされた一覧をすべて取得します。"""
+        items, offset = [], 0
+        while True:
+            page = self.call("GET", path, dict(params or {}, offset=offset, limit=ADMIN_PAGE_LIMIT_MAX))
+            items.extend(page["items"])
+            offset += len(page["items"])
+            if not page["items"] or offset >= page["total"]:
+                return items
+
+class AdminAPIError(Exception):
+    """管理APIがエラーを返したか、接続できなかったときに送出されます。status が 0 なら接続できていません。"""
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
 # ── Discord Bot イベントハンドラ ──
 @bot.event
 async def on_ready():
     """BotがDiscordに接続した際に実行されます。"""
     print(f'Logged in as {bot.user} (ID: {bot.user.id})')
     print('------')
-    await bot.tree.sync()
-    print('スラッシュコマンド同期完了')
+    # 再接続のたびに呼ばれるため、コマンド定義が変わったときだけ同期する
+    await sync_command_tree()
 
     if not check_idle_voice_channels.is_running():
         check_idle_voice_channels.start()
         print("アイドルVCチェックタスクを開始しました。")
+
+    if not report_resource_metrics.is_running():
+        report_resource_metrics.start()
+
+    loop_watchdog.start()
+    await admin_api.start()
+    await tts_client.start() # 最初のメッセージから待機中の接続で合成できるよう、先に接続しておく
+
+    for guild in bot.guilds:
+        name_cache.prime_guild(guild)
+
+    if not refresh_voice_catalog.is_running():
+        refresh_voice_catalog.start()
     
-    if hasattr(bot, 'gui_app'):
-        bot.gui_app.update_dashboard_display()
-        bot.gui_app.log_output.insert(tk.END, f"Bot: {bot.user.name}としてログインしました。\n")
-        bot.gui_app.log_output.see(tk.END)
+    admin_events.reset() # 再接続でサーバーの一覧が変わっている可能性があるため、GUIに取り直させる
+    admin_events.log(f"Bot: {bot.user.name}としてログインしました。")
 
     await bot.change_presence(status=discord.Status.online, activity=discord.Game('e!help | /help'))
 
@@ -256,66 +2925,133 @@ async def on_ready():
 async def on_guild_join(guild):
     """Botが新しいサーバーに参加した際に実行されます。"""
     print(f"Botが新しいサーバーに参加しました: {guild.name} (ID: {guild.id})")
-    if hasattr(bot, 'gui_app'):
-        bot.gui_app.update_dashboard_display()
-        bot.gui_app.log_output.insert(tk.END, f"Bot: 新しいサーバーに参加: {guild.name}\n")
-        bot.gui_app.log_output.see(tk.END)
+    name_cache.prime_guild(guild)
+    admin_events.guild_changed(guild.id)
+    admin_events.log(f"Bot: 新しいサーバーに参加: {guild.name}")
 
 @bot.event
 async def on_guild_remove(guild):
     """Botがサーバーを退出した際に実行されます。"""
     print(f"Botがサーバーを退出しました: {guild.name} (ID: {guild.id})")
+    voice_sessions.forget(guild.id)
+    synthesis_jobs.cancel(guild.id)
     if guild.id in voice_clients:
         await voice_clients[guild.id].disconnect()
         del voice_clients[guild.id]
     if guild.id in reading_channels:
         del reading_channels[guild.id]
-    if guild.id in voice_queues:
-        del voice_queues[guild.id]
+    discard_voice_queue(guild.id)
     if guild.id in last_active_time:
         del last_active_time[guild.id]
+    spam_filter.forget_guild(guild.id)
+    name_cache.forget_guild(guild.id)
     
     # サーバー辞書ファイルを削除
     server_dict_path = get_server_dict_path(guild.id)
     if os.path.exists(server_dict_path):
         os.remove(server_dict_path)
         print(f"サーバー辞書ファイルを削除しました: {server_dict_path}")
+    rebuild_server_dictionary_cache(guild.id)
+
+    admin_events.guild_changed(guild.id)
+    admin_events.log(f"Bot: サーバーを退出: {guild.name}")
 
-    if hasattr(bot, 'gui_app'):
-        bot.gui_app.update_dashboard_display()
-        bot.gui_app.log_output.insert(tk.END, f"Bot: サーバーを退出: {guild.name}\n")
-        bot.gui_app.log_output.see(tk.END)
+@bot.event
+async def on_member_update(before: discord.Member, after: discord.Member):
+    """メンバーのニックネームなどが変わった際に、読み上げる名前を更新します。"""
+    name_cache.remember_member(after)
+
+@bot.event
+async def on_member_remove(member: discord.Member):
+    name_cache.forget(member.guild.id, "user", member.id)
+
+@bot.event
+async def on_guild_channel_create(channel):
+    name_cache.remember_channel(channel)
+
+@bot.event
+async def on_guild_channel_update(before, after):
+    name_cache.remember_channel(after)
+
+@bot.event
+async def on_guild_channel_delete(channel):
+    name_cache.forget(channel.guild.id, "channel", channel.id)
+
+@bot.event
+async def on_guild_role_create(role: discord.Role):
+    name_cache.remember_role(role)
+
+@bot.event
+async def on_guild_role_update(before: discord.Role, after: discord.Role):
+    name_cache.remember_role(after)
+
+@bot.event
+async def on_guild_role_delete(role: discord.Role):
+    name_cache.forget(role.guild.id, "role", role.id)
 
 @bot.event
 async def on_voice_state_update(member: discord.Member, before: discord.VoiceState, after: discord.VoiceState):
     """ボイスチャンネルの状態が更新された際に実行されます (入室/退出のアナウンス)。"""
+    if bot.user and member.id == bot.user.id:
+        # Bot自身が移動させられた場合は再接続先を更新し、切断させられた場合は再接続しない
+        if after.channel:
+            if voice_sessions.is_active(member.guild.id):
+                voice_sessions.track(member.guild.id, after.channel.id)
+        elif not voice_sessions.is_reconnecting(member.guild.id):
+            voice_sessions.forget(member.guild.id)
+        return
     if member.bot:
         return
     gid = member.guild.id
+    name_cache.remember_member(member)
     if gid not in voice_clients:
         return
-    vc = voice_clients[gid]
+    # 再接続中は VoiceClient.channel が使えないため、記録している接続先を使う
+    vc_channel_id = voice_sessions.channels.get(gid) or (voice_clients[gid].channel.id if voice_clients[gid].channel else -1)
 
     # 重要: Botが接続しているVCにユーザーの動きがあった場合にアクティブタイムを更新
     # これにより、ユーザーがいる限りBotが自動退出しないようにする
-    if vc.channel.id == (before.channel.id if before.channel else -1) or \
-       vc.channel.id == (after.channel.id if after.channel else -1):
+    if vc_channel_id == (before.channel.id if before.channel else -1) or \
+       vc_channel_id == (after.channel.id if after.channel else -1):
         last_active_time[gid] = asyncio.get_event_loop().time()
 
 
     # 入室
     if after.channel and (before.channel is None or before.channel != after.channel):
-        if vc.channel.id == after.channel.id:
+        if vc_channel_id == after.channel.id:
             announce = f"{member.display_name} さんが接続しました。"
-            tts = await generate_tts(announce, member.id, gid) 
-            play_audio(gid, tts)
+            tts = await synthesis_jobs.synthesize(announce, member.id, gid)
+            if tts:
+                play_audio(gid, tts, member.id)
 
     # 退出
     if before.channel and after.channel is None:
-        if vc.channel.id == before.channel.id:
+        if vc_channel_id == before.channel.id:
             announce = f"{member.display_name} さんが退出しました。"
-            tts = await generate_tts(announce, member.id, gid)
-            play_audio(gid, tts)
+            tts = await synthesis_jobs.synthesize(announce, member.id, gid)
+            if tts:
+                play_audio(gid, tts, member.id)
+
+# ── リソース計測タスク ──
+bot_process = psutil.Process()
+
+@tasks.loop(seconds=15)
+async def report_resource_metrics():
+    """プロセスのRSSと再生キューのバイト数をメトリクスに記録します。"""
+    rss = bot_process.memory_info().rss
+    set_metric("process.rss_bytes", rss)
+    if rss > metrics.get("process.rss_bytes_peak", 0):
+        set_metric("process.rss_bytes_peak", rss)
+    update_queue_metrics()
+    if AudioQueue.memory_bytes_total > VOICE_QUEUE_GLOBAL_BUDGET * 0.8:
+        print(f"警告: 再生キューのメモリ使用量が予算の80%を超えています "
+              f"({format_bytes(AudioQueue.memory_bytes_total)} / {format_bytes(VOICE_QUEUE_GLOBAL_BUDGET)})")
+
+# ── 声のカタログ更新タスク ──
+@tasks.loop(hours=1)
+async def refresh_voice_catalog():
+    """声の一覧のキャッシュが期限切れになっていれば、バックグラウンドで取り直します。"""
+    await voice_catalog.refresh()
 
 # ── 自動退出タスク ──
 @tasks.loop(minutes=1)
@@ -323,6 +3059,7 @@ async def check_idle_voice_channels():
     """アイドル状態のボイスチャンネルからBotを自動退出させます。"""
     current_time = asyncio.get_event_loop().time()
     guild_ids_to_disconnect = []
+    spam_filter.prune(time.monotonic())
 
     for gid, vc in list(voice_clients.items()):
         # VCに接続しており、かつBot以外のメンバーが0人の場合
@@ -338,16 +3075,18 @@ async def check_idle_voice_channels():
     for gid in guild_ids_to_disconnect:
         vc = voice_clients.get(gid)
         if vc:
+            voice_sessions.forget(gid)
+            synthesis_jobs.cancel(gid)
             await vc.disconnect()
             print(f"アイドル状態のためVCから退出しました: {bot.get_guild(gid).name}")
             # 関連する辞書から情報を削除
             if gid in voice_clients: del voice_clients[gid]
-            if gid in voice_queues: del voice_queues[gid]
+            discard_voice_queue(gid)
             if gid in reading_channels: del reading_channels[gid]
             if gid in last_active_time: del last_active_time[gid]
-            if hasattr(bot, 'gui_app'):
-                bot.gui_app.log_output.insert(tk.END, f"Bot: アイドル状態のためVCから退出: {bot.get_guild(gid).name}\n")
-                bot.gui_app.log_output.see(tk.END)
+            spam_filter.forget_guild(gid)
+            admin_events.guild_changed(gid)
+            admin_events.log(f"Bot: アイドル状態のためVCから退出: {bot.get_guild(gid).name}")
 
 @bot.hybrid_command(name="invite", description="Botの招待リンクを表示します。")
 async def invite(ctx: commands.Context):
@@ -369,9 +3108,17 @@ async def help(ctx: commands.Context):
     embed.add_field(name="`/join [チャンネル名]`", value="Botをボイスチャンネルに参加させます。チャンネル名を指定しない場合、コマンド実行者のVCに参加します。", inline=False)
     embed.add_field(name="`/leave`", value="Botをボイスチャンネルから退出させます。", inline=False)
     embed.add_field(name="`/set_reading_channel [チャンネル名]`", value="メッセージを読み上げるテキストチャンネルを設定します。チャンネル名を指定しない場合、コマンド実行チャンネルが設定されます。", inline=False)
-    embed.add_field(name="`/add_word <元の語句> <読み>`", value="サーバー専用辞書に単語を追加します。（例: `/add_word hello こんにちは`）", inline=False)
-    embed.add_field(name="`/remove_word <元の語句>`", value="サーバー専用辞書から単語を削除します。", inline=False)
-    embed.add_field(name="`/list_words`", value="サーバー専用辞書に登録されている単語一覧を表示します。", inline=False)
+    embed.add_field(name="`/setvoice <声> [言語] [性別]`", value="読み上げの声を変更します。入力中に候補が表示されます。", inline=False)
+    embed.add_field(name="`/add_word <元の語句> <読み>`", value="サーバー専用辞書に単語を追加します。（例: `/add_word hello こんにちは`）\n`regex`・`whole_word`・`ignore_case` でパターンとして登録できます。", inline=False)
+    embed.add_field(name="`/remove_word <元の語句>`", value="サーバー専用辞書から単語を削除します。入力中に登録済みの語句が候補に表示されます。", inline=False)
+    embed.add_field(name="`/show_dict [検索語] [ページ]`", value="サーバー専用辞書の内容をページごとに表示します。検索語で語句や読みを絞り込めます。", inline=False)
+    embed.add_field(name="`/import_dict <ファイル> [競合時の扱い]`", value="CSV/TSV/JSONLファイルからサーバー専用辞書に単語を一括登録します。", inline=False)
+    embed.add_field(name="`/export_dict [形式]`", value="サーバー専用辞書をCSV/TSV/JSONLファイルとして書き出します。", inline=False)
+    embed.add_field(name="`/skip`", value="再生中の読み上げをスキップします。（メッセージ「s」でも可）", inline=False)
+    embed.add_field(name="`/flush`", value="合成中・再生待ちの読み上げをすべて取り消します。", inline=False)
+    embed.add_field(name="`/purge <ユーザー>`", value="指定したユーザーの合成中・再生待ちの読み上げを取り消します。", inline=False)
+    embed.add_field(name="`/spam_filter`", value="連投・重複メッセージの抑制設定を表示します。", inline=False)
+    embed.add_field(name="`/spam_filter_set <設定項目> <値>`", value="連投・重複メッセージの抑制設定を変更します。（サーバー管理権限が必要）", inline=False)
     embed.add_field(name="`/help`", value="このヘルプメッセージを表示します。", inline=False)
     embed.add_field(name="`/status`", value="Botの動作状況を表示します。", inline=False)
     embed.add_field(name="`/invite`", value="Botの招待リンクを表示します。", inline=False)
@@ -380,9 +3127,7 @@ async def help(ctx: commands.Context):
     
     await ctx.reply(embed=embed) # ephemeral=True で、コマンド実行者のみに見えるようにする
 
-    if hasattr(bot, 'gui_app'):
-        bot.gui_app.log_output.insert(tk.END, f"Bot: サーバー「{ctx.guild.name}」で /help コマンドが実行されました。\n")
-        bot.gui_app.log_output.see(tk.END)
+    admin_events.log(f"Bot: サーバー「{ctx.guild.name}」で /help コマンドが実行されました。")
 
 # ── Discord コマンド ──
 @bot.hybrid_command(name="join", description="ボイスチャンネルに参加します。", aliases=["vjoin"])
@@ -441,6 +3186,7 @@ async def join(ctx: commands.Context, channel: discord.VoiceChannel = None):
         else:
             old_channel_name = voice_clients[ctx.guild.id].channel.name if voice_clients[ctx.guild.id].channel else "不明なチャンネル"
             await voice_clients[ctx.guild.id].move_to(channel)
+            voice_sessions.track(ctx.guild.id, channel.id)
             
             # Embed for channel moved
             embed = discord.Embed(
@@ -454,17 +3200,27 @@ async def join(ctx: commands.Context, channel: discord.VoiceChannel = None):
 
             reading_channels[ctx.guild.id] = ctx.channel.id
             last_active_time[ctx.guild.id] = asyncio.get_event_loop().time()
-            if hasattr(bot, 'gui_app'): bot.gui_app.update_dashboard_display()
+            admin_events.guild_changed(ctx.guild.id)
             
             # VC移動時も読み上げ
             vc_announce = f"ボイスチャンネルを {channel.name} に移動しました。"
-            tts_vc_announce = await generate_tts(vc_announce, ctx.author.id, ctx.guild.id) 
-            play_audio(ctx.guild.id, tts_vc_announce)
+            tts_vc_announce = await synthesis_jobs.synthesize(vc_announce, ctx.author.id, ctx.guild.id)
+            if tts_vc_announce:
+                play_audio(ctx.guild.id, tts_vc_announce)
             return
 
-    vc = await channel.connect()
+    # 切断されたまま残っている接続 (再接続中を含む) は破棄してから接続し直す
+    if ctx.guild.id in voice_clients:
+        voice_sessions.forget(ctx.guild.id)
+        await voice_clients.pop(ctx.guild.id).disconnect(force=True)
+
+    connect_started = time.perf_counter()
+    vc = await channel.connect(cls=ReadingVoiceClient)
+    set_metric("voice.connect_seconds_last", time.perf_counter() - connect_started)
     voice_clients[ctx.guild.id] = vc
-    voice_queues[ctx.guild.id] = asyncio.Queue()
+    voice_sessions.track(ctx.guild.id, channel.id)
+    discard_voice_queue(ctx.guild.id)
+    get_voice_queue(ctx.guild.id)
     reading_channels[ctx.guild.id] = ctx.channel.id
     last_active_time[ctx.guild.id] = asyncio.get_event_loop().time()
     
@@ -478,12 +3234,13 @@ async def join(ctx: commands.Context, channel: discord.VoiceChannel = None):
     embed.set_footer(text=f"コマンド実行者: {ctx.author.display_name}", icon_url=ctx.author.avatar.url if ctx.author.avatar else None)
     await ctx.reply(embed=embed, ephemeral=False)
 
-    if hasattr(bot, 'gui_app'): bot.gui_app.update_dashboard_display()
+    admin_events.guild_changed(ctx.guild.id)
 
     # BotがVCに接続した際に読み上げる
     connect_message = f"接続しました。"
-    tts_connect_message = await generate_tts(connect_message, ctx.author.id, ctx.guild.id)
-    play_audio(ctx.guild.id, tts_connect_message)
+    tts_connect_message = await synthesis_jobs.synthesize(connect_message, ctx.author.id, ctx.guild.id)
+    if tts_connect_message:
+        play_audio(ctx.guild.id, tts_connect_message)
 
 
 @bot.hybrid_command(name="leave", description="ボイスチャンネルから切断します。", aliases=["bye"])
@@ -496,6 +3253,8 @@ async def leave(ctx: commands.Context):
 
     if ctx.guild.id in voice_clients and voice_clients[ctx.guild.id].is_connected():
         current_channel_name = voice_clients[ctx.guild.id].channel.name if voice_clients[ctx.guild.id].channel else "現在のチャンネル"
+        voice_sessions.forget(ctx.guild.id)
+        synthesis_jobs.cancel(ctx.guild.id)
         await voice_clients[ctx.guild.id].disconnect()
         
         # Embed for successful disconnection
@@ -508,13 +3267,13 @@ async def leave(ctx: commands.Context):
         await ctx.reply(embed=embed, ephemeral=False)
 
         del voice_clients[ctx.guild.id]
-        if ctx.guild.id in voice_queues:
-            del voice_queues[ctx.guild.id]
+        discard_voice_queue(ctx.guild.id)
         if ctx.guild.id in reading_channels:
             del reading_channels[ctx.guild.id]
         if ctx.guild.id in last_active_time:
             del last_active_time[ctx.guild.id]
-        if hasattr(bot, 'gui_app'): bot.gui_app.update_dashboard_display()
+        spam_filter.forget_guild(ctx.guild.id)
+        admin_events.guild_changed(ctx.guild.id)
     else:
         # Embed for not connected
         embed = discord.Embed(
@@ -528,28 +3287,35 @@ async def leave(ctx: commands.Context):
 
 # setvoice コマンドの追加
 @bot.hybrid_command(name="setvoice", description="読み上げの声を変更します。", aliases=["voice"])
-@app_commands.describe(voice_name="使用したい声の名前を選択してください (Nanami, Keita)")
+@app_commands.describe(
+    voice_name="使用したい声の名前 (入力すると候補が表示されます)",
+    locale="候補を絞り込む言語 (例: ja-JP, en-US)",
+    gender="候補を絞り込む性別"
+)
 @app_commands.choices(
-    voice_name=[
-        app_commands.Choice(name="Nanami (女性)", value="ja-JP-NanamiNeural"),
-        app_commands.Choice(name="Keita (男性)", value="ja-JP-KeitaNeural"),
+    gender=[
+        app_commands.Choice(name="女性", value="Female"),
+        app_commands.Choice(name="男性", value="Male"),
     ]
 )
-async def setvoice(ctx: commands.Context, voice_name: str):
+async def setvoice(ctx: commands.Context, voice_name: str, locale: str = None, gender: str = None):
     """ユーザーごとの読み上げの声を変更します。"""
-    # 選択肢はアプリコマンドで定義されているため、ここではバリデーション不要
-    # ただし、将来的に手動で入力できるようにする場合や、Choice以外の値をチェックする場合はここに追加
-    
+    # 候補はカタログから出しているが、手入力の値も受け付けるのでここで検証する
+    voice = voice_catalog.resolve(voice_name)
+    if voice is None:
+        candidates = voice_catalog.search(voice_name, locale, gender, limit=10)
+        description = f"「**{voice_name}**」に一致する声が見つかりませんでした。"
+        if candidates:
+            description += "\n候補: " + ", ".join(f"`{v['ShortName']}`" for v in candidates)
+        embed = discord.Embed(title="エラー", description=description, color=0xFF0000)
+        await ctx.reply(embed=embed, ephemeral=True)
+        return
+
+    voice_name = voice["ShortName"]
     set_user_voice(ctx.author.id, voice_name)
     
     # 選択された声の表示名を整形
-    display_voice_name = ""
-    if voice_name == "ja-JP-NanamiNeural":
-        display_voice_name = "Nanami (女性)"
-    elif voice_name == "ja-JP-KeitaNeural":
-        display_voice_name = "Keita (男性)"
-    else:
-        display_voice_name = voice_name # 万が一不明な値が来た場合
+    display_voice_name = voice_catalog.display_name(voice_name)
 
     embed = discord.Embed(
         title="読み上げの声を変更しました",
@@ -559,9 +3325,74 @@ async def setvoice(ctx: commands.Context, voice_name: str):
     embed.set_footer(text=f"設定者: {ctx.author.display_name}", icon_url=ctx.author.avatar.url if ctx.author.avatar else None)
     await ctx.reply(embed=embed, ephemeral=False)
 
-    if hasattr(bot, 'gui_app'):
-        bot.gui_app.log_output.insert(tk.END, f"Bot: ユーザー({ctx.author.display_name})の読み上げの声を{display_voice_name}に設定しました。\n")
-        bot.gui_app.log_output.see(tk.END)
+    admin_events.log(f"Bot: ユーザー({ctx.author.display_name})の読み上げの声を{display_voice_name}に設定しました。")
+
+@setvoice.autocomplete("voice_name")
+async def setvoice_voice_autocomplete(interaction: discord.Interaction, current: str):
+    """入力中の文字列と、指定済みの言語・性別から声の候補を返します。(通信は行いません)"""
+    locale = getattr(interaction.namespace, "locale", None)
+    gender = getattr(interaction.namespace, "gender", None)
+    if locale is None and not current:
+        locale = "ja-JP"
+    return [
+        app_commands.Choice(name=voice_catalog.display_name(v["ShortName"])[:100], value=v["ShortName"])
+        for v in voice_catalog.search(current, locale, gender)
+    ]
+
+@setvoice.autocomplete("locale")
+async def setvoice_locale_autocomplete(interaction: discord.Interaction, current: str):
+    """言語の候補を返します。"""
+    current = current.lower()
+    return [app_commands.Choice(name=loc, value=loc) for loc in voice_catalog.locales if current in loc.lower()][:25]
+
+@bot.hybrid_command(name="skip", description="再生中の読み上げをスキップします。")
+async def skip(ctx: commands.Context):
+    """再生中の音声だけをスキップします。(メッセージ「s」と同じ)"""
+    if not ctx.guild:
+        embed = discord.Embed(title="エラー", description="このコマンドはサーバーでのみ使用できます。", color=0xFF0000)
+        await ctx.reply(embed=embed, ephemeral=True)
+        return
+
+    if skip_current(ctx.guild.id):
+        embed = discord.Embed(title="スキップしました", description="再生中の読み上げをスキップしました。", color=0x00BFFF)
+    else:
+        embed = discord.Embed(title="再生していません", description="現在再生中の読み上げはありません。", color=0x808080)
+    await ctx.reply(embed=embed, ephemeral=True)
+
+@bot.hybrid_command(name="flush", description="合成中・再生待ちの読み上げをすべて取り消します。", aliases=["ss"])
+async def flush(ctx: commands.Context):
+    """合成中のジョブを取り消し、再生待ちのキューを空にして再生を止めます。"""
+    if not ctx.guild:
+        embed = discord.Embed(title="エラー", description="このコマンドはサーバーでのみ使用できます。", color=0xFF0000)
+        await ctx.reply(embed=embed, ephemeral=True)
+        return
+
+    cancelled, removed = flush_guild_audio(ctx.guild.id)
+    embed = discord.Embed(
+        title="読み上げを取り消しました",
+        description=f"合成中: **{cancelled}** 件 / 再生待ち: **{removed}** 件",
+        color=0x00BFFF
+    )
+    embed.set_footer(text=f"実行者: {ctx.author.display_name}", icon_url=ctx.author.avatar.url if ctx.author.avatar else None)
+    await ctx.reply(embed=embed)
+
+@bot.hybrid_command(name="purge", description="指定したユーザーの合成中・再生待ちの読み上げを取り消します。")
+@app_commands.describe(member="読み上げを取り消すユーザー")
+async def purge(ctx: commands.Context, member: discord.Member):
+    """指定したユーザーの合成中ジョブと再生待ちの音声を取り除きます。"""
+    if not ctx.guild:
+        embed = discord.Embed(title="エラー", description="このコマンドはサーバーでのみ使用できます。", color=0xFF0000)
+        await ctx.reply(embed=embed, ephemeral=True)
+        return
+
+    cancelled, removed = purge_author_audio(ctx.guild.id, member.id)
+    embed = discord.Embed(
+        title=f"{member.display_name} さんの読み上げを取り消しました",
+        description=f"合成中: **{cancelled}** 件 / 再生待ち: **{removed}** 件",
+        color=0x00BFFF
+    )
+    embed.set_footer(text=f"実行者: {ctx.author.display_name}", icon_url=ctx.author.avatar.url if ctx.author.avatar else None)
+    await ctx.reply(embed=embed)
 
 @bot.hybrid_command(name="set_reading_channel", description="メッセージを読み上げるテキストチャンネルを設定します。")
 @app_commands.describe(channel="読み上げチャンネルに設定するテキストチャンネル (指定しない場合、コマンドを実行したチャンネル)")
@@ -601,6 +3432,7 @@ async def set_reading_channel(ctx: commands.Context, channel: discord.TextChanne
     # 権限チェックここまで
 
     reading_channels[ctx.guild.id] = channel.id
+    admin_events.guild_changed(ctx.guild.id)
     
     embed = discord.Embed(
         title="読み上げチャンネル設定",
@@ -620,7 +3452,7 @@ async def status(ctx: commands.Context):
     
     bot_ping = round(bot.latency * 1000)
 
-    cpu_usage = psutil.cpu_percent(interval=1)
+    cpu_usage = await asyncio.to_thread(psutil.cpu_percent, interval=1) # 1秒の計測中もイベントループを止めない
     ram_usage = psutil.virtual_memory().percent
     
     # VRAM表示はRVC機能削除に伴いN/A
@@ -639,12 +3471,56 @@ async def status(ctx: commands.Context):
     embed.add_field(name="VC情報", value="", inline=False)
     embed.add_field(name="VC接続中", value=f"**{vc_count}** サーバー", inline=True)
     embed.add_field(name="読み上げチャンネル", value=f"**{reading_count}** チャンネル", inline=True)
+    embed.add_field(
+        name="VC再接続",
+        value=f"**{int(metrics.get('voice.reconnects', 0))}** 回 (直近 {metrics.get('voice.reconnect_seconds_last', 0):.2f}秒 / "
+              f"失敗 {int(metrics.get('voice.reconnect_failures', 0))} 回)",
+        inline=True
+    )
 
     embed.add_field(name="システム使用率", value="", inline=False)
     embed.add_field(name="ボットPing", value=f"**{bot_ping}**ms", inline=False) # Pingをこちらに移動
     embed.add_field(name="CPU", value=cpu_bar, inline=False)
     embed.add_field(name="RAM", value=ram_bar, inline=False)
 
+    queued = sum(q.qsize() for q in voice_queues.values())
+    embed.add_field(
+        name="再生キュー",
+        value=f"待ち: **{queued}** 件 / メモリ: **{format_bytes(metrics.get('queue.memory_bytes', 0))}** "
+              f"(最大 {format_bytes(metrics.get('queue.memory_bytes_peak', 0))}) / "
+              f"退避中: **{format_bytes(metrics.get('queue.spilled_bytes', 0))}**\n"
+              f"音声間の無音: 平均 **{metrics.get('voice.gap_ms_total', 0) / max(metrics.get('voice.gaps', 0), 1):.0f}**ms / "
+              f"最大 {metrics.get('voice.gap_ms_max', 0):.0f}ms\n"
+              f"プロセスRSS: **{format_bytes(bot_process.memory_info().rss)}**",
+        inline=False
+    )
+
+    lag_text = (f"現在: **{metrics.get('loop.lag_seconds', 0) * 1000:.0f}**ms / "
+                f"最大: **{metrics.get('loop.lag_seconds_max', 0) * 1000:.0f}**ms / "
+                f"停止: **{int(metrics.get('loop.stalls', 0))}** 回\n{loop_watchdog.format_histogram()}")
+    for key, (count, total, worst, _) in loop_watchdog.worst_offenders():
+        lag_text += f"\n`{key}`: {count}回 計{total:.2f}秒 (最大{worst:.2f}秒)"
+    embed.add_field(name="イベントループの遅延", value=lag_text[:1024], inline=False)
+
+    hit_rate = name_cache.hit_rate()
+    name_stats = get_metrics("names.")
+    embed.add_field(
+        name="メンションの名前解決",
+        value=f"ヒット率: **{hit_rate * 100:.1f}%** / 名前不明: **{int(name_stats.get('names.unresolved', 0))}** 件" if hit_rate is not None else "まだ解決していません",
+        inline=False
+    )
+    tts_requests = metrics.get("tts.requests", 0)
+    if tts_requests:
+        embed.add_field(
+            name="Edge TTS",
+            value=f"合成: 平均 **{metrics.get('tts.synthesis_ms_total', 0) / tts_requests:.0f}**ms / "
+                  f"接続待ち: 平均 **{metrics.get('tts.connect_wait_ms_total', 0) / tts_requests:.0f}**ms "
+                  f"(待機中の接続を使用: {metrics.get('tts.warm_hits', 0) / tts_requests * 100:.0f}%)",
+            inline=False
+        )
+    spam_stats = get_metrics("spam.")
+    embed.add_field(name="連投・重複の抑制", value=f"流量制限: **{int(spam_stats.get('spam.rate_limited', 0))}** 件 / 重複: **{int(spam_stats.get('spam.deduplicated', 0))}** 件", inline=False)
+
     embed.set_footer(text=f"最終更新: {time.strftime('%Y/%m/%d %H:%M:%S')}") # フッターに更新日時を追加
 
     await ctx.reply(embed=embed)
@@ -674,13 +3550,17 @@ async def setspeed(ctx: commands.Context, speed: int):
     embed.set_footer(text=f"設定者: {ctx.author.display_name}", icon_url=ctx.author.avatar.url if ctx.author.avatar else None)
     await ctx.reply(embed=embed, ephemeral=False)
 
-    if hasattr(bot, 'gui_app'):
-        bot.gui_app.log_output.insert(tk.END, f"Bot: ユーザー({ctx.author.display_name})の読み上げ速度を{speed}%に設定しました。\n")
-        bot.gui_app.log_output.see(tk.END)
+    admin_events.log(f"Bot: ユーザー({ctx.author.display_name})の読み上げ速度を{speed}%に設定しました。")
 
 @bot.hybrid_command(name="add_word", description="サーバー専用辞書に単語を追加します。", aliases=["add"])
-@app_commands.describe(original="元の語句", reading="読み")
-async def add_word(ctx: commands.Context, original: str, reading: str):
+@app_commands.describe(
+    original="元の語句",
+    reading="読み",
+    regex="元の語句を正規表現として扱う",
+    whole_word="単語単位で一致させる (英数字の途中には一致しない)",
+    ignore_case="大文字と小文字を区別しない"
+)
+async def add_word(ctx: commands.Context, original: str, reading: str, regex: bool = False, whole_word: bool = False, ignore_case: bool = False):
     """サーバー専用辞書に単語を追加します。"""
     if not ctx.guild:
         # Embed for not in guild
@@ -692,7 +3572,19 @@ async def add_word(ctx: commands.Context, original: str, reading: str):
         await ctx.reply(embed=embed, ephemeral=True)
         return
 
-    server_dict = load_server_dictionary(ctx.guild.id)
+    original = make_pattern_key(original, regex, whole_word, ignore_case)
+    result = validate_dictionary_entry(original, reading)
+    if isinstance(result, str):
+        embed = discord.Embed(
+            title="登録できません",
+            description=f"「**{original}**」: {result}",
+            color=0xFF0000
+        )
+        await ctx.reply(embed=embed, ephemeral=True)
+        return
+    original, reading = result
+
+    server_dict = dict(get_server_dictionary(ctx.guild.id))
     server_dict[original] = reading
     save_server_dictionary(ctx.guild.id, server_dict)
     
@@ -704,10 +3596,7 @@ async def add_word(ctx: commands.Context, original: str, reading: str):
     embed.set_footer(text=f"サーバー: {ctx.guild.name}")
     await ctx.reply(embed=embed)
 
-    if hasattr(bot, 'gui_app'):
-        bot.gui_app.log_output.insert(tk.END, f"Bot: サーバー辞書({ctx.guild.name})に「{original}」:「{reading}」を追加しました。\n")
-        # ここを修正: self ではなく bot.gui_app を使う
-        bot.gui_app.log_output.see(tk.END) # 修正箇所
+    admin_events.log(f"Bot: サーバー辞書({ctx.guild.name})に「{original}」:「{reading}」を追加しました。")
 
 @bot.hybrid_command(name="remove_word", description="サーバー専用辞書から単語を削除します。", aliases=["remove", "rm"])
 @app_commands.describe(original="削除する元の語句")
@@ -723,7 +3612,7 @@ async def remove_word(ctx: commands.Context, original: str):
         await ctx.reply(embed=embed, ephemeral=True)
         return
 
-    server_dict = load_server_dictionary(ctx.guild.id)
+    server_dict = dict(get_server_dictionary(ctx.guild.id))
     if original in server_dict:
         del server_dict[original]
         save_server_dictionary(ctx.guild.id, server_dict)
@@ -736,9 +3625,7 @@ async def remove_word(ctx: commands.Context, original: str):
         embed.set_footer(text=f"サーバー: {ctx.guild.name}")
         await ctx.reply(embed=embed)
 
-        if hasattr(bot, 'gui_app'):
-            bot.gui_app.log_output.insert(tk.END, f"Bot: サーバー辞書({ctx.guild.name})から「{original}」を削除しました。\n")
-            bot.gui_app.log_output.see(tk.END)
+        admin_events.log(f"Bot: サーバー辞書({ctx.guild.name})から「{original}」を削除しました。")
     else:
         # Embed for word not found
         embed = discord.Embed(
@@ -748,9 +3635,109 @@ async def remove_word(ctx: commands.Context, original: str):
         )
         await ctx.reply(embed=embed)
 
+DICT_AUTOCOMPLETE_LIMIT = 25 # Discordが表示できる候補の最大数
+DICT_PAGE_SIZE = 20 # /show_dict の1ページあたりの件数
+
+def dictionary_choices(guild_id: int, current: str) -> list[app_commands.Choice]:
+    """入力中の文字列で始まる語句を優先し、足りなければ語句や読みに含むものを候補にします。"""
+    index = get_dictionary_index(guild_id)
+    entries = get_server_dictionary(guild_id)
+    keys = index.prefix(current, DICT_AUTOCOMPLETE_LIMIT) # 二分探索なので10万件でもすぐ終わる
+    if current and len(keys) < DICT_AUTOCOMPLETE_LIMIT:
+        found = set(keys)
+        extra = index.contains(current, limit=DICT_AUTOCOMPLETE_LIMIT * 2)
+        keys += [k for k in extra if k not in found][:DICT_AUTOCOMPLETE_LIMIT - len(keys)]
+    return [
+        app_commands.Choice(name=f"{key} → {entries.get(key, '')}"[:100], value=key)
+        for key in keys if len(key) <= 100 # 候補の値は100文字まで
+    ]
+
+@add_word.autocomplete("original")
+async def add_word_original_autocomplete(interaction: discord.Interaction, current: str):
+    """登録済みの語句を候補に出します。選ぶとその語句の読みを上書きします。"""
+    if not interaction.guild_id:
+        return []
+    return dictionary_choices(interaction.guild_id, current)
+
+@remove_word.autocomplete("original")
+async def remove_word_original_autocomplete(interaction: discord.Interaction, current: str):
+    """削除できる語句を候補に出します。"""
+    if not interaction.guild_id:
+        return []
+    return dictionary_choices(interaction.guild_id, current)
+
+class DictionaryPages(discord.ui.View):
+    """辞書をページごとに表示するビューです。ページは表示するときに1ページ分だけ作ります。"""
+    def __init__(self, guild: discord.Guild, author_id: int, keys: list[str], query: str = None):
+        super().__init__(timeout=180)
+        self.guild = guild
+        self.author_id = author_id
+        self.keys = keys # 索引の語句の一覧 (コピーせずに参照する)
+        self.query = query
+        self.page = 0
+        self.message = None
+        self.update_buttons()
+
+    @property
+    def page_count(self) -> int:
+        return max(1, -(-len(self.keys) // DICT_PAGE_SIZE))
+
+    def render(self) -> discord.Embed:
+        entries = get_server_dictionary(self.guild.id)
+        start = self.page * DICT_PAGE_SIZE
+        lines = []
+        for key in self.keys[start:start + DICT_PAGE_SIZE]:
+            if key in entries:
+                lines.append(f"**{discord.utils.escape_markdown(key[:80])}**: {discord.utils.escape_markdown(entries[key][:80])}")
+        title = f"{self.guild.name} の辞書" + (f"（「{self.query}」の検索結果）" if self.query else "")
+        embed = discord.Embed(title=title, description="\n".join(lines) or "（このページの語句は削除されました）", color=0x00FF00)
+        embed.set_footer(text=f"{self.page + 1} / {self.page_count} ページ ・ {len(self.keys)} 件")
+        return embed
+
+    def update_buttons(self):
+        self.first_page.disabled = self.previous_page.disabled = self.page == 0
+        self.next_page.disabled = self.last_page.disabled = self.page >= self.page_count - 1
+
+    async def show(self, interaction: discord.Interaction, page: int):
+        self.page = max(0, min(page, self.page_count - 1))
+        self.update_buttons()
+        await interaction.response.edit_message(embed=self.render(), view=self)
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.user.id != self.author_id:
+            await interaction.response.send_message("ページを切り替えられるのはコマンドを実行した人だけです。", ephemeral=True)
+            return False
+        return True
+
+    async def on_timeout(self):
+        for item in self.children:
+            item.disabled = True
+        if self.message:
+            try:
+                await self.message.edit(view=self)
+            except discord.HTTPException:
+                pass
+
+    @discord.ui.button(label="≪", style=discord.ButtonStyle.secondary)
+    async def first_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show(interaction, 0)
+
+    @discord.ui.button(label="前へ", style=discord.ButtonStyle.primary)
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show(interaction, self.page - 1)
+
+    @discord.ui.button(label="次へ", style=discord.ButtonStyle.primary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show(interaction, self.page + 1)
+
+    @discord.ui.button(label="≫", style=discord.ButtonStyle.secondary)
+    async def last_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show(interaction, self.page_count - 1)
+
 @bot.hybrid_command(name="show_dict", description="サーバー専用辞書の内容を表示します。", aliases=["show"])
-async def show_dict(ctx: commands.Context):
-    """サーバー専用辞書の内容を表示します。"""
+@app_commands.describe(query="語句または読みに含まれる文字列で絞り込む", page="表示するページ")
+async def show_dict(ctx: commands.Context, query: str = None, page: int = 1):
+    """サーバー専用辞書の内容をページごとに表示します。"""
     if not ctx.guild:
         # Embed for not in guild
         embed = discord.Embed(
@@ -761,8 +3748,8 @@ async def show_dict(ctx: commands.Context):
         await ctx.reply(embed=embed, ephemeral=True)
         return
 
-    server_dict = load_server_dictionary(ctx.guild.id)
-    if not server_dict:
+    index = get_dictionary_index(ctx.guild.id)
+    if not len(index):
         # Embed for empty dict
         embed = discord.Embed(
             title="辞書は空です",
@@ -772,18 +3759,266 @@ async def show_dict(ctx: commands.Context):
         await ctx.reply(embed=embed)
         return
 
-    embed = discord.Embed(title=f"{ctx.guild.name} の辞書", color=0x00FF00)
-    description = ""
-    for original, reading in server_dict.items():
-        description += f"**{original}**: {reading}\n"
-    
-    if len(description) > 2000: # Discord embed description limit
-        description = description[:1997] + "..."
+    keys = index.contains(query) if query else index.keys
+    if not keys:
+        embed = discord.Embed(
+            title="見つかりません",
+            description=f"「**{query}**」を含む語句は辞書にありません。",
+            color=0xFFA500
+        )
+        await ctx.reply(embed=embed)
+        return
+
+    view = DictionaryPages(ctx.guild, ctx.author.id, keys, query)
+    view.page = max(0, min(page - 1, view.page_count - 1))
+    view.update_buttons()
+    view.message = await ctx.reply(embed=view.render(), view=view)
+
+SPAM_SETTING_LABELS = {
+    "spam_filter": "抑制を有効にする (on/off)",
+    "spam_burst": "連続で読み上げる最大数",
+    "spam_per_minute": "1分あたりの回復数",
+    "dedupe_window": "重複をまとめる時間 (秒)",
+    "dedupe_similarity": "重複とみなす類似度 (0.0～1.0)",
+    "max_char_run": "同じ文字の連続の上限 (0で無効)",
+}
+
+@bot.hybrid_command(name="spam_filter", description="連投・重複メッセージの抑制設定を表示します。", aliases=["spam"])
+async def spam_filter_command(ctx: commands.Context):
+    """サーバーごとの連投・重複メッセージの抑制設定を表示します。誰でも実行できます。"""
+    if not ctx.guild:
+        embed = discord.Embed(title="エラー", description="このコマンドはサーバーでのみ使用できます。", color=0xFF0000)
+        await ctx.reply(embed=embed, ephemeral=True)
+        return
+
+    embed = discord.Embed(title="連投・重複メッセージの抑制設定", color=0xADD8E6)
+    for key, label in SPAM_SETTING_LABELS.items():
+        embed.add_field(name=label, value=f"`{key}`: **{get_guild_setting(ctx.guild.id, key)}**", inline=False)
+    embed.set_footer(text=f"サーバー: {ctx.guild.name} ・ 変更は /spam_filter_set (サーバー管理権限が必要)")
+    await ctx.reply(embed=embed)
+
+@bot.hybrid_command(name="spam_filter_set", description="連投・重複メッセージの抑制設定を変更します。(サーバー管理権限が必要)", aliases=["spam_set"])
+@commands.guild_only()
+@commands.has_permissions(manage_guild=True) # 抑制を無効にされないよう、変更はサーバー管理者に限る
+@app_commands.default_permissions(manage_guild=True)
+@app_commands.describe(setting="変更する設定項目", value="設定する値")
+@app_commands.choices(
+    setting=[app_commands.Choice(name=label, value=key) for key, label in SPAM_SETTING_LABELS.items()]
+)
+async def spam_filter_set(ctx: commands.Context, setting: str, value: str):
+    """サーバーごとの連投・重複メッセージの抑制設定を変更します。"""
+    if setting not in SPAM_SETTING_LABELS:
+        embed = discord.Embed(
+            title="エラー",
+            description=f"不明な設定項目です。\n設定項目: {', '.join(SPAM_SETTING_LABELS)}",
+            color=0xFF0000
+        )
+        await ctx.reply(embed=embed, ephemeral=True)
+        return
+
+    default = GUILD_SETTING_DEFAULTS[setting]
+    try:
+        if isinstance(default, bool):
+            if value.lower() not in ("on", "off", "true", "false", "1", "0"):
+                raise ValueError
+            parsed = value.lower() in ("on", "true", "1")
+        elif isinstance(default, int):
+            parsed = int(value)
+            if parsed < 0:
+                raise ValueError
+        else:
+            parsed = float(value)
+            if not (0.0 <= parsed <= 1.0):
+                raise ValueError
+    except ValueError:
+        embed = discord.Embed(title="無効な値", description=f"**{SPAM_SETTING_LABELS[setting]}** に「{value}」は設定できません。", color=0xFFA500)
+        await ctx.reply(embed=embed, ephemeral=True)
+        return
+
+    set_guild_setting(ctx.guild.id, setting, parsed)
+    embed = discord.Embed(
+        title="抑制設定を変更しました",
+        description=f"{SPAM_SETTING_LABELS[setting]}: **{parsed}**",
+        color=0xADD8E6
+    )
+    embed.set_footer(text=f"設定者: {ctx.author.display_name}", icon_url=ctx.author.avatar.url if ctx.author.avatar else None)
+    await ctx.reply(embed=embed)
+
+@spam_filter_set.error
+async def spam_filter_set_error(ctx: commands.Context, error: commands.CommandError):
+    """権限がない場合などに、理由をEmbedで返します。"""
+    if isinstance(error, commands.HybridCommandError):
+        error = error.original # スラッシュコマンドとして実行された場合は包まれている
+    if isinstance(error, (commands.MissingPermissions, app_commands.MissingPermissions)):
+        description = "抑制設定の変更には **サーバー管理** 権限が必要です。"
+    elif isinstance(error, commands.NoPrivateMessage):
+        description = "このコマンドはサーバーでのみ使用できます。"
+    elif isinstance(error, commands.MissingRequiredArgument):
+        description = f"設定項目と値を指定してください。\n設定項目: {', '.join(SPAM_SETTING_LABELS)}"
+    else:
+        raise error
+    embed = discord.Embed(title="エラー", description=description, color=0xFF0000)
+    await ctx.reply(embed=embed, ephemeral=True)
+
+@bot.hybrid_command(name="sync_commands", description="スラッシュコマンドを強制的に再同期します。(Botの所有者のみ)")
+@commands.is_owner()
+async def sync_commands(ctx: commands.Context):
+    """コマンド定義のハッシュに関係なくスラッシュコマンドを再同期します。"""
+    await ctx.defer()
+    started = time.perf_counter()
+    await sync_command_tree(force=True)
+    embed = discord.Embed(
+        title="スラッシュコマンドを同期しました",
+        description=f"所要時間: **{time.perf_counter() - started:.2f}** 秒",
+        color=0x00FF00
+    )
+    await ctx.reply(embed=embed, ephemeral=True)
+
+@bot.hybrid_command(name="profile", description="サンプリングプロファイラを操作します。(Botの所有者のみ)")
+@commands.is_owner()
+@app_commands.describe(action="操作", duration=f"計測する秒数 (最大{PROFILER_MAX_SECONDS}秒)")
+@app_commands.choices(
+    action=[
+        app_commands.Choice(name="開始", value="start"),
+        app_commands.Choice(name="停止", value="stop"),
+        app_commands.Choice(name="状態", value="status"),
+    ]
+)
+async def profile(ctx: commands.Context, action: str = "status", duration: int = 30):
+    """サンプリングプロファイラを開始・停止し、結果をファイルで返します。"""
+    if action == "start":
+        if profiler.start(duration):
+            embed = discord.Embed(
+                title="プロファイルを開始しました",
+                description=f"**{profiler.duration:.0f}** 秒後に自動で終了します。`/profile stop` で途中終了できます。",
+                color=0x00BFFF
+            )
+        else:
+            embed = discord.Embed(title="エラー", description="既にプロファイル中です。", color=0xFFA500)
+        await ctx.reply(embed=embed, ephemeral=True)
+        return
+
+    if action == "stop":
+        await ctx.defer(ephemeral=True)
+        result = await asyncio.to_thread(profiler.stop) # 書き出しを待つ間もイベントループは止めない
+    elif profiler.is_running():
+        elapsed = time.time() - profiler.started_at
+        embed = discord.Embed(title="プロファイル中", description=f"経過: **{elapsed:.0f}** / {profiler.duration:.0f} 秒", color=0x00BFFF)
+        await ctx.reply(embed=embed, ephemeral=True)
+        return
+    else:
+        result = profiler.last_result
+
+    if result is None and profiler.last_error:
+        embed = discord.Embed(title="プロファイルに失敗しました", description=profiler.last_error, color=0xFF0000)
+        await ctx.reply(embed=embed, ephemeral=True)
+        return
+    if result is None:
+        embed = discord.Embed(title="結果がありません", description="`/profile start` でプロファイルを開始してください。", color=0x808080)
+        await ctx.reply(embed=embed, ephemeral=True)
+        return
+
+    collapsed_path, summary_path, summary = result
+    if len(summary) > 1900:
+        summary = summary[:1897] + "..."
+    await ctx.reply(
+        content=f"```\n{summary}\n```",
+        files=[discord.File(collapsed_path), discord.File(summary_path)],
+        ephemeral=True
+    )
+
+DICT_IMPORT_MAX_BYTES = 10 * 1024 * 1024 # 一括インポートで受け付けるファイルサイズの上限
+
+@bot.hybrid_command(name="import_dict", description="ファイルからサーバー専用辞書に単語を一括登録します。", aliases=["import"])
+@app_commands.describe(file="辞書ファイル (csv / tsv / jsonl)", policy="既に登録されている語句の扱い")
+@app_commands.choices(
+    policy=[
+        app_commands.Choice(name="スキップ", value="skip"),
+        app_commands.Choice(name="上書き", value="overwrite"),
+        app_commands.Choice(name="エラーで中止", value="error"),
+    ]
+)
+async def import_dict(ctx: commands.Context, file: discord.Attachment, policy: str = "skip"):
+    """CSV/TSV/JSONLファイルからサーバー専用辞書に単語を一括登録します。"""
+    if not ctx.guild:
+        embed = discord.Embed(title="エラー", description="このコマンドはサーバーでのみ使用できます。", color=0xFF0000)
+        await ctx.reply(embed=embed, ephemeral=True)
+        return
+
+    if file.size > DICT_IMPORT_MAX_BYTES:
+        embed = discord.Embed(
+            title="エラー",
+            description=f"ファイルが大きすぎます。({DICT_IMPORT_MAX_BYTES // (1024 * 1024)}MBまで)",
+            color=0xFF0000
+        )
+        await ctx.reply(embed=embed, ephemeral=True)
+        return
+
+    await ctx.defer()
+    try:
+        fmt = detect_dictionary_format(file.filename)
+        raw = await file.read()
+        current = load_server_dictionary(ctx.guild.id)
+
+        def parse_and_merge():
+            with io.TextIOWrapper(io.BytesIO(raw), encoding="utf-8-sig", newline="") as fp:
+                return import_dictionary_records(current, iter_dictionary_records(fp, fmt), policy)
+
+        # 数万行のファイルでもイベントループを止めないよう、解析は別スレッドで行う
+        merged, stats = await asyncio.to_thread(parse_and_merge)
+    except (DictionaryImportError, UnicodeDecodeError) as e:
+        embed = discord.Embed(title="インポートを中止しました", description=str(e), color=0xFF0000)
+        await ctx.reply(embed=embed)
+        return
+
+    # 全エントリを適用した後に1回だけ書き込み、キャッシュも1回だけ作り直す
+    if stats["added"] or stats["overwritten"]:
+        save_server_dictionary(ctx.guild.id, merged)
 
-    embed.description = description
-    embed.set_footer(text="辞書の内容を表示しています。")
+    embed = discord.Embed(title="辞書をインポートしました", description=format_import_stats(stats), color=0x00FF00)
+    embed.set_footer(text=f"サーバー: {ctx.guild.name} | 登録語数: {len(merged)}")
     await ctx.reply(embed=embed)
 
+    admin_events.log(f"Bot: サーバー辞書({ctx.guild.name})に{stats['added']}件追加、{stats['overwritten']}件上書きしました。")
+
+@bot.hybrid_command(name="export_dict", description="サーバー専用辞書をファイルに書き出します。", aliases=["export"])
+@app_commands.describe(fmt="出力形式")
+@app_commands.choices(
+    fmt=[
+        app_commands.Choice(name="CSV", value="csv"),
+        app_commands.Choice(name="TSV", value="tsv"),
+        app_commands.Choice(name="JSONL", value="jsonl"),
+    ]
+)
+async def export_dict(ctx: commands.Context, fmt: str = "csv"):
+    """サーバー専用辞書をCSV/TSV/JSONLファイルとして書き出します。"""
+    if not ctx.guild:
+        embed = discord.Embed(title="エラー", description="このコマンドはサーバーでのみ使用できます。", color=0xFF0000)
+        await ctx.reply(embed=embed, ephemeral=True)
+        return
+
+    if fmt not in DICT_FILE_FORMATS:
+        embed = discord.Embed(title="エラー", description="出力形式は csv / tsv / jsonl から選んでください。", color=0xFF0000)
+        await ctx.reply(embed=embed, ephemeral=True)
+        return
+
+    server_dict = load_server_dictionary(ctx.guild.id)
+    if not server_dict:
+        embed = discord.Embed(title="辞書は空です", description="このサーバーの辞書は空です。", color=0x808080)
+        await ctx.reply(embed=embed)
+        return
+
+    buffer = io.BytesIO()
+    fp = io.TextIOWrapper(buffer, encoding="utf-8", newline="")
+    write_dictionary_records(fp, server_dict, fmt)
+    fp.flush()
+    fp.detach() # buffer を閉じずにラッパーだけ外す
+    buffer.seek(0)
+    await ctx.reply(
+        content=f"**{ctx.guild.name}** の辞書 ({len(server_dict)}件) を書き出しました。",
+        file=discord.File(buffer, filename=f"dict_{ctx.guild.id}.{fmt}")
+    )
+
 @bot.event
 async def on_message(message: discord.Message):
     """メッセージが送信された際に実行されます。読み上げ処理とコマンド処理を行います。"""
@@ -803,39 +4038,28 @@ async def on_message(message: discord.Message):
     if gid not in reading_channels or message.channel.id != reading_channels.get(gid):
         return # 読み上げチャンネルでなければ終了
 
-    if gid not in voice_clients or not voice_clients[gid].is_connected():
-        return # VCに接続していなければ終了
+    if gid not in voice_clients or not voice_sessions.is_active(gid):
+        return # VCに接続していなければ終了 (再接続中のメッセージもキューに積む)
 
     last_active_time[gid] = asyncio.get_event_loop().time() # メッセージ受信時にアクティブ時刻を更新
 
     if message.content.strip() == "s":
-        vc = voice_clients.get(gid)
-        if vc and vc.is_playing():
-            vc.stop()
+        skip_current(gid)
         return # 's'は読み上げない
 
     content_raw = message.content.strip()
 
     # ここからメッセージのクリーニング処理
-    processed_tts_text = content_raw
-    processed_tts_text = re.sub(r'\|\|.*?\|\|', 'ネタバレ', processed_tts_text) # ネタバレ
-    processed_tts_text = re.sub(r'\*\*|__', '', processed_tts_text) # 太字、下線
-    processed_tts_text = re.sub(r'\*|_', '', processed_tts_text) # イタリック
-    processed_tts_text = re.sub(r'~~', '', processed_tts_text) # 取り消し線
-    processed_tts_text = re.sub(r'`(.*?)`', r'\1', processed_tts_text) # インラインコード
-    processed_tts_text = re.sub(r'```.*?```', '', processed_tts_text, flags=re.DOTALL) # コードブロック
-    processed_tts_text = re.sub(r'<a?:[a-zA-Z0-9_]+:[0-9]+>', '', processed_tts_text) # カスタム絵文字
-    processed_tts_text = re.sub(r'<@!?([0-9]+)>', '', processed_tts_text) # メンション
-    processed_tts_text = re.sub(r'<#([0-9]+)>', '', processed_tts_text) # チャンネルリンク
-    processed_tts_text = re.sub(r'<@&([0-9]+)>', '', processed_tts_text) # ロールメンション
-    processed_tts_text = re.sub(r'https?://\S+', 'URL', processed_tts_text) # URL
-    processed_tts_text = re.sub(r'\s+', ' ', processed_tts_text).strip() # 連続する空白を一つに
+    name_cache.remember_message(message)
+    processed_tts_text = clean_message_text(content_raw, gid)
+    processed_tts_text = normalize_reading(processed_tts_text) # 読み上げ時間を短くする正規化
+    processed_tts_text = SpamFilter.collapse_runs(processed_tts_text, int(get_guild_setting(gid, "max_char_run"))) # 同じ文字の連続
 
     # 絵文字の判定と置き換え
     if re.fullmatch(r'<a?:\w+:\d+>', content_raw): # カスタム絵文字のみのメッセージ
         txt = "サーバー絵文字"
     elif re.fullmatch(r'[\U00010000-\U0010FFFF]+', content_raw): # ユニコード絵文字のみのメッセージ
-        txt = "絵文字"
+        txt = processed_tts_text or "絵文字"
     else:
         txt = processed_tts_text
         if message.attachments:
@@ -851,16 +4075,29 @@ async def on_message(message: discord.Message):
     if not txt: # 処理後のテキストが空の場合（例：メンションだけのメッセージ）
         return
 
+    # 連投・重複メッセージは合成する前に抑制する
+    if get_guild_setting(gid, "spam_filter"):
+        now = time.monotonic()
+        duplicate = spam_filter.find_duplicate(gid, txt, now)
+        if duplicate:
+            if duplicate.repeats == 1: # 最初の重複で、時間窓が閉じたときの件数読み上げを予約する
+                window = float(get_guild_setting(gid, "dedupe_window"))
+                bot.loop.create_task(announce_repeats(gid, duplicate, window - (now - duplicate.first_seen)))
+            return
+        if not spam_filter.allow(gid, message.author.id, now):
+            return
+        spam_filter.remember(gid, message.author.id, txt, now)
+
     try:
-        audio = await generate_tts(txt, message.author.id, message.guild.id)
+        audio = await synthesis_jobs.synthesize(txt, message.author.id, message.guild.id)
     except Exception as e:
         print(f"TTSエラー: {e}")
-        if hasattr(bot, 'gui_app'):
-            bot.gui_app.log_output.insert(tk.END, f"エラー: TTS生成中にエラーが発生しました: {e}\n")
-            bot.gui_app.log_output.see(tk.END)
+        admin_events.log(f"エラー: TTS生成中にエラーが発生しました: {e}")
+        return
+    if audio is None: # 合成中に /flush などで取り消された
         return
-    
-    play_audio(gid, audio)
+
+    play_audio(gid, audio, message.author.id)
 
     # on_message内でbot.process_commands(message)を呼ぶことで、ハイブリッドコマンドを含め全てのコマンドが動作するようになります
     await bot.process_commands(message)
@@ -869,10 +4106,14 @@ import math
 
 # ── Tkinter GUI クラス ──
 class BotGUI:
-    def __init__(self, master, bot_instance):
+    """Botとは別のプロセスで動く管理画面です。Botとのやり取りはすべて管理API経由で行います。"""
+    def __init__(self, master, token: str = ADMIN_API_TOKEN):
         self.master = master
-        self.bot = bot_instance
-        self.bot.gui_app = self
+        self.api = AdminClient(token=token)
+        self.events_api = AdminClient(token=token, timeout=ADMIN_EVENTS_WAIT + 10) # ロングポーリング用
+        self.api_results = queue.Queue() # バックグラウンドで実行したAPI呼び出しの結果
+        self.dashboard_pending = False
+        self.guild_rows: dict[str, str] = {} # ギルドID -> ダッシュボードの行のID
         master.title("読み上げBOT 管理画面")
         master.geometry("1000x700")
 
@@ -888,12 +4129,71 @@ class BotGUI:
 
         # GUIの定期更新タスクを開始
         self.update_gui_tasks()
+        self.schedule_dashboard_refresh()
+        threading.Thread(target=self.pump_events, daemon=True).start()
 
     def update_gui_tasks(self):
-        """GUIの表示を定期的に更新します。"""
-        self.master.after(5000, self.update_dashboard_display) # ダッシュボードを5秒ごとに更新
+        """バックグラウンドで終わったAPI呼び出しの結果を、GUIのスレッドで反映します。"""
+        while True:
+            try:
+                callback, result = self.api_results.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                callback(result)
+            except Exception:
+                traceback.print_exc() # 1つの反映に失敗しても定期処理は止めない
         self.master.after(100, self.update_gui_tasks) # 次の更新をスケジュール
 
+    def schedule_dashboard_refresh(self):
+        self.update_dashboard_display()
+        self.master.after(5000, self.schedule_dashboard_refresh) # Pingなどを5秒ごとに更新
+
+    def pump_events(self):
+        """Botからスナップショットを受け取り、以後は差分だけを受け取り続けます。(別スレッドで実行)"""
+        seq = None
+        while True:
+            try:
+                if seq is None:
+                    snapshot = self.api.call("GET", "/snapshot")
+                    seq = snapshot["seq"]
+                    self.api_results.put((self.apply_snapshot, snapshot))
+                    continue
+                result = self.events_api.call("GET", "/events", {"since": seq})
+            except AdminAPIError as e:
+                self.api_results.put((self.show_dashboard_offline, e))
+                seq = None
+                time.sleep(2)
+                continue
+            if any(event["type"] == "reset" for event in result["events"]):
+                seq = None # Botが再起動したか、差分を取りこぼした
+                continue
+            seq = result["seq"]
+            if result["events"]:
+                self.api_results.put((self.apply_events, result["events"]))
+
+    def run_in_background(self, func, on_success=None, on_error=None):
+        """func を別スレッドで実行し、結果を on_success / on_error に渡します。どのスレッドから呼んでも構いません。"""
+        def worker():
+            try:
+                result = func()
+            except AdminAPIError as e:
+                self.api_results.put((on_error or self.show_api_error, e))
+            else:
+                if on_success:
+                    self.api_results.put((on_success, result))
+        threading.Thread(target=worker, daemon=True).start()
+
+    def api_call(self, method: str, path: str, params: dict = None, body=None, on_success=None, on_error=None):
+        """管理APIをバックグラウンドで呼び出します。"""
+        self.run_in_background(lambda: self.api.call(method, path, params, body), on_success, on_error)
+
+    def show_api_error(self, error: AdminAPIError):
+        if error.status == 0:
+            messagebox.showerror("エラー", f"{error}\nBotが起動しているか確認してください。")
+        else:
+            messagebox.showwarning("警告", str(error))
+
     def create_dashboard_tab(self):
         """ダッシュボードタブを作成します。"""
         self.dashboard_frame = ttk.Frame(self.notebook)
@@ -923,59 +4223,110 @@ class BotGUI:
         self.guild_tree.column("読み上げチャンネル", width=150, anchor=tk.W)
         self.guild_tree.pack(expand=True, fill="both", padx=10, pady=5)
 
-        self.update_dashboard_display()
-
     def update_dashboard_display(self):
-        """ダッシュボードの表示を更新します。"""
-        if not self.bot.is_ready():
-            self.status_label.config(text="Botステータス: オフライン")
-            self.ping_label.config(text="Ping: N/A")
-            self.guild_count_label.config(text="導入サーバー数: N/A")
-            self.member_count_label.config(text="合計メンバー数: N/A")
-            for item in self.guild_tree.get_children():
-                self.guild_tree.delete(item)
+        """Botの状態 (Pingなど) を管理API経由でバックグラウンドで取得します。"""
+        if self.dashboard_pending:
+            return # 前回の取得がまだ終わっていない
+        self.dashboard_pending = True
+        self.run_in_background(lambda: self.api.call("GET", "/status"), self.show_status, self.show_dashboard_offline)
+
+    def show_dashboard_offline(self, error: AdminAPIError = None):
+        self.dashboard_pending = False
+        self.status_label.config(text="Botステータス: オフライン")
+        self.ping_label.config(text="Ping: N/A")
+        self.guild_count_label.config(text="導入サーバー数: N/A")
+        self.member_count_label.config(text="合計メンバー数: N/A")
+
+    def show_status(self, status: dict):
+        self.dashboard_pending = False
+        if not status["ready"]:
+            self.show_dashboard_offline()
             return
-
         self.status_label.config(text="Botステータス: オンライン")
-        if self.bot.is_ready() and not math.isinf(self.bot.latency):
-            ping_ms = round(self.bot.latency * 1000)
-            self.ping_label.config(text=f"Ping: {ping_ms}ms")
+        if status["latency_ms"] is not None:
+            self.ping_label.config(text=f"Ping: {status['latency_ms']}ms")
         else:
-            # Botがまだ準備できていないか、Pingが取得できない場合
+            # Pingが取得できない場合
             self.ping_label.config(text="Ping: N/A")
-        self.guild_count_label.config(text=f"導入サーバー数: {len(self.bot.guilds)}")
-        self.member_count_label.config(text=f"合計メンバー数: {sum(g.member_count for g in self.bot.guilds)}")
+        self.guild_count_label.config(text=f"導入サーバー数: {status['guild_count']}")
+        self.member_count_label.config(text=f"合計メンバー数: {status['member_count']}")
 
+    def apply_snapshot(self, snapshot: dict):
+        """スナップショットでダッシュボードとログを作り直します。"""
+        self.show_status(snapshot["status"])
         for item in self.guild_tree.get_children():
             self.guild_tree.delete(item)
-        for guild in self.bot.guilds:
-            vc_connected = "はい" if guild.id in voice_clients and voice_clients[guild.id].is_connected() else "いいえ"
-            reading_channel_name = "未設定"
-            if guild.id in reading_channels:
-                channel = self.bot.get_channel(reading_channels[guild.id])
-                if channel:
-                    reading_channel_name = channel.name
-                else:
-                    reading_channel_name = f"不明 ({reading_channels[guild.id]})"
-            
-            self.guild_tree.insert("", "end", text=guild.name, values=(
-                guild.id,
-                guild.member_count,
-                vc_connected,
-                reading_channel_name
-            ))
+        self.guild_rows.clear()
+        for guild in snapshot["guilds"]:
+            self.update_guild_row(guild)
+        self.log_output.config(state='normal')
+        self.log_output.delete("1.0", tk.END)
+        self.log_output.config(state='disabled')
+        for line in snapshot["logs"]:
+            self.append_log(line)
+
+    def apply_events(self, events: list):
+        """Botから届いた差分を反映します。変わった行だけを書き換えます。"""
+        for event in events:
+            if event["type"] == "log":
+                self.append_log(event["text"])
+            elif event["type"] == "guild":
+                self.update_guild_row(event["guild"])
+            elif event["type"] == "guild_removed":
+                iid = self.guild_rows.pop(event["id"], None)
+                if iid:
+                    self.guild_tree.delete(iid)
+
+    def update_guild_row(self, guild: dict):
+        values = (
+            guild["id"],
+            guild["member_count"],
+            "はい" if guild["voice_connected"] else "いいえ",
+            guild["reading_channel"] or "未設定"
+        )
+        iid = self.guild_rows.get(guild["id"])
+        if iid:
+            self.guild_tree.item(iid, text=guild["name"], values=values)
+        else:
+            self.guild_rows[guild["id"]] = self.guild_tree.insert("", "end", text=guild["name"], values=values)
 
     def create_global_dict_tab(self):
         """グローバル辞書タブを作成します。"""
         self.global_dict_frame = ttk.Frame(self.notebook)
         self.notebook.add(self.global_dict_frame, text="グローバル辞書")
 
-        self.global_dict_tree = ttk.Treeview(self.global_dict_frame, columns=("Original", "Reading"), show="headings")
+        # 検索欄 (入力するたびに絞り込む)
+        search_frame = ttk.Frame(self.global_dict_frame)
+        search_frame.pack(fill="x", padx=10, pady=(10, 0))
+        ttk.Label(search_frame, text="検索:").pack(side="left")
+        self.global_dict_search = tk.StringVar()
+        self.global_dict_search.trace_add("write", self.on_global_dict_search)
+        ttk.Entry(search_frame, textvariable=self.global_dict_search, width=40).pack(side="left", padx=5)
+        self.global_dict_count_label = ttk.Label(search_frame, text="")
+        self.global_dict_count_label.pack(side="left", padx=5)
+
+        # 表示されている行だけを Treeview の項目として持ち、スクロールでは値を差し替える
+        tree_frame = ttk.Frame(self.global_dict_frame)
+        tree_frame.pack(expand=True, fill="both", padx=10, pady=10)
+        self.global_dict_tree = ttk.Treeview(tree_frame, columns=("Original", "Reading"), show="headings", selectmode="browse")
         self.global_dict_tree.heading("Original", text="元の語句")
         self.global_dict_tree.heading("Reading", text="読み")
-        self.global_dict_tree.pack(expand=True, fill="both", padx=10, pady=10)
+        self.global_dict_scrollbar = ttk.Scrollbar(tree_frame, orient="vertical", command=self.on_global_dict_scroll)
+        self.global_dict_scrollbar.pack(side="right", fill="y")
+        self.global_dict_tree.pack(side="left", expand=True, fill="both")
+
+        self.global_dict_entries: dict[str, str] = {} # 管理APIから取得したグローバル辞書の写し
+        self.global_dict_index = DictionaryIndex()
+        self.global_dict_view: list[str] = self.global_dict_index.keys # 検索で絞り込んだ語句の一覧
+        self.global_dict_last_query = ""
+        self.global_dict_offset = 0 # 表示している先頭の行
+        self.global_dict_rows: list[str] = [] # 表示用の Treeview 項目のID
 
         self.global_dict_tree.bind("<ButtonRelease-1>", self.select_global_dict_item)
+        self.global_dict_tree.bind("<Configure>", self.on_global_dict_resize)
+        self.global_dict_tree.bind("<MouseWheel>", self.on_global_dict_wheel)
+        self.global_dict_tree.bind("<Button-4>", lambda e: self.scroll_global_dict_to(self.global_dict_offset - 3))
+        self.global_dict_tree.bind("<Button-5>", lambda e: self.scroll_global_dict_to(self.global_dict_offset + 3))
 
         input_frame = ttk.Frame(self.global_dict_frame)
         input_frame.pack(pady=5)
@@ -995,14 +4346,118 @@ class BotGUI:
         ttk.Button(button_frame, text="更新", command=self.update_global_dict_entry).grid(row=0, column=1, padx=5)
         ttk.Button(button_frame, text="削除", command=self.remove_global_dict_entry).grid(row=0, column=2, padx=5)
 
-        self.update_global_dict_display()
+        bulk_frame = ttk.Frame(self.global_dict_frame)
+        bulk_frame.pack(pady=5)
+
+        ttk.Label(bulk_frame, text="登録済みの語句:").grid(row=0, column=0, padx=5)
+        self.global_import_policy = ttk.Combobox(bulk_frame, values=DICT_CONFLICT_POLICIES, state="readonly", width=10)
+        self.global_import_policy.set("skip")
+        self.global_import_policy.grid(row=0, column=1, padx=5)
+        ttk.Button(bulk_frame, text="一括インポート", command=self.import_global_dict_file).grid(row=0, column=2, padx=5)
+        ttk.Button(bulk_frame, text="エクスポート", command=self.export_global_dict_file).grid(row=0, column=3, padx=5)
+
+        self.load_global_dict()
+
+    def load_global_dict(self):
+        """管理APIからグローバル辞書をすべて取得します。Botの起動前なら少し待って再試行します。"""
+        def retry(error: AdminAPIError):
+            if error.status == 0:
+                self.master.after(3000, self.load_global_dict)
+            else:
+                self.show_api_error(error)
+        self.run_in_background(lambda: self.api.fetch_all("/dictionaries/global"), self.update_global_dict_display, retry)
+
+    def update_global_dict_display(self, items: list = None):
+        """グローバル辞書の索引を作り直し、表示を更新します。(読み込み時や一括インポート後など)"""
+        if items is not None:
+            self.global_dict_entries = dict(items)
+        self.global_dict_index = DictionaryIndex(self.global_dict_entries)
+        self.refilter_global_dict()
+        self.global_original_entry.delete(0, tk.END)
+        self.global_reading_entry.delete(0, tk.END)
 
-    def update_global_dict_display(self):
-        """グローバル辞書の表示を更新します。"""
-        for item in self.global_dict_tree.get_children():
-            self.global_dict_tree.delete(item)
-        for original, reading in global_dict.items():
-            self.global_dict_tree.insert("", "end", values=(original, reading))
+    def refilter_global_dict(self, incremental: bool = False):
+        """検索欄の文字列で語句を絞り込み、表示中の行を描き直します。"""
+        query = self.global_dict_search.get().strip()
+        previous = self.global_dict_last_query
+        within = None
+        if incremental and previous and query.lower().startswith(previous.lower()):
+            within = self.global_dict_view # 文字が増えただけなら前回の結果から絞り込む
+        self.global_dict_view = self.global_dict_index.search(query, self.global_dict_entries, within)
+        self.global_dict_last_query = query
+        self.scroll_global_dict_to(0)
+
+    def on_global_dict_search(self, *args):
+        self.refilter_global_dict(incremental=True)
+
+    def on_global_dict_resize(self, event):
+        """ウィンドウの高さに合わせて、表示用の行の数を変えます。"""
+        row_height = int(ttk.Style().lookup("Treeview", "rowheight") or 20)
+        visible = max(1, (event.height - row_height) // row_height)
+        if visible == len(self.global_dict_rows):
+            return
+        while len(self.global_dict_rows) < visible:
+            self.global_dict_rows.append(self.global_dict_tree.insert("", "end", values=("", "")))
+        while len(self.global_dict_rows) > visible:
+            self.global_dict_tree.delete(self.global_dict_rows.pop())
+        self.render_global_dict_rows()
+
+    def on_global_dict_wheel(self, event):
+        self.scroll_global_dict_to(self.global_dict_offset - int(event.delta / 120) * 3)
+
+    def on_global_dict_scroll(self, action, value, unit=None):
+        """スクロールバーの操作を表示位置に反映します。"""
+        visible = len(self.global_dict_rows)
+        if action == "moveto":
+            self.scroll_global_dict_to(int(float(value) * len(self.global_dict_view)))
+        elif action == "scroll":
+            step = visible if unit == "pages" else 1
+            self.scroll_global_dict_to(self.global_dict_offset + int(value) * step)
+
+    def scroll_global_dict_to(self, offset: int):
+        max_offset = max(0, len(self.global_dict_view) - len(self.global_dict_rows))
+        self.global_dict_offset = max(0, min(offset, max_offset))
+        self.render_global_dict_rows()
+
+    def render_global_dict_rows(self):
+        """表示範囲にある語句だけを Treeview の行に書き込みます。"""
+        view = self.global_dict_view
+        for i, iid in enumerate(self.global_dict_rows):
+            position = self.global_dict_offset + i
+            if position < len(view):
+                key = view[position]
+                self.global_dict_tree.item(iid, values=(key, self.global_dict_entries.get(key, "")))
+            else:
+                self.global_dict_tree.item(iid, values=("", ""))
+        total = len(view)
+        if total:
+            first = self.global_dict_offset / total
+            last = min(1.0, (self.global_dict_offset + len(self.global_dict_rows)) / total)
+        else:
+            first, last = 0.0, 1.0
+        self.global_dict_scrollbar.set(first, last)
+        self.global_dict_count_label.config(text=f"{total} / {len(self.global_dict_index)} 件")
+
+    def on_global_dict_changed(self, key: str, reading: str = None):
+        """1件の追加・更新 (reading=None なら削除) を写しと索引と表示に反映します。全件の再描画は行いません。"""
+        removed = reading is None
+        if removed:
+            self.global_dict_entries.pop(key, None)
+            self.global_dict_index.remove(key)
+        else:
+            self.global_dict_entries[key] = reading
+            self.global_dict_index.add(key)
+        if self.global_dict_view is not self.global_dict_index.keys:
+            # 検索中は、絞り込み結果の並びを保ったまま該当の1件だけを出し入れする
+            query = self.global_dict_last_query.lower()
+            matches = not removed and (query in key.lower() or query in reading.lower())
+            i = bisect.bisect_left(self.global_dict_view, key)
+            present = i < len(self.global_dict_view) and self.global_dict_view[i] == key
+            if present and not matches:
+                del self.global_dict_view[i]
+            elif matches and not present:
+                self.global_dict_view.insert(i, key)
+        self.render_global_dict_rows()
         self.global_original_entry.delete(0, tk.END)
         self.global_reading_entry.delete(0, tk.END)
 
@@ -1011,6 +4466,8 @@ class BotGUI:
         selected_item = self.global_dict_tree.focus()
         if selected_item:
             values = self.global_dict_tree.item(selected_item, "values")
+            if not values or not values[0]:
+                return # 空の行
             self.global_original_entry.delete(0, tk.END)
             self.global_original_entry.insert(0, values[0])
             self.global_reading_entry.delete(0, tk.END)
@@ -1021,14 +4478,10 @@ class BotGUI:
         original = self.global_original_entry.get().strip()
         reading = self.global_reading_entry.get().strip()
         if original and reading:
-            if original in global_dict:
+            if original in self.global_dict_entries:
                 messagebox.showwarning("警告", f"'{original}' は既に辞書に存在します。更新する場合は更新ボタンを使用してください。")
                 return
-            global_dict[original] = reading
-            save_global_dictionary(global_dict)
-            self.update_global_dict_display()
-            self.log_output.insert(tk.END, f"GUI: グローバル辞書に「{original}」:「{reading}」を追加しました。\n")
-            self.log_output.see(tk.END)
+            self.api_call("POST", "/dictionaries/global/entries", body={"original": original, "reading": reading}, on_success=lambda entry: self.on_global_dict_changed(entry["original"], entry["reading"]))
         else:
             messagebox.showwarning("警告", "元の語句と読みの両方を入力してください。")
 
@@ -1037,12 +4490,8 @@ class BotGUI:
         original = self.global_original_entry.get().strip()
         reading = self.global_reading_entry.get().strip()
         if original and reading:
-            if original in global_dict:
-                global_dict[original] = reading
-                save_global_dictionary(global_dict)
-                self.update_global_dict_display()
-                self.log_output.insert(tk.END, f"GUI: グローバル辞書の「{original}」を「{reading}」に更新しました。\n")
-                self.log_output.see(tk.END)
+            if original in self.global_dict_entries:
+                self.api_call("PUT", "/dictionaries/global/entries", body={"original": original, "reading": reading}, on_success=lambda entry: self.on_global_dict_changed(entry["original"], entry["reading"]))
             else:
                 messagebox.showwarning("警告", f"'{original}' は辞書に見つかりません。追加する場合は追加ボタンを使用してください。")
         else:
@@ -1052,19 +4501,66 @@ class BotGUI:
         """グローバル辞書からエントリを削除します。"""
         original = self.global_original_entry.get().strip()
         if original:
-            if original in global_dict:
+            if original in self.global_dict_entries:
                 confirm = messagebox.askyesno("確認", f"'{original}' を辞書から削除しますか？")
                 if confirm:
-                    del global_dict[original]
-                    save_global_dictionary(global_dict)
-                    self.update_global_dict_display()
-                    self.log_output.insert(tk.END, f"GUI: グローバル辞書から「{original}」を削除しました。\n")
-                    self.log_output.see(tk.END)
+                    self.api_call("DELETE", "/dictionaries/global/entries", params={"original": original}, on_success=lambda entry: self.on_global_dict_changed(entry["original"]))
             else:
                 messagebox.showwarning("警告", f"'{original}' は辞書に見つかりません。")
         else:
             messagebox.showwarning("警告", "削除する元の語句を入力してください。")
 
+    def import_global_dict_file(self):
+        """CSV/TSV/JSONLファイルからグローバル辞書に一括登録します。"""
+        path = filedialog.askopenfilename(
+            title="辞書ファイルを選択",
+            filetypes=[("辞書ファイル", "*.csv *.tsv *.jsonl *.ndjson *.txt"), ("すべてのファイル", "*.*")]
+        )
+        if not path:
+            return
+        policy = self.global_import_policy.get()
+        try:
+            fmt = detect_dictionary_format(path)
+            with open(path, 'r', encoding='utf-8-sig', newline='') as fp:
+                text = fp.read()
+        except (DictionaryImportError, UnicodeDecodeError, OSError) as e:
+            messagebox.showerror("インポートを中止しました", str(e))
+            return
+
+        def done(stats):
+            # 全エントリを適用した後に1回だけ取得し直し、表示も1回だけ作り直す
+            if stats["added"] or stats["overwritten"]:
+                self.load_global_dict()
+            messagebox.showinfo("インポート完了", format_import_stats(stats).replace("**", ""))
+        def failed(error: AdminAPIError):
+            messagebox.showerror("インポートを中止しました", str(error))
+        self.api_call("POST", "/dictionaries/global/import", body={"format": fmt, "text": text, "policy": policy}, on_success=done, on_error=failed)
+
+    def export_global_dict_file(self):
+        """グローバル辞書をCSV/TSV/JSONLファイルに書き出します。"""
+        path = filedialog.asksaveasfilename(
+            title="書き出し先を選択",
+            defaultextension=".csv",
+            filetypes=[("CSV", "*.csv"), ("TSV", "*.tsv"), ("JSONL", "*.jsonl")]
+        )
+        if not path:
+            return
+        try:
+            fmt = detect_dictionary_format(path)
+        except DictionaryImportError as e:
+            messagebox.showerror("エラー", str(e))
+            return
+
+        def write(items):
+            try:
+                with open(path, 'w', encoding='utf-8', newline='') as fp:
+                    write_dictionary_records(fp, dict(items), fmt)
+            except OSError as e:
+                messagebox.showerror("エラー", str(e))
+                return
+            self.append_log(f"GUI: グローバル辞書({len(items)}件)を {path} に書き出しました。")
+        self.run_in_background(lambda: self.api.fetch_all("/dictionaries/global"), write)
+
     def create_settings_tab(self):
         """設定タブを作成します。"""
         self.settings_frame = ttk.Frame(self.notebook)
@@ -1073,7 +4569,53 @@ class BotGUI:
         ttk.Label(self.settings_frame, text="読み上げ速度はユーザーごとに設定されます。", foreground="red", font=("", 12, "bold")).pack(pady=10)
         ttk.Label(self.settings_frame, text="`/setspeed` コマンドで個人の読み上げ速度を設定してください。", font=("", 10)).pack(pady=5)
         ttk.Label(self.settings_frame, text="（GUIからのグローバル速度設定は廃止されました）", font=("", 10)).pack(pady=5)
+
+        profiler_frame = ttk.LabelFrame(self.settings_frame, text="プロファイラ")
+        profiler_frame.pack(pady=10, padx=10, fill="x")
+        ttk.Label(profiler_frame, text="計測時間 (秒):").grid(row=0, column=0, padx=5, pady=5)
+        self.profiler_duration_entry = ttk.Entry(profiler_frame, width=8)
+        self.profiler_duration_entry.insert(0, "30")
+        self.profiler_duration_entry.grid(row=0, column=1, padx=5, pady=5)
+        ttk.Button(profiler_frame, text="開始", command=self.start_profiler).grid(row=0, column=2, padx=5)
+        ttk.Button(profiler_frame, text="停止", command=self.stop_profiler).grid(row=0, column=3, padx=5)
+        self.profiler_status_label = ttk.Label(profiler_frame, text="停止中")
+        self.profiler_status_label.grid(row=1, column=0, columnspan=4, padx=5, pady=5, sticky="w")
+
+    def start_profiler(self):
+        """GUIからプロファイラを開始します。"""
+        try:
+            duration = int(self.profiler_duration_entry.get())
+        except ValueError:
+            messagebox.showwarning("警告", "計測時間は整数で入力してください。")
+            return
+        def started(result):
+            self.profiler_status_label.config(text=f"プロファイル中... ({result['duration']:.0f}秒)")
+            self.master.after(int(result["duration"] * 1000) + 500, self.refresh_profiler_status)
+        self.api_call("POST", "/profiler", body={"action": "start", "duration": duration}, on_success=started)
+
+    def stop_profiler(self):
+        """GUIからプロファイラを停止します。結果の書き出しが終わるとAPIが応答を返します。"""
+        self.profiler_status_label.config(text="停止しています...")
+        self.api_call("POST", "/profiler", body={"action": "stop"}, on_success=self.show_profiler_status)
+
+    def refresh_profiler_status(self):
+        """プロファイラの状態表示を更新します。"""
+        self.api_call("GET", "/profiler", on_success=self.show_profiler_status)
+
+    def show_profiler_status(self, status: dict):
+        if status["running"]:
+            self.profiler_status_label.config(text="プロファイル中...")
+            self.master.after(500, self.refresh_profiler_status)
+        elif status["last_result"]:
+            self.profiler_status_label.config(text=f"結果: {status['last_result'][0]} / {status['last_result'][1]}")
         
+    def append_log(self, text: str):
+        """ログタブの末尾に1行追加します。"""
+        self.log_output.config(state='normal')
+        self.log_output.insert(tk.END, text + "\n")
+        self.log_output.see(tk.END)
+        self.log_output.config(state='disabled')
+
     def create_log_tab(self):
         """ログタブを作成します。"""
         self.log_frame = ttk.Frame(self.notebook)
@@ -1083,19 +4625,21 @@ class BotGUI:
         self.log_output.pack(expand=True, fill="both", padx=10, pady=10)
         self.log_output.config(state='disabled') # 読み取り専用にする
 
-        # Botの標準出力と標準エラー出力をログウィジェットにリダイレクト
+        # 管理画面自身の標準出力と標準エラー出力もログウィジェットにリダイレクト (Botのログは管理APIから届く)
         sys.stdout = TextRedirector(self.log_output, "stdout")
         sys.stderr = TextRedirector(self.log_output, "stderr")
 
     def on_closing(self):
-        """GUIウィンドウが閉じられたときに実行されます。Botを停止します。"""
-        if messagebox.askokcancel("終了確認", "Botを停止してアプリケーションを終了しますか？"):
-            self.master.destroy()
-            if self.bot.is_ready():
-                print("Botをシャットダウンしています...")
-                asyncio.run_coroutine_threadsafe(self.bot.close(), self.bot.loop).result()
-            print("アプリケーションを終了しました。")
-            os._exit(0) # 強制終了
+        """GUIウィンドウが閉じられたときに実行されます。Botは別プロセスのため、停止するかどうかを選べます。"""
+        answer = messagebox.askyesnocancel("終了確認", "管理画面を閉じます。Botも停止しますか？\n（「いいえ」を選ぶとBotは動き続けます）")
+        if answer is None:
+            return
+        if answer:
+            try:
+                self.api.call("POST", "/shutdown")
+            except AdminAPIError as e:
+                print(f"Botを停止できませんでした: {e}")
+        self.master.destroy()
 
 class TextRedirector(object):
     """標準出力/エラー出力をTkinterのTextウィジェットにリダイレクトするクラス。"""
@@ -1112,24 +4656,59 @@ class TextRedirector(object):
     def flush(self):
         pass # TkinterのTextウィジェットではflushは不要
 
-# Botを別スレッドで実行
 def run_bot():
+    """Botをこのプロセスのメインスレッドで実行します。"""
+    global bot_thread_id
+    bot_thread_id = threading.get_ident() # プロファイラがBotのスレッドを識別するため
+    # 標準出力と標準エラー出力は管理画面のログにも送る
+    sys.stdout = EventLogWriter(sys.stdout, admin_events)
+    sys.stderr = EventLogWriter(sys.stderr, admin_events)
     if BOT_TOKEN is None:
         print("エラー: BOT_TOKENが設定されていません。'.env'ファイルを確認してください。")
         sys.exit(1)
+    if not os.getenv("ADMIN_API_TOKEN"):
+        # 後から管理画面だけを起動し直せるよう、生成したトークンを保存する
+        # 最初から所有者だけが読める権限で作る (書き込んだ後に権限を変えると、その間に読まれうる)
+        fd = os.open(ADMIN_TOKEN_FILE, os.O_CREAT | os.O_WRONLY | os.O_TRUNC, 0o600)
+        if hasattr(os, "fchmod"):
+            os.fchmod(fd, 0o600) # 既にファイルがあった場合は作成時の権限が使われないため
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(ADMIN_API_TOKEN)
     try:
         bot.run(BOT_TOKEN)
     except discord.errors.LoginFailure:
         print("エラー: BOT_TOKENが無効です。'.env'ファイルを確認してください。")
         sys.exit(1)
 
-if __name__ == "__main__":
-    # GUIスレッドでTkinterウィンドウを作成し、Botスレッドを起動
+def run_gui():
+    """管理画面を実行します。トークンは環境変数、なければBotが保存したファイルから読みます。"""
+    token = os.getenv("ADMIN_API_TOKEN")
+    if not token and os.path.exists(ADMIN_TOKEN_FILE):
+        with open(ADMIN_TOKEN_FILE, 'r', encoding='utf-8') as f:
+            token = f.read().strip()
     root = tk.Tk()
-    gui = BotGUI(root, bot)
+    BotGUI(root, token or ADMIN_API_TOKEN)
+    root.mainloop()
+
+def start_gui_process() -> subprocess.Popen:
+    """管理画面を別プロセスで起動します。GUIの処理がBotの音声やハートビートを遅らせないようにするためです。"""
+    env = dict(os.environ, ADMIN_API_TOKEN=ADMIN_API_TOKEN, ADMIN_API_HOST=ADMIN_API_HOST, ADMIN_API_PORT=str(ADMIN_API_PORT))
+    return subprocess.Popen([sys.executable, os.path.abspath(__file__), "--gui"], env=env)
 
-    bot_thread = threading.Thread(target=run_bot)
-    bot_thread.daemon = True # メインスレッド(GUI)終了時にBotスレッドも終了
-    bot_thread.start()
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Edge TTS 読み上げBot")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--headless", action="store_true", help="管理画面を起動せずにBotだけを実行する")
+    mode.add_argument("--gui", action="store_true", help="起動中のBotに接続する管理画面だけを実行する")
+    args = parser.parse_args()
 
-    root.mainloop()
\ No newline at end of file
+    if args.gui:
+        run_gui()
+        sys.exit(0)
+
+    gui_process = None if args.headless else start_gui_process()
+    try:
+        run_bot()
+    finally:
+        if gui_process and gui_process.poll() is None:
+            gui_process.terminate() # Botが終了したら管理画面も閉じる
@@ -0,0 +1,87 @@
+"""読み上げテキスト正規化の効果を、記録したメッセージのコーパスで計測します。
+
+使い方:
+    python normalize_bench.py corpus.txt
+    python normalize_bench.py corpus.jsonl --synthesize --limit 50
+
+コーパスは1行1メッセージのテキストファイル、または "content" キーを持つJSONLです。
+--synthesize を付けると、正規化前後のテキストを実際にEdge TTSで合成し、
+合成時間と音声の長さ(推定)も比較します。
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import edge_tts
+
+from main import clean_message_text, normalize_reading
+
+# Edge TTS の既定出力 (audio-24khz-48kbitrate-mono-mp3) は1秒あたり6000バイト
+MP3_BYTES_PER_SECOND = 48000 / 8
+
+def load_corpus(path: str, limit: int = None) -> list[str]:
+    """コーパスファイルからメッセージ本文を読み込みます。"""
+    messages = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if not line.strip():
+                continue
+            if path.endswith(".jsonl"):
+                line = json.loads(line).get("content", "")
+            messages.append(line)
+            if limit and len(messages) >= limit:
+                break
+    return messages
+
+async def synthesize(text: str, voice: str) -> tuple[float, int]:
+    """テキストを合成し、(合成にかかった秒数, 音声のバイト数) を返します。"""
+    started = time.perf_counter()
+    size = 0
+    async for chunk in edge_tts.Communicate(text=text, voice=voice).stream():
+        if chunk["type"] == "audio":
+            size += len(chunk["data"])
+    return time.perf_counter() - started, size
+
+async def run(args):
+    messages = load_corpus(args.corpus, args.limit)
+    before = [clean_message_text(m) for m in messages]
+
+    started = time.perf_counter()
+    after = [normalize_reading(t) for t in before]
+    normalize_seconds = time.perf_counter() - started
+
+    chars_before = sum(len(t) for t in before)
+    chars_after = sum(len(t) for t in after)
+    changed = sum(1 for b, a in zip(before, after) if b != a)
+    print(f"メッセージ数: {len(messages)} (変化あり: {changed})")
+    print(f"文字数: {chars_before} -> {chars_after} ({(1 - chars_after / max(chars_before, 1)) * 100:.1f}% 削減)")
+    print(f"正規化処理時間: 合計 {normalize_seconds * 1000:.1f}ms / 1件あたり {normalize_seconds / max(len(messages), 1) * 1e6:.1f}µs")
+
+    if not args.synthesize:
+        return
+
+    totals = {"before": [0.0, 0], "after": [0.0, 0]}
+    for b, a in zip(before, after):
+        if b == a or not b or not a:
+            continue # 変化のないメッセージは同じ結果になるので合成しない
+        for label, text in (("before", b), ("after", a)):
+            seconds, size = await synthesize(text, args.voice)
+            totals[label][0] += seconds
+            totals[label][1] += size
+
+    for label, (seconds, size) in totals.items():
+        print(f"[{label}] 合成時間: {seconds:.2f}s / 音声の長さ(推定): {size / MP3_BYTES_PER_SECOND:.1f}s")
+    if totals["before"][0]:
+        print(f"合成時間の削減: {(1 - totals['after'][0] / totals['before'][0]) * 100:.1f}%")
+    if totals["before"][1]:
+        print(f"音声の長さの削減: {(1 - totals['after'][1] / totals['before'][1]) * 100:.1f}%")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="読み上げテキスト正規化の効果を計測します。")
+    parser.add_argument("corpus", help="1行1メッセージのテキストファイル、または content キーを持つJSONL")
+    parser.add_argument("--synthesize", action="store_true", help="Edge TTSで実際に合成して時間を比較する")
+    parser.add_argument("--voice", default="ja-JP-NanamiNeural", help="合成に使う声")
+    parser.add_argument("--limit", type=int, default=None, help="読み込むメッセージ数の上限")
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+import main
+
+
+@pytest.fixture
+def call(tmp_path, monkeypatch):
+    """管理APIに1回リクエストし、(ステータス, JSON) を返す関数です。グローバル辞書は一時ディレクトリに保存します。"""
+    monkeypatch.chdir(tmp_path)
+    saved = dict(main.global_dict)
+    main.global_dict.clear()
+
+    def request(method: str, path: str, body):
+        async def body_():
+            api = main.AdminAPI(token="test")
+            async with TestClient(TestServer(api.app)) as client:
+                response = await client.request(method, path, json=body, headers={"Authorization": "Bearer test"})
+                return response.status, await response.json()
+        return asyncio.run(body_())
+
+    yield request
+    main.global_dict.clear()
+    main.global_dict.update(saved)
+
+
+@pytest.mark.parametrize("method, path", [
+    ("POST", "/api/dictionaries/global/entries"),
+    ("PUT", "/api/dictionaries/global/entries"),
+    ("POST", "/api/dictionaries/global/import"),
+    ("POST", "/api/profiler"),
+])
+def test_non_object_body_is_rejected(call, method, path):
+    status, data = call(method, path, ["original", "reading"])
+    assert status == 400
+    assert "JSON オブジェクト" in data["error"]
+
+
+def test_import_records(call):
+    status, data = call("POST", "/api/dictionaries/global/import", {"records": [["abc", "エービーシー"], ["x"]], "policy": "skip"})
+    assert status == 200
+    assert (data["added"], data["invalid"]) == (1, 1)
+    assert main.global_dict == {"abc": "エービーシー"}
+
+
+def test_import_text_and_conflict_policy(call):
+    main.global_dict["abc"] = "エービーシー"
+    body = {"format": "csv", "text": "original,reading\nabc,あびし\nnew,ニュー\n", "policy": "error"}
+    status, data = call("POST", "/api/dictionaries/global/import", body)
+    assert status == 409
+    assert main.global_dict == {"abc": "エービーシー"}
+    status, data = call("POST", "/api/dictionaries/global/import", dict(body, policy="overwrite"))
+    assert status == 200
+    assert main.global_dict == {"abc": "あびし", "new": "ニュー"}
+
+
+@pytest.mark.parametrize("body", [{"records": {"abc": "x"}}, {"format": "csv", "text": 1}])
+def test_import_rejects_malformed_payloads(call, body):
+    status, _ = call("POST", "/api/dictionaries/global/import", body)
+    assert status == 400
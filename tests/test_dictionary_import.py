@@ -0,0 +1,69 @@
+import io
+
+import pytest
+
+import main
+
+CURRENT = {"abc": "エービーシー", "same": "セイム"}
+RECORDS = [
+    (1, "abc", "あびし"),
+    (2, "same", "セイム"),
+    (3, "new", "ニュー"),
+    (4, None, "列数が2ではありません (3列)"),
+    (5, "", "から"),
+    (6, "/.*.*x/r", "だめ"),
+]
+
+
+def test_skip_keeps_existing_entries():
+    merged, stats = main.import_dictionary_records(CURRENT, RECORDS, "skip")
+    assert merged == {"abc": "エービーシー", "same": "セイム", "new": "ニュー"}
+    assert (stats["added"], stats["overwritten"], stats["skipped"], stats["invalid"]) == (1, 0, 2, 3)
+
+
+def test_overwrite_replaces_changed_entries():
+    merged, stats = main.import_dictionary_records(CURRENT, RECORDS, "overwrite")
+    assert merged == {"abc": "あびし", "same": "セイム", "new": "ニュー"}
+    assert (stats["added"], stats["overwritten"], stats["skipped"], stats["invalid"]) == (1, 1, 1, 3)
+
+
+def test_error_aborts_on_conflict_without_touching_current():
+    current = dict(CURRENT)
+    with pytest.raises(main.DictionaryImportError, match="1行目"):
+        main.import_dictionary_records(current, RECORDS, "error")
+    assert current == CURRENT
+
+
+def test_error_imports_when_there_is_no_conflict():
+    merged, stats = main.import_dictionary_records(CURRENT, [(1, "new", "ニュー")], "error")
+    assert merged["new"] == "ニュー" and stats["added"] == 1
+
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(main.DictionaryImportError):
+        main.import_dictionary_records(CURRENT, [], "merge")
+
+
+def test_invalid_lines_are_reported_with_line_numbers():
+    _, stats = main.import_dictionary_records({}, RECORDS, "skip")
+    assert stats["invalid_lines"][0].startswith("4行目")
+    assert len(stats["invalid_lines"]) == 3
+
+
+@pytest.mark.parametrize("fmt", main.DICT_FILE_FORMATS)
+def test_export_and_import_round_trip(fmt):
+    entries = {"abc": "エービーシー", "a,b": "カンマ", '"q"': "クォート", "/colou?r/ri": "いろ"}
+    out = io.StringIO()
+    main.write_dictionary_records(out, entries, fmt)
+    records = list(main.iter_dictionary_records(io.StringIO(out.getvalue()), fmt))
+    merged, stats = main.import_dictionary_records({}, records, "error")
+    assert merged == entries
+    assert stats["invalid"] == 0
+
+
+def test_detect_format():
+    assert main.detect_dictionary_format("dict.NDJSON") == "jsonl"
+    assert main.detect_dictionary_format("dict.tsv") == "tsv"
+    assert main.detect_dictionary_format("dict.txt") == "csv"
+    with pytest.raises(main.DictionaryImportError):
+        main.detect_dictionary_format("dict.xlsx")
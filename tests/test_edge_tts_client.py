@@ -0,0 +1,91 @@
+import asyncio
+
+from aiohttp import web
+
+import main
+
+
+def audio_message(data: bytes) -> bytes:
+    # 実際のサーバーと同じく、先頭2バイトがヘッダーの長さ
+    headers = b"X-RequestId:1\r\nContent-Type:audio/mpeg\r\nPath:audio\r\n"
+    return len(headers).to_bytes(2, "big") + headers + data
+
+
+class StandInServer:
+    """Edge TTS の代わりに音声を返す WebSocket サーバーです。hang なら合成の要求に応答しません。"""
+    def __init__(self, hang: bool = False):
+        self.hang = hang
+        self.received = asyncio.Event()
+        self.closed = asyncio.Event()
+
+    async def handle(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        async for message in ws:
+            if "Path:ssml" not in message.data:
+                continue
+            self.received.set()
+            if not self.hang:
+                await ws.send_bytes(audio_message(b"mp3"))
+                await ws.send_str("X-RequestId:1\r\nPath:turn.end\r\n\r\n{}")
+        self.closed.set()
+        return ws
+
+    async def __aenter__(self):
+        app = web.Application()
+        app.router.add_get("/tts", self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = self.runner.addresses[0][1]
+        self.url = f"ws://127.0.0.1:{port}/tts?TrustedClientToken=test"
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.runner.cleanup()
+
+
+def run_with_client(server: StandInServer, body):
+    async def main_():
+        async with server:
+            client = main.EdgeTTSClient(size=1, url=server.url)
+            client.refill = lambda: None # 裏で接続を張らず、合成ごとに接続させる
+            conns = []
+            turn = client.turn
+
+            async def recording_turn(conn, ssml):
+                conns.append(conn)
+                return await turn(conn, ssml)
+
+            client.turn = recording_turn
+            try:
+                await body(client, conns)
+            finally:
+                await client.close()
+    asyncio.run(main_())
+
+
+def test_finished_connection_returns_to_pool():
+    async def body(client, conns):
+        assert await client.request("<speak/>") == b"mp3"
+        assert not conns[0].closed
+        assert conns[0] in client.idle
+    run_with_client(StandInServer(), body)
+
+
+def test_cancelled_synthesis_closes_connection():
+    server = StandInServer(hang=True)
+
+    async def body(client, conns):
+        task = asyncio.ensure_future(client.request("<speak/>"))
+        await asyncio.wait_for(server.received.wait(), 5)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        assert conns[0].closed
+        assert conns[0] not in client.idle
+        await asyncio.wait_for(server.closed.wait(), 5)
+    run_with_client(server, body)
@@ -0,0 +1,45 @@
+import pytest
+
+import main
+
+
+@pytest.fixture
+def index(tmp_path):
+    keys = sorted(["😀", "👍", "👨", "👩", "#⃣", "🇯🇵"], key=lambda k: k.encode("utf-8"))
+    names = {"😀": "にっこり", "👍": "いいね", "👨": "男性", "👩": "女性", "#⃣": "シャープ", "🇯🇵": "日本"}
+    path = tmp_path / "emoji.tsv"
+    path.write_bytes("\n".join(f"{k}\t{names[k]}" for k in keys).encode("utf-8"))
+    return main.EmojiIndex(str(path))
+
+
+def test_lookup_finds_every_line(index):
+    for key, name in [("😀", "にっこり"), ("👍", "いいね"), ("👨", "男性"), ("👩", "女性"), ("#⃣", "シャープ"), ("🇯🇵", "日本")]:
+        assert index.lookup(key) == name
+
+
+def test_lookup_misses_return_none(index):
+    assert index.lookup("🎉") is None
+    assert index.lookup("") is None
+    assert index.lookup("\U0010ffff") is None
+
+
+def test_missing_index_file_falls_back(tmp_path):
+    assert main.EmojiIndex(str(tmp_path / "missing.tsv")).lookup("😀") is None
+
+
+def test_emoji_name_normalizes_modifiers():
+    assert main.emoji_name("👍🏽") == main.emoji_name("👍") != main.EMOJI_FALLBACK
+    assert main.emoji_name("❤️") == main.emoji_index.lookup("❤")
+    assert main.emoji_name("♥") is None
+
+
+def test_emoji_name_reads_unknown_zwj_sequences_per_part():
+    name = main.emoji_name("👨‍👍")
+    assert name == f"{main.emoji_name('👨')} {main.emoji_name('👍')}"
+
+
+def test_replace_emoji_collapses_repeats_and_limits_count():
+    smile = main.emoji_name("😀")
+    assert main.replace_emoji("やあ😀😀😀").split() == ["やあ", smile]
+    assert main.replace_emoji("😀 😀").split() == [smile]
+    assert len(main.replace_emoji("😀🎉👍🇯🇵", limit=2).split()) == 2
@@ -0,0 +1,55 @@
+import pytest
+
+import main
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("やった！！！！！！！！！！！！！", "やった！"),
+    ("待って。。。。。。。。。。。。", "待って。"),
+    ("は？？？？？？？？？？？？？？", "は？"),
+    ("えっ!?!?!?", "えっ!"),
+])
+def test_repeated_punctuation_is_collapsed_not_ascii_art(text, expected):
+    assert main.normalize_reading(text) == expected
+
+
+def test_ascii_art_is_replaced():
+    assert main.normalize_reading("｜￣￣￣￣￣￣￣￣￣￣￣￣｜") == "アスキーアート"
+    assert main.normalize_reading("見て #$%&*+=<>@^~| すごい") == "見て アスキーアート すごい"
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("面白いwww", "面白いわら"),
+    ("ｗｗｗ", "わら"),
+    ("w", "わら"),
+    ("草草草", "くさ"),
+    ("笑笑", "わら"),
+    ("www.example.com を見て", "www.example.com を見て"),
+    ("wwwを見て", "わらを見て"),
+    ("window", "window"),
+])
+def test_laughter(text, expected):
+    assert main.normalize_reading(text) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("電話は09012345678です", "電話は11桁の数字です"),
+    ("1,000,000円", "1000000円"),
+    ("5km走った", "5キロメートル走った"),
+    ("1.5GB", "1.5ギガ"),
+    ("30%", "30パーセント"),
+])
+def test_numbers_and_units(text, expected):
+    assert main.normalize_reading(text) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("ああああああ", "あああ"),
+    ("ほげほげほげほげ", "ほげほげ"),
+    ("(´・ω・`)", "しょぼん"),
+    ("m(__)m", "ぺこり"),
+    ("こんにちは", "こんにちは"),
+    ("", ""),
+])
+def test_repeats_and_kaomoji(text, expected):
+    assert main.normalize_reading(text) == expected
@@ -0,0 +1,80 @@
+import time
+
+import pytest
+
+import main
+
+# 300文字の "a" で、検証をすり抜けると数秒〜数分かかっていたパターン
+REDOS_PATTERNS = [
+    "/.*.*.*x/r",
+    "/.*.*.*.*x/r",
+    "/.*.*.*.*.*x/r",
+    "/.*x.*y/r",
+    r"/\d+\d+/r",
+    r"/\w+\d+/r",
+    "/ほ+ほ+/r",
+    "/A+a+/ri",
+    "/.{0,100}.{0,100}x/r",
+    "/.{0,16}.{0,16}.{0,16}.{0,16}.{0,16}.{0,16}.{0,16}.{0,16}x/r",
+    "/a{0,16}a{0,16}a{0,16}a{0,16}a{0,16}x/r",
+    "/a?a?a?a?a?a?a?a?a?a?aaaaaaaaaa/r",
+    r"/\d+\.?\d*x/r",
+    "/(a+)+x/r",
+    "/(a|aa)+x/r",
+    r"/(a)\1/r",
+]
+
+SAFE_PATTERNS = [
+    "hello",
+    "/colou?r/ri",
+    "/w{2,}/r",
+    "/草+/r",
+    "/.*x/r",
+    r"/\d+年\d+月/r",
+    r"/https?://\S+/r",
+    r"/\d{1,3}(,\d{3})+/r",
+    "/a+b+/r",
+    r"/-?\d+円/r",
+    "/w{3}/r",
+    "/lol/wi",
+]
+
+
+@pytest.mark.parametrize("key", REDOS_PATTERNS)
+def test_backtracking_patterns_are_rejected(key):
+    assert main.validate_pattern_key(key) is not None
+
+
+@pytest.mark.parametrize("key", SAFE_PATTERNS)
+def test_safe_patterns_are_accepted(key):
+    assert main.validate_pattern_key(key) is None
+
+
+@pytest.mark.parametrize("key", ["/(?P<x>a)/r", "/a?/r", "/(/r", "/(?s).*/r"])
+def test_invalid_patterns_are_rejected(key):
+    assert main.validate_pattern_key(key) is not None
+
+
+def test_rejected_patterns_are_skipped_when_compiling():
+    entries = {key: "x" for key in REDOS_PATTERNS}
+    entries["/草+/r"] = "わら"
+    compiled = main.CompiledDictionary(entries, {})
+    start = time.perf_counter()
+    assert compiled.apply("a" * 300 + "草草") == "a" * 300 + "わら"
+    assert time.perf_counter() - start < 0.5
+
+
+def test_accepted_patterns_stay_fast_on_adversarial_input():
+    entries = {key: "x" for key in SAFE_PATTERNS if main.validate_pattern_key(key) is None}
+    compiled = main.CompiledDictionary(entries, {})
+    for text in ("a" * 300, "1" * 300, "1年" * 150, "w" * 300):
+        start = time.perf_counter()
+        compiled.apply(text)
+        assert time.perf_counter() - start < 0.5
+
+
+def test_pattern_flags():
+    assert main.parse_pattern_key("plain") is None
+    assert main.parse_pattern_key("/a.b/i") == "(?i:a\\.b)"
+    compiled = main.CompiledDictionary({"/lol/wi": "笑", "/colou?r/ri": "色"}, {})
+    assert compiled.apply("LOL lolz Colour color") == "笑 lolz 色 色"
@@ -0,0 +1,52 @@
+import asyncio
+import types
+
+import main
+
+
+class StubVoiceClient:
+    def __init__(self, guild_id: int):
+        self.guild = types.SimpleNamespace(id=guild_id)
+
+
+def run_cleanup(tracked: bool, registered: bool = True) -> bool:
+    """接続の破棄を知らせ、再接続が始まったかを返します。"""
+    async def body():
+        sessions = main.VoiceSessionManager()
+        reconnected = []
+
+        async def reconnect(guild_id):
+            reconnected.append(guild_id)
+
+        sessions.reconnect = reconnect
+        vc = StubVoiceClient(1)
+        if registered:
+            main.voice_clients[1] = vc
+        if tracked:
+            sessions.track(1, 10)
+        try:
+            sessions.handle_cleanup(vc)
+            task = sessions.reconnecting.get(1)
+            if task:
+                await task
+        finally:
+            main.voice_clients.pop(1, None)
+        return reconnected == [1]
+    return asyncio.run(body())
+
+
+def test_cleanup_of_tracked_session_starts_reconnect():
+    assert run_cleanup(tracked=True)
+
+
+def test_intentional_disconnect_does_not_reconnect():
+    assert not run_cleanup(tracked=False)
+
+
+def test_replaced_connection_does_not_reconnect():
+    assert not run_cleanup(tracked=True, registered=False)
+
+
+def test_cleanup_hook_is_installed_on_the_voice_client():
+    assert issubclass(main.ReadingVoiceClient, main.discord.VoiceClient)
+    assert main.ReadingVoiceClient.cleanup is not main.discord.VoiceClient.cleanup